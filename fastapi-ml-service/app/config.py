@@ -5,10 +5,111 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Storage backend: "supabase", or "local" for the SQLite/filesystem stand-in
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+LOCAL_STORAGE_DB = os.getenv("LOCAL_STORAGE_DB", "/tmp/ml_service/local.db")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "/tmp/ml_service/storage")  # one subdirectory per bucket
+
 # Supabase configuration
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_URL = os.getenv("SUPABASE_URL", "")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
 # Validate required environment variables
-if not SUPABASE_URL or not SUPABASE_KEY:
+if STORAGE_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
     raise ValueError("Missing required environment variables: SUPABASE_URL, SUPABASE_KEY")
+
+# Supabase Storage API (override to point downloads at a local stand-in)
+SUPABASE_STORAGE_URL = os.getenv("SUPABASE_STORAGE_URL", f"{SUPABASE_URL.rstrip('/')}/storage/v1")
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "300"))  # seconds
+
+# Supabase REST API and its shared HTTP connection pool
+SUPABASE_REST_URL = os.getenv("SUPABASE_REST_URL", f"{SUPABASE_URL.rstrip('/')}/rest/v1")
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))  # max open connections
+SUPABASE_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_KEEPALIVE_CONNECTIONS", "10"))  # idle connections kept open
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))  # seconds
+
+# Write-behind batching of result inserts and status updates
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))  # writes per flush
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))  # seconds
+
+# Large numeric arrays in results are stored as compressed blobs instead of JSON
+RESULT_BLOB_THRESHOLD = int(os.getenv("RESULT_BLOB_THRESHOLD", "1000"))  # elements, 0 disables
+RESULT_BLOB_BUCKET = os.getenv("RESULT_BLOB_BUCKET", "analysis_blobs")
+RESULT_BLOB_COMPRESSION = os.getenv("RESULT_BLOB_COMPRESSION", "zstd").lower()  # zstd or npz
+
+# Upload handling
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MB
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(500 * 1024 * 1024)))  # 500 MB
+MAX_DOWNLOAD_SIZE = int(os.getenv("MAX_DOWNLOAD_SIZE", "0"))  # bytes per file from storage, 0 for no limit
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/tmp/ml_service/uploads")  # input files of queued analyses
+
+# Parsed dataset cache
+DATASET_CACHE_MEMORY_BYTES = int(os.getenv("DATASET_CACHE_MEMORY_BYTES", str(512 * 1024 * 1024)))  # 512 MB
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "/tmp/dataset_cache")
+DATASET_CACHE_DISK_BYTES = int(os.getenv("DATASET_CACHE_DISK_BYTES", str(5 * 1024 * 1024 * 1024)))  # 5 GB
+
+# Arrow IPC files shared with worker processes through memory maps
+ARROW_HANDOFF_DIR = os.getenv("ARROW_HANDOFF_DIR", "/tmp/dataset_arrow")
+ARROW_HANDOFF_MAX_BYTES = int(os.getenv("ARROW_HANDOFF_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))  # 5 GB
+
+# Streaming readers
+XLSX_BATCH_SIZE = int(os.getenv("XLSX_BATCH_SIZE", "10000"))  # rows per batch
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "100000"))  # rows per batch in chunked execution
+CHUNKED_THRESHOLD_BYTES = int(os.getenv("CHUNKED_THRESHOLD_BYTES", str(512 * 1024 * 1024)))  # 512 MB
+
+# Execution engine: "process" runs models in worker pools, "thread" in a thread of this process
+EXECUTION_ENGINE = os.getenv("EXECUTION_ENGINE", "process").lower()
+# Processes on this host that run analyses (the API and standalone workers); they split the cores
+LOCAL_WORKER_PROCESSES = max(1, int(os.getenv("LOCAL_WORKER_PROCESSES", "1")))
+PROCESS_CORES = max(1, (os.cpu_count() or 1) // LOCAL_WORKER_PROCESSES)  # this process's share of the cores
+# Worker pools as name=workers:max_tasks_per_child; models pick a pool with "worker_pool" in the registry
+EXECUTION_POOLS = os.getenv(
+    "EXECUTION_POOLS", f"default={PROCESS_CORES}:100,fast=1:200,tensorflow=1:10,prophet=1:25"
+)
+# Model types or categories (e.g. "time_series,xgboost") whose libraries workers load before taking tasks
+WORKER_WARMUP = os.getenv("WORKER_WARMUP", "")
+THREAD_BUDGET = int(os.getenv("THREAD_BUDGET", "0"))  # native threads of all model runs, 0 for PROCESS_CORES
+THREADS_PER_TASK = int(os.getenv("THREADS_PER_TASK", "0"))  # 0 to divide the budget among the pools' workers
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "300"))  # seconds, for models without a registry "timeout"
+MAX_MODEL_TIMEOUT = float(os.getenv("MAX_MODEL_TIMEOUT", "3600"))  # upper bound of per-request timeout_seconds
+BATCH_MAX_MODELS = int(os.getenv("BATCH_MAX_MODELS", "10"))  # models per batch analysis
+
+# Persistent job queue
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite").lower()  # "sqlite" (one host) or "postgres"
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "/tmp/ml_service/jobs.db")
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")  # Postgres connection string of the postgres backend
+JOB_INPUT_BUCKET = os.getenv("JOB_INPUT_BUCKET", "job_inputs")  # uploads shared with workers on other hosts
+if JOB_QUEUE_BACKEND == "postgres" and not JOB_QUEUE_URL:
+    raise ValueError("Missing required environment variable: JOB_QUEUE_URL")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", str(max(2, os.cpu_count() or 1))))  # jobs run at once
+JOB_HIGH_PRIORITY_SLOTS = int(os.getenv("JOB_HIGH_PRIORITY_SLOTS", "1"))  # consumers reserved for high priority
+JOB_FAST_LANE_SLOTS = int(os.getenv("JOB_FAST_LANE_SLOTS", "1"))  # consumers reserved for fast-lane jobs
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # redelivered if not renewed in time
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # deliveries before a job is failed
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # seconds between polls of an empty queue
+JOB_CONSUMER_ENABLED = os.getenv("JOB_CONSUMER_ENABLED", "true").lower() == "true"  # false when standalone workers run jobs
+WORKER_DRAIN_SECONDS = float(os.getenv("WORKER_DRAIN_SECONDS", "60"))  # wait for running jobs when a worker stops
+
+# Memory-aware admission control
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MEMORY_BUDGET = int(os.getenv("ADMISSION_MEMORY_BUDGET", "0"))  # bytes, 0 for 75% of physical memory
+ADMISSION_JOB_OVERHEAD = int(os.getenv("ADMISSION_JOB_OVERHEAD", str(128 * 1024 * 1024)))  # bytes per job
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))  # seconds, sent with 429 responses
+
+# Cost model of analysis run times and scheduling lanes
+COST_MODEL_PATH = os.getenv("COST_MODEL_PATH", "/tmp/ml_service/cost_model.json")  # calibrated coefficients
+COST_CALIBRATE_ON_STARTUP = os.getenv("COST_CALIBRATE_ON_STARTUP", "false").lower() == "true"
+COST_BENCHMARK_ROWS = os.getenv("COST_BENCHMARK_ROWS", "250,1000")  # synthetic dataset sizes of the benchmark
+COST_BENCHMARK_TIMEOUT = float(os.getenv("COST_BENCHMARK_TIMEOUT", "120"))  # seconds per benchmark run
+FAST_LANE_SECONDS = float(os.getenv("FAST_LANE_SECONDS", "10"))  # estimated run time of fast-lane jobs
+
+# Persistent cache of analysis results
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "/tmp/ml_service/results.db")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))  # 7 days
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1 GB of compressed JSON
+
+# Dtype compaction of loaded datasets
+COMPACT_DATASETS = os.getenv("COMPACT_DATASETS", "true").lower() == "true"
+COMPACT_CATEGORY_RATIO = float(os.getenv("COMPACT_CATEGORY_RATIO", "0.5"))  # max unique/rows for category
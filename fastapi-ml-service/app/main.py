@@ -1,7 +1,21 @@
+import logging
+import time
 
-from fastapi import FastAPI
+# Reference point of the startup latency reported in /analyze/stats
+STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.config import MAX_UPLOAD_SIZE, COST_CALIBRATE_ON_STARTUP, JOB_CONSUMER_ENABLED
 from app.routers import analysis
+from app.services.supabase_service import supabase_service
+from app.services.cost_model import cost_model
+from app.services.execution_engine import execution_engine
+from app.services.job_runner import job_runner
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="ML Analysis API",
@@ -9,6 +23,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Added before CORS, which wraps later middleware, so its 413 carries CORS headers too
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized request bodies before they are spooled to disk"""
+    content_length = request.headers.get("content-length")
+    if MAX_UPLOAD_SIZE and content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds the maximum allowed size of {MAX_UPLOAD_SIZE} bytes"}
+        )
+    return await call_next(request)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +47,43 @@ app.add_middleware(
 # Include routers
 app.include_router(analysis.router)
 
+# The modules are imported and the app is built; startup events follow
+IMPORTED = time.perf_counter()
+
+@app.on_event("startup")
+async def start_worker_pools():
+    """Start and warm up the worker pools of the models in WORKER_WARMUP, if this process runs jobs"""
+    if JOB_CONSUMER_ENABLED:
+        await execution_engine.start()
+
+@app.on_event("startup")
+async def start_job_runner():
+    """Recover abandoned jobs and start consuming the job queue, unless standalone workers do"""
+    if JOB_CONSUMER_ENABLED:
+        await job_runner.start()
+
+@app.on_event("startup")
+async def calibrate_cost_model():
+    """Benchmark the models in the worker pools to calibrate run time estimates, if enabled"""
+    if COST_CALIBRATE_ON_STARTUP:
+        cost_model.start_calibration(execution_engine.run)
+
+@app.on_event("startup")
+async def record_startup():
+    """Record how long the service took from import to accepting requests"""
+    app.state.startup = {
+        "import_seconds": round(IMPORTED - STARTED, 3),
+        "startup_seconds": round(time.perf_counter() - STARTED, 3)
+    }
+    logger.info(f"Service ready in {app.state.startup['startup_seconds']:.3f}s")
+
+@app.on_event("shutdown")
+async def close_connections():
+    """Stop consuming jobs, close the pooled Supabase connections and stop the worker processes"""
+    await job_runner.stop()
+    await supabase_service.close()
+    execution_engine.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to ML Analysis API"}
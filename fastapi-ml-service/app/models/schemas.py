@@ -51,10 +51,52 @@ class AnalysisRequest(BaseModel):
     industry: Industry
     parameters: Optional[Dict[str, Any]] = {}
 
+class AnalysisSpec(BaseModel):
+    model_type: ModelType
+    parameters: Dict[str, Any] = {}
+
 class AnalysisResponse(BaseModel):
     id: str
     status: str
     message: Optional[str] = None
+    cache: Optional[str] = None
+    result_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    metrics: Optional[Dict[str, Any]] = None
+
+class JobEvent(BaseModel):
+    status: str
+    at: float
+    detail: Optional[str] = None
+
+class JobSummary(BaseModel):
+    id: str
+    file_id: str
+    model_type: str
+    industry: str
+    parameters: Dict[str, Any] = {}
+    priority: str
+    status: str
+    attempts: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    updated_at: float
+    result_id: Optional[str] = None
+    results: Optional[List[Dict[str, Any]]] = None
+    memory_estimate: int = 0
+    cost_estimate: float = 0.0
+    lane: str = "slow"
+    error: Optional[str] = None
+    queue_position: Optional[int] = None
+
+class JobStatusResponse(JobSummary):
+    attached_file_ids: List[str] = []
+    events: List[JobEvent] = []
+
+class JobListResponse(BaseModel):
+    jobs: List[JobSummary]
+    count: int
 
 class ModelInfo(BaseModel):
     name: str
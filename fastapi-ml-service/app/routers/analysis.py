@@ -1,14 +1,26 @@
 
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Request
 from fastapi.responses import JSONResponse
-import os
+import asyncio
 import uuid
 import json
 import logging
-from typing import Dict, Any, Optional, List
-from app.models.schemas import ModelType, Industry, AnalysisResponse
-from app.services.ml_service import ml_service
+from typing import Dict, Any, Optional, List, Tuple
+from pydantic import parse_obj_as
+from app.config import BATCH_MAX_MODELS
+from app.models.schemas import ModelType, Industry, AnalysisSpec, AnalysisResponse, JobStatusResponse, JobListResponse
+from app.services.admission import AdmissionRejected, admission_controller
+from app.services.cost_model import cost_model
+from app.services.dataset_cache import dataset_cache
 from app.services.supabase_service import supabase_service
+from app.services.execution_engine import execution_engine
+from app.services.ml_service import ml_service
+from app.services.file_service import StoredFile, save_upload, upload_path, FileTooLargeError
+from app.services.job_queue import Job, job_queue, job_priority, BATCH_MODEL_TYPE
+from app.services.job_runner import (
+    job_runner, remove_file, discard_input, share_input, update_attached_files, serve_from_cache
+)
+from app.services.result_cache import CachedResult, result_cache
 from app.services.models import MODEL_REGISTRY, get_models_by_industry, get_models_by_category, get_model_parameters
 
 router = APIRouter(prefix="/analyze", tags=["Analysis"])
@@ -17,9 +29,8 @@ router = APIRouter(prefix="/analyze", tags=["Analysis"])
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@router.post("/", response_model=AnalysisResponse)
+@router.post("/", response_model=AnalysisResponse, response_model_exclude_none=True)
 async def analyze_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     file_id: str = Form(...),
     industry: Industry = Form(...),
@@ -33,39 +44,18 @@ async def analyze_file(
         # Generate a unique ID for this analysis
         analysis_id = str(uuid.uuid4())
         
-        # Save the uploaded file temporarily
-        temp_file_path = f"/tmp/{file_id}_{file.filename}"
-        with open(temp_file_path, "wb") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-        
         # Parse parameters
         params_dict = json.loads(parameters)
+        await check_request(model_type.value, params_dict)
         
-        # Process the file in the background
-        background_tasks.add_task(
-            process_analysis,
-            temp_file_path,
-            file_id,
-            analysis_id,
-            model_type,
-            industry,
-            params_dict
-        )
-        
-        return {
-            "id": analysis_id,
-            "status": "processing",
-            "message": "Analysis started"
-        }
-        
+        temp_file_path, stored_file = await store_upload(file, analysis_id)
+        return await queue_analysis(analysis_id, file_id, model_type.value, industry, params_dict,
+                                    temp_file_path, stored_file, "Analysis queued")
     except Exception as e:
-        logger.error(f"Error starting analysis: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error starting analysis: {str(e)}")
+        raise await start_error(e, file_id, from_storage=False)
 
-@router.post("/from-storage", response_model=AnalysisResponse)
+@router.post("/from-storage", response_model=AnalysisResponse, response_model_exclude_none=True)
 async def analyze_from_storage(
-    background_tasks: BackgroundTasks,
     file_id: str,
     industry: Industry,
     model_type: ModelType,
@@ -77,45 +67,230 @@ async def analyze_from_storage(
     try:
         # Generate a unique ID for this analysis
         analysis_id = str(uuid.uuid4())
+        await check_request(model_type.value, parameters)
         
-        # Update file status to processing
-        await supabase_service.update_file_status(file_id, "processing")
-        
-        # Get the file path from Supabase
-        file_path = await supabase_service.get_file_path(file_id)
-        
-        if not file_path:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Download the file to a temporary location
-        temp_file_path = f"/tmp/{file_id}_{file_path.split('/')[-1]}"
-        success = await supabase_service.download_file("excel_templates", file_path, temp_file_path)
+        temp_file_path, stored_file, input_path = await fetch_from_storage(file_id, analysis_id)
+        return await queue_analysis(analysis_id, file_id, model_type.value, industry, parameters,
+                                    temp_file_path, stored_file, "Analysis queued", input_path)
+    except Exception as e:
+        raise await start_error(e, file_id, from_storage=True)
+
+@router.post("/batch", response_model=AnalysisResponse, response_model_exclude_none=True)
+async def analyze_batch(
+    file: UploadFile = File(...),
+    file_id: str = Form(...),
+    industry: Industry = Form(...),
+    specs: str = Form(...)
+):
+    """
+    Endpoint to run several models on one uploaded file, parsing it once
+    """
+    try:
+        # Generate a unique ID for the whole batch
+        analysis_id = str(uuid.uuid4())
         
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to download file")
+        # Parse the model specs
+        params_dict = batch_parameters(json.loads(specs))
+        await check_request(BATCH_MODEL_TYPE, params_dict)
         
-        # Process the file in the background
-        background_tasks.add_task(
-            process_analysis,
-            temp_file_path,
-            file_id,
-            analysis_id,
-            model_type,
-            industry,
-            parameters
-        )
+        temp_file_path, stored_file = await store_upload(file, analysis_id)
+        return await queue_analysis(analysis_id, file_id, BATCH_MODEL_TYPE, industry, params_dict,
+                                    temp_file_path, stored_file,
+                                    f"Batch of {len(params_dict['specs'])} analyses queued")
+    except Exception as e:
+        raise await start_error(e, file_id, from_storage=False)
+
+@router.post("/batch/from-storage", response_model=AnalysisResponse, response_model_exclude_none=True)
+async def analyze_batch_from_storage(
+    file_id: str,
+    industry: Industry,
+    specs: List[Dict[str, Any]]
+):
+    """
+    Endpoint to run several models on a file that is already in Supabase storage
+    """
+    try:
+        # Generate a unique ID for the whole batch
+        analysis_id = str(uuid.uuid4())
+        params_dict = batch_parameters(specs)
+        await check_request(BATCH_MODEL_TYPE, params_dict)
         
+        temp_file_path, stored_file, input_path = await fetch_from_storage(file_id, analysis_id)
+        return await queue_analysis(analysis_id, file_id, BATCH_MODEL_TYPE, industry, params_dict,
+                                    temp_file_path, stored_file,
+                                    f"Batch of {len(params_dict['specs'])} analyses queued", input_path)
+    except Exception as e:
+        raise await start_error(e, file_id, from_storage=True)
+
+async def admit(job: Job) -> Job:
+    """
+    Estimate a job's run time to pick its lane, then queue it through admission
+    control, removing its input if it is rejected
+    """
+    try:
+        await asyncio.to_thread(cost_model.assign, job)
+        return await admission_controller.enqueue(job)
+    except AdmissionRejected:
+        await discard_input(job)
+        raise
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """429 with a Retry-After header for a busy service, 413 for an analysis that never fits"""
+    if e.retry_after is None:
+        return HTTPException(status_code=413, detail=str(e))
+    logger.info(f"Rejected analysis: {str(e)}")
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def cached_response(analysis_id: str, cached: CachedResult) -> Dict[str, Any]:
+    """Response for an analysis answered from the result cache"""
+    return {
+        "id": analysis_id,
+        "status": "completed",
+        "message": "Analysis served from the result cache",
+        "cache": "hit",
+        "result_id": cached.result_id,
+        "result": cached.result,
+        "metrics": cached.metrics
+    }
+
+def batch_parameters(specs: Any) -> Dict[str, Any]:
+    """Validate the model specs of a batch analysis and return them as job parameters"""
+    specs = parse_obj_as(List[AnalysisSpec], specs)
+    if not 1 <= len(specs) <= BATCH_MAX_MODELS:
+        raise ValueError(f"A batch analysis needs between 1 and {BATCH_MAX_MODELS} models, got {len(specs)}")
+    for spec in specs:
+        execution_engine.timeout_for(spec.model_type.value, spec.parameters)
+    return {"specs": [{"model_type": spec.model_type.value, "parameters": spec.parameters} for spec in specs]}
+
+async def check_request(model_type: str, parameters: Dict[str, Any]) -> None:
+    """
+    Reject a request before its file is stored: ValueError for invalid
+    parameters, AdmissionRejected when the service is at capacity
+    """
+    job_priority(model_type, parameters)
+    if model_type != BATCH_MODEL_TYPE:
+        # batch_parameters already checked the time limit of every model
+        execution_engine.timeout_for(model_type, parameters)
+    await admission_controller.check_capacity()
+
+async def store_upload(file: UploadFile, analysis_id: str) -> Tuple[str, StoredFile]:
+    """Stream an uploaded file to disk in bounded chunks"""
+    temp_file_path = upload_path(analysis_id, file.filename)
+    stored_file = await save_upload(file, temp_file_path)
+    return temp_file_path, stored_file
+
+async def fetch_from_storage(file_id: str, analysis_id: str) -> Tuple[str, StoredFile, str]:
+    """
+    Mark a file in Supabase storage as processing and download it to a
+    temporary location. Also returns the file's location in storage.
+    """
+    # Update file status to processing
+    await supabase_service.update_file_status(file_id, "processing")
+    
+    # Get the file path from Supabase
+    file_path = await supabase_service.get_file_path(file_id)
+    
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Download the file to a temporary location
+    temp_file_path = upload_path(analysis_id, file_path)
+    stored_file = await supabase_service.download_file("excel_templates", file_path, temp_file_path)
+    
+    if not stored_file:
+        raise HTTPException(status_code=500, detail="Failed to download file")
+    return temp_file_path, stored_file, f"excel_templates/{file_path}"
+
+async def queue_analysis(analysis_id: str, file_id: str, model_type: str, industry: Industry,
+                         parameters: Dict[str, Any], temp_file_path: str, stored_file: StoredFile,
+                         message: str, input_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Answer a request from the result cache, or queue it if its memory fits.
+    The file stays on disk until the job is done, unless the queue is
+    distributed: consumers then read the input from storage, at
+    ``input_path`` or in a copy uploaded here.
+    """
+    parameters = await asyncio.to_thread(execution_parameters, temp_file_path, model_type, parameters)
+    job = Job(
+        id=analysis_id,
+        file_id=file_id,
+        model_type=model_type,
+        industry=industry.value,
+        file_path=temp_file_path,
+        parameters=parameters,
+        content_hash=stored_file.sha256,
+        priority=job_priority(model_type, parameters)
+    )
+    
+    # Answer right away when the same analysis of the same content is cached
+    cached = await serve_from_cache(job)
+    if cached is not None:
+        remove_file(temp_file_path)
+        return cached_response(analysis_id, cached)
+    
+    if job_queue.distributed:
+        job.input_path = input_path or await share_input(job)
+    queued = await admit(job)
+    # A batch looks up each of its models in the result cache while it runs
+    cache_status = None
+    if model_type != BATCH_MODEL_TYPE:
+        cache_status = "bypass" if parameters.get("bypass_cache") else "miss"
+    
+    if queued.id != analysis_id:
+        # An identical analysis is already queued or running
+        await discard_input(job)
         return {
-            "id": analysis_id,
-            "status": "processing",
-            "message": "Analysis started"
+            "id": queued.id,
+            "status": queued.status,
+            "message": "Attached to an identical analysis in progress",
+            "cache": cache_status
         }
-        
-    except Exception as e:
-        logger.error(f"Error starting analysis: {str(e)}")
-        # Update file status to failed
+    
+    if job_queue.distributed:
+        remove_file(temp_file_path)
+    return {
+        "id": analysis_id,
+        "status": "queued",
+        "message": message,
+        "cache": cache_status
+    }
+
+def execution_parameters(file_path: str, model_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the execution mode of a model, or of every model in a batch"""
+    if model_type == BATCH_MODEL_TYPE:
+        return {"specs": [
+            {"model_type": spec["model_type"],
+             "parameters": ml_service.execution_parameters(file_path, ModelType(spec["model_type"]), spec["parameters"])}
+            for spec in parameters["specs"]
+        ]}
+    return ml_service.execution_parameters(file_path, ModelType(model_type), parameters)
+
+async def start_error(e: Exception, file_id: str, from_storage: bool) -> HTTPException:
+    """
+    The HTTP error for a request that could not be queued. A file from
+    storage goes back to uploaded when admission rejected it, and to failed
+    on any error other than invalid parameters.
+    """
+    if isinstance(e, AdmissionRejected):
+        if from_storage:
+            # The file was not analyzed and can be submitted again
+            await supabase_service.update_file_status(file_id, "uploaded")
+        return admission_error(e)
+    
+    # FileTooLargeError is a ValueError, but the file itself is at fault
+    invalid_parameters = isinstance(e, ValueError) and not isinstance(e, FileTooLargeError)
+    if from_storage and not invalid_parameters:
         await supabase_service.update_file_status(file_id, "failed")
-        raise HTTPException(status_code=500, detail=f"Error starting analysis: {str(e)}")
+    
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, FileTooLargeError):
+        logger.warning(f"Rejected file {file_id}: {str(e)}")
+        return HTTPException(status_code=413, detail=str(e))
+    if invalid_parameters:
+        return HTTPException(status_code=400, detail=str(e))
+    logger.error(f"Error starting analysis: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Error starting analysis: {str(e)}")
 
 @router.get("/models")
 async def get_available_models(industry: Optional[str] = None, category: Optional[str] = None):
@@ -175,6 +350,37 @@ async def get_model_parameters_endpoint(model_id: str):
         "metadata": parameter_metadata
     }
 
+@router.get("/stats")
+async def get_service_stats(request: Request):
+    """Get runtime statistics for the analysis pipeline"""
+    return {
+        "startup": getattr(request.app.state, "startup", None),
+        "dataset_cache": dataset_cache.stats(),
+        "write_behind": supabase_service.stats(),
+        "execution": execution_engine.stats(),
+        "queue": {**await job_queue.counts(), "coalesced": job_queue.coalesced, **job_runner.stats()},
+        "result_cache": result_cache.stats(),
+        "admission": await admission_controller.stats(),
+        "cost_model": cost_model.stats()
+    }
+
+@router.get("/blobs/{blob_path:path}")
+async def get_result_blob(blob_path: str):
+    """Get an array that a stored result references instead of embedding"""
+    try:
+        array = await supabase_service.get_blob_array(blob_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error loading result blob {blob_path}: {str(e)}")
+        raise HTTPException(status_code=404, detail="Blob not found")
+    
+    return {
+        "shape": list(array.shape),
+        "dtype": str(array.dtype),
+        "values": array.tolist()
+    }
+
 @router.get("/categories")
 async def get_model_categories():
     """Get all available model categories"""
@@ -197,38 +403,58 @@ async def get_model_industries():
     
     return {"industries": sorted(list(industries))}
 
-async def process_analysis(
-    file_path: str,
-    file_id: str,
-    analysis_id: str,
-    model_type: ModelType,
-    industry: Industry,
-    parameters: Dict[str, Any]
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    status: Optional[str] = None,
+    model_type: Optional[str] = None,
+    industry: Optional[Industry] = None,
+    file_id: Optional[str] = None,
+    since: Optional[float] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
 ):
-    """
-    Process the analysis in the background
-    """
-    try:
-        # Process the file with ML service
-        result, metrics = await ml_service.process_file(
-            file_path, model_type, industry, parameters
-        )
-        
-        # Store the result in Supabase
-        result_id = await supabase_service.store_analysis_result(
-            file_id, model_type, industry, result, metrics
-        )
-        
-        # Update file status
-        if result_id:
-            await supabase_service.update_file_status(file_id, "completed", result_id)
-        else:
-            await supabase_service.update_file_status(file_id, "failed")
-            
-    except Exception as e:
-        logger.error(f"Error processing analysis: {str(e)}")
-        await supabase_service.update_file_status(file_id, "failed")
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    """List analysis jobs, newest first"""
+    jobs = await job_queue.list_jobs(
+        status=status,
+        model_type=model_type,
+        industry=industry.value if industry else None,
+        file_id=file_id,
+        since=since,
+        limit=limit,
+        offset=offset
+    )
+    return {"jobs": jobs, "count": len(jobs)}
+
+@router.get("/{analysis_id}", response_model=JobStatusResponse)
+async def get_analysis_status(analysis_id: str):
+    """Get the status, stage timestamps and result id of an analysis"""
+    job = await job_queue.get(analysis_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Analysis {analysis_id} not found")
+    return job
+
+@router.delete("/{analysis_id}", response_model=AnalysisResponse)
+async def cancel_analysis(analysis_id: str):
+    """Cancel a queued analysis or stop a running one"""
+    job = await job_queue.cancel(analysis_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Analysis {analysis_id} not found")
+    
+    if job.status == "queued":
+        # Never started, so nothing else owns its input
+        await discard_input(job)
+        await supabase_service.update_file_status(job.file_id, "cancelled")
+        await update_attached_files(job_queue, job.id, "cancelled")
+        status, message = "cancelled", "Analysis cancelled"
+    elif job.status in ("running", "cancelling"):
+        # Stopped here right away, or by its consumer when it next renews the lease
+        job_runner.cancel(job.id)
+        status, message = "cancelling", "Analysis is being cancelled"
+    else:
+        raise HTTPException(status_code=409, detail=f"Analysis {analysis_id} is already {job.status}")
+    
+    return {
+        "id": analysis_id,
+        "status": status,
+        "message": message
+    }
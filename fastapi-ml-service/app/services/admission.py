@@ -0,0 +1,174 @@
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from app.config import (
+    ADMISSION_ENABLED, ADMISSION_MEMORY_BUDGET, ADMISSION_JOB_OVERHEAD, ADMISSION_RETRY_AFTER, CHUNK_ROWS
+)
+from app.models.schemas import ModelType
+from app.services.job_queue import Job, JobQueue, QueueFullError, job_queue, BATCH_MODEL_TYPE
+from app.services.loaders import detect_format, estimate_shape, ASSUMED_ROW_BYTES
+from app.services.ml_service import ml_service
+from app.services.models import MODEL_REGISTRY, get_required_columns
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Average in-memory bytes per cell of a loaded (compacted) frame
+BYTES_PER_CELL = 16
+
+# In-memory size of a frame relative to its file, when the shape cannot be estimated
+FORMAT_EXPANSION = {
+    "csv": 2.0,
+    "jsonl": 1.5,
+    "parquet": 5.0,
+    "feather": 1.5,
+    "arrow_stream": 1.5,
+    "excel": 3.0,
+}
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an analysis is not admitted. ``retry_after`` is the suggested
+    wait in seconds, or None if the analysis would never fit the budget.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def physical_memory() -> int:
+    """Total physical memory in bytes (8 GB if it cannot be determined)"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 8 * 1024 ** 3
+
+class AdmissionController:
+    """
+    Admits analysis jobs while their projected memory fits a budget.
+
+    Each job's peak memory is estimated from the shape of its file (or the file
+    size when the shape is unknown), the columns the model reads and the
+    model's ``memory_factor`` registry entry, i.e. its working memory as a
+    multiple of the dataset; models with ``pairwise_memory`` also hold a
+    condensed distance matrix. A job is queued only if its estimate fits next
+    to the estimates of all queued and running jobs, which the queue checks in
+    the same transaction that adds the job, so concurrent requests (and other
+    processes sharing the queue) cannot overshoot the budget.
+    """
+
+    def __init__(self, queue: JobQueue = job_queue, budget: int = ADMISSION_MEMORY_BUDGET,
+                 job_overhead: int = ADMISSION_JOB_OVERHEAD, retry_after: int = ADMISSION_RETRY_AFTER,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.queue = queue
+        self.budget = budget or int(physical_memory() * 0.75)
+        self.job_overhead = job_overhead
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self._stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "rejected_too_large": 0
+        }
+
+    def dataset_bytes(self, file_path: str, columns: Optional[List[str]] = None,
+                      max_rows: Optional[int] = None) -> Dict[str, int]:
+        """Estimated rows and in-memory bytes of a file's dataset, restricted to ``columns``"""
+        shape = estimate_shape(file_path)
+        if shape is None:
+            size = os.path.getsize(file_path)
+            rows = size // ASSUMED_ROW_BYTES
+            data_bytes = int(size * FORMAT_EXPANSION.get(detect_format(file_path), 3.0))
+            if max_rows is not None and rows > max_rows:
+                data_bytes, rows = data_bytes * max_rows // rows, max_rows
+            return {"rows": rows, "bytes": data_bytes}
+
+        rows, total_columns = shape
+        if max_rows is not None:
+            rows = min(rows, max_rows)
+        width = min(len(columns), total_columns) if columns is not None and total_columns else total_columns
+        return {"rows": rows, "bytes": rows * max(width, 1) * BYTES_PER_CELL}
+
+    def model_bytes(self, model_type: str, dataset: Dict[str, int]) -> int:
+        """Working memory of a model on a dataset, on top of the dataset itself"""
+        entry = MODEL_REGISTRY.get(model_type, {})
+        working = int(dataset["bytes"] * (entry.get("memory_factor", 2) - 1))
+        if entry.get("pairwise_memory"):
+            # Condensed float64 distance matrix
+            working += 4 * dataset["rows"] ** 2
+        return working + self.job_overhead
+
+    def estimate(self, file_path: str, model_type: str, parameters: Dict[str, Any]) -> int:
+        """Projected peak memory in bytes of one analysis"""
+        if ml_service.should_run_chunked(file_path, ModelType(model_type), parameters):
+            # Chunked models keep one batch and their aggregates in memory
+            dataset = self.dataset_bytes(file_path, get_required_columns(model_type, parameters), CHUNK_ROWS)
+            return dataset["bytes"] + self.job_overhead
+
+        dataset = self.dataset_bytes(file_path, get_required_columns(model_type, parameters))
+        return dataset["bytes"] + self.model_bytes(model_type, dataset)
+
+    def estimate_batch(self, file_path: str, specs: List[Dict[str, Any]]) -> int:
+        """Projected peak memory of a batch: one shared dataset and every model running at once"""
+        dataset = self.dataset_bytes(file_path)
+        return dataset["bytes"] + sum(self.model_bytes(spec["model_type"], dataset) for spec in specs)
+
+    def estimate_job(self, job: Job) -> int:
+        if job.model_type == BATCH_MODEL_TYPE:
+            return self.estimate_batch(job.file_path, job.parameters["specs"])
+        return self.estimate(job.file_path, job.model_type, job.parameters)
+
+    async def check_capacity(self) -> None:
+        """Reject early, before a file is stored, when the budget is already used up"""
+        if not self.enabled:
+            return
+        reserved = await self.queue.reserved_memory()
+        if reserved >= self.budget:
+            self._stats["rejected"] += 1
+            raise AdmissionRejected(
+                f"The service is at capacity ({reserved} of {self.budget} bytes reserved), retry later",
+                self.retry_after
+            )
+
+    async def enqueue(self, job: Job) -> Job:
+        """Estimate a job's memory and queue it if it fits; raises AdmissionRejected otherwise"""
+        job.memory_estimate = await asyncio.to_thread(self.estimate_job, job)
+        if not self.enabled:
+            return await self.queue.enqueue(job)
+
+        if job.memory_estimate > self.budget:
+            self._stats["rejected_too_large"] += 1
+            raise AdmissionRejected(
+                f"The analysis needs an estimated {job.memory_estimate} bytes, more than the "
+                f"memory budget of {self.budget} bytes"
+            )
+
+        try:
+            queued = await self.queue.enqueue(job, self.budget)
+        except QueueFullError as e:
+            self._stats["rejected"] += 1
+            logger.info(f"Rejected job {job.id} ({job.memory_estimate} bytes): {str(e)}")
+            raise AdmissionRejected(
+                f"The service is at capacity ({e.reserved} of {e.budget} bytes reserved), retry later",
+                self.retry_after
+            )
+
+        self._stats["admitted"] += 1
+        return queued
+
+    async def stats(self) -> Dict[str, Any]:
+        """Return admission counters, the budget and its current use"""
+        counts = await self.queue.counts()
+        return {
+            "enabled": self.enabled,
+            **self._stats,
+            "budget_bytes": self.budget,
+            "reserved_bytes": await self.queue.reserved_memory(),
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0) + counts.get("cancelling", 0)
+        }
+
+# Create a singleton instance
+admission_controller = AdmissionController()
@@ -0,0 +1,118 @@
+
+import pandas as pd
+import numpy as np
+import logging
+from datetime import date
+from typing import Dict, Optional, Tuple
+from app.config import COMPACT_CATEGORY_RATIO
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Characters that every value of a candidate date column must contain
+DATE_SEPARATORS = ("-", "/", ":")
+
+# Number of values checked before attempting to parse a whole column as dates
+DATE_SAMPLE_SIZE = 100
+
+def _downcast_integer(series: pd.Series) -> pd.Series:
+    # Arithmetic on the narrow type can overflow (int8 127 - -128), so models get widened columns
+    return pd.to_numeric(series, downcast="integer")
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    downcast = series.astype(np.float32)
+    if np.array_equal(downcast.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+        return downcast
+    return series
+
+def widen_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return a frame whose downcast numeric columns are int64 or float64 again, so
+    models compute in the same precision as on the uncompacted data. Columns that
+    are already wide are not copied.
+    """
+    narrow = [
+        position for position, dtype in enumerate(df.dtypes)
+        if not pd.api.types.is_bool_dtype(dtype) and (
+            (pd.api.types.is_signed_integer_dtype(dtype) and dtype != np.int64)
+            or (pd.api.types.is_float_dtype(dtype) and dtype != np.float64)
+        )
+    ]
+    if not narrow:
+        return df
+
+    widened = df.copy(deep=False)
+    for position in narrow:
+        series = df.iloc[:, position]
+        widened.isetitem(position, series.astype(np.float64 if pd.api.types.is_float_dtype(series) else np.int64))
+    return widened
+
+def _parse_dates(series: pd.Series) -> Optional[pd.Series]:
+    """Return the column parsed as datetimes, or None if it does not look like a date column"""
+    sample = series.dropna().head(DATE_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+
+    # Readers such as pyarrow return date cells as datetime.date objects
+    if not all(isinstance(v, date) or (isinstance(v, str) and any(sep in v for sep in DATE_SEPARATORS))
+               for v in sample):
+        return None
+
+    try:
+        if pd.to_datetime(sample, errors="coerce").isna().any():
+            return None
+        parsed = pd.to_datetime(series, errors="coerce")
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+    # Every non-empty value has to parse, otherwise this is not a date column
+    if parsed.notna().sum() != series.notna().sum():
+        return None
+    return parsed
+
+def compact_dataframe(df: pd.DataFrame,
+                      category_ratio: float = COMPACT_CATEGORY_RATIO) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Reduce the memory footprint of a freshly loaded frame without changing its values.
+
+    Integers are downcast to the smallest signed type that holds them, floats to
+    float32 when that round-trips exactly, object columns of date strings are parsed
+    once into datetimes and other object columns with few distinct values become
+    categoricals. Returns the compacted frame and a report of the bytes before and after.
+    Numeric columns are widened again (``widen_numeric``) before a model runs on them.
+    """
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    compacted = []
+
+    # Iterate by position so duplicate column names are handled correctly
+    for position, col in enumerate(df.columns):
+        series = df.iloc[:, position]
+
+        try:
+            if pd.api.types.is_bool_dtype(series):
+                compacted.append(series)
+            elif pd.api.types.is_integer_dtype(series):
+                compacted.append(_downcast_integer(series))
+            elif pd.api.types.is_float_dtype(series):
+                compacted.append(_downcast_float(series))
+            elif pd.api.types.is_object_dtype(series):
+                parsed = _parse_dates(series)
+                if parsed is not None:
+                    compacted.append(parsed)
+                elif len(series) > 0 and series.nunique() / len(series) <= category_ratio:
+                    compacted.append(series.astype("category"))
+                else:
+                    compacted.append(series)
+            else:
+                compacted.append(series)
+        except Exception as e:
+            logger.warning(f"Could not compact column {col}: {e}")
+            compacted.append(series)
+
+    result = pd.concat(compacted, axis=1) if compacted else df.copy()
+    result.columns = df.columns
+    result.attrs = dict(df.attrs)
+    bytes_after = int(result.memory_usage(deep=True).sum())
+
+    logger.info(f"Compacted dataset from {bytes_before} to {bytes_after} bytes")
+    return result, {"bytes_before": bytes_before, "bytes_after": bytes_after}
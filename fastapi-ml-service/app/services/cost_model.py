@@ -0,0 +1,210 @@
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import (
+    COST_MODEL_PATH, COST_BENCHMARK_ROWS, COST_BENCHMARK_TIMEOUT, FAST_LANE_SECONDS
+)
+from app.services.job_queue import Job, BATCH_MODEL_TYPE
+from app.services.loaders import estimate_shape, ASSUMED_ROW_BYTES
+from app.services.models import MODEL_REGISTRY, get_required_columns
+from app.services.models.benchmark import benchmark_model, benchmark_parameters, synthetic_frame
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cost shape of models without a "cost" registry entry: linear in the number of cells
+DEFAULT_COST = {
+    "rows": 1,
+    "columns": 1,
+    "parameters": {},
+    "seconds_per_unit": 1e-7,
+    "base": 0.05
+}
+
+# Columns assumed for files whose shape cannot be estimated
+ASSUMED_COLUMNS = 10
+
+# Runs a function on behalf of a model, like ExecutionEngine.run
+Runner = Callable[..., Awaitable[Any]]
+
+async def run_in_thread(model_type: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """Runner for benchmarks outside the execution engine"""
+    return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), timeout)
+
+def fit_line(samples: List[Tuple[float, float]]) -> Tuple[float, float]:
+    """Least-squares ``seconds = base + seconds_per_unit * units``, clamped to non-negative coefficients"""
+    units = np.array([sample[0] for sample in samples], dtype=float)
+    seconds = np.array([sample[1] for sample in samples], dtype=float)
+    spread = ((units - units.mean()) ** 2).sum()
+    slope = ((units - units.mean()) * (seconds - seconds.mean())).sum() / spread if spread else 0.0
+    if slope <= 0:
+        # Timing noise dominates: attribute everything to the largest run
+        return float(seconds.max() / units.max()), 0.0
+    return float(slope), float(max(seconds.mean() - slope * units.mean(), 0.0))
+
+class CostModel:
+    """
+    Estimates how long an analysis will run, to route jobs into lanes.
+
+    A model's cost is ``base + seconds_per_unit * units``, where the units grow
+    with the dataset as ``rows ** r * columns ** c`` (exponents from the
+    model's ``cost`` registry entry, 1 by default) and linearly with the
+    parameters listed there, relative to their defaults (e.g. ``epochs`` for
+    LSTM, ``perplexity`` for t-SNE). The registry coefficients are priors;
+    ``calibrate`` replaces them with ones fitted to a short benchmark on
+    synthetic data and saves them to ``path``, from where they are loaded on
+    the next start. Jobs estimated to finish within ``fast_lane_seconds`` go
+    to the fast lane.
+    """
+
+    def __init__(self, path: str = COST_MODEL_PATH, fast_lane_seconds: float = FAST_LANE_SECONDS):
+        self.path = path
+        self.fast_lane_seconds = fast_lane_seconds
+        self.calibrated: Dict[str, Dict[str, float]] = {}
+        self.calibrated_at: Optional[float] = None
+        self._calibration: Optional[asyncio.Task] = None
+        self.load()
+
+    def load(self) -> None:
+        """Load coefficients saved by an earlier calibration, if any"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            self.calibrated = saved["models"]
+            self.calibrated_at = saved.get("calibrated_at")
+            logger.info(f"Loaded cost model coefficients of {len(self.calibrated)} models from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load the cost model from {self.path}: {str(e)}")
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"calibrated_at": self.calibrated_at, "models": self.calibrated}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def spec(self, model_type: str) -> Dict[str, Any]:
+        """Cost shape and coefficients of a model, calibrated ones taking precedence"""
+        return {
+            **DEFAULT_COST,
+            **MODEL_REGISTRY.get(model_type, {}).get("cost", {}),
+            **self.calibrated.get(model_type, {})
+        }
+
+    def units(self, model_type: str, rows: int, columns: int, parameters: Dict[str, Any]) -> float:
+        spec = self.spec(model_type)
+        units = float(max(rows, 1)) ** spec["rows"] * float(max(columns, 1)) ** spec["columns"]
+        for name, default in spec["parameters"].items():
+            try:
+                units *= max(float(parameters.get(name, default)), 0.0) / default
+            except (TypeError, ValueError):
+                pass
+        return units
+
+    def predict(self, model_type: str, rows: int, columns: int, parameters: Dict[str, Any]) -> float:
+        """Estimated run time in seconds of a model on a dataset of the given shape"""
+        spec = self.spec(model_type)
+        return spec["base"] + spec["seconds_per_unit"] * self.units(model_type, rows, columns, parameters)
+
+    def shape(self, file_path: str) -> Tuple[int, int]:
+        shape = estimate_shape(file_path)
+        if shape is None:
+            return os.path.getsize(file_path) // ASSUMED_ROW_BYTES, ASSUMED_COLUMNS
+        return shape
+
+    def estimate(self, file_path: str, model_type: str, parameters: Dict[str, Any],
+                 shape: Optional[Tuple[int, int]] = None) -> float:
+        """Estimated run time in seconds of one analysis of a file"""
+        rows, columns = shape or self.shape(file_path)
+        required = get_required_columns(model_type, parameters)
+        if required is not None:
+            columns = min(len(required), columns) if columns else len(required)
+        return self.predict(model_type, rows, columns, parameters)
+
+    def estimate_job(self, job: Job) -> float:
+        """Estimated run time of a job; a batch costs the sum of its models"""
+        shape = self.shape(job.file_path)
+        if job.model_type == BATCH_MODEL_TYPE:
+            return sum(
+                self.estimate(job.file_path, spec["model_type"], spec.get("parameters", {}), shape)
+                for spec in job.parameters["specs"]
+            )
+        return self.estimate(job.file_path, job.model_type, job.parameters, shape)
+
+    def lane_for(self, cost: float) -> str:
+        return "fast" if cost <= self.fast_lane_seconds else "slow"
+
+    def assign(self, job: Job) -> Job:
+        """Set a job's cost estimate and lane"""
+        job.cost_estimate = self.estimate_job(job)
+        job.lane = self.lane_for(job.cost_estimate)
+        return job
+
+    async def calibrate(self, runner: Runner = run_in_thread, models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Benchmark each model on synthetic datasets of COST_BENCHMARK_ROWS rows
+        through ``runner`` and fit its coefficients. Models whose benchmark
+        fails (e.g. a missing optional dependency) keep their current ones.
+        """
+        sizes = sorted(int(size) for size in COST_BENCHMARK_ROWS.split(",") if size.strip())
+        calibrated = {}
+        for model_type in models or list(MODEL_REGISTRY):
+            parameters = benchmark_parameters(model_type)
+            columns = len(get_required_columns(model_type, parameters) or synthetic_frame(1).columns)
+            try:
+                # An untimed run first, so imports and first-call setup do not count
+                await runner(model_type, benchmark_model, model_type, min(sizes), timeout=COST_BENCHMARK_TIMEOUT)
+                samples = []
+                for rows in sizes:
+                    seconds = await runner(model_type, benchmark_model, model_type, rows, timeout=COST_BENCHMARK_TIMEOUT)
+                    samples.append((self.units(model_type, rows, columns, parameters), seconds))
+            except Exception as e:
+                logger.warning(f"Could not benchmark {model_type}, keeping its cost coefficients: {str(e)}")
+                continue
+
+            seconds_per_unit, base = fit_line(samples)
+            calibrated[model_type] = {"seconds_per_unit": seconds_per_unit, "base": base}
+            logger.info(f"Calibrated {model_type}: {base:.3f}s + {seconds_per_unit:.3g}s per unit")
+
+        self.calibrated.update(calibrated)
+        self.calibrated_at = time.time()
+        self.save()
+        return calibrated
+
+    def start_calibration(self, runner: Runner = run_in_thread) -> None:
+        """Calibrate in the background; estimates use the current coefficients until it ends"""
+        if self._calibration is None or self._calibration.done():
+            self._calibration = asyncio.create_task(self.calibrate(runner))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the lane threshold and the coefficients in use"""
+        return {
+            "fast_lane_seconds": self.fast_lane_seconds,
+            "calibrated_at": self.calibrated_at,
+            "calibrating": self._calibration is not None and not self._calibration.done(),
+            "models": {
+                model_type: {
+                    "seconds_per_unit": spec["seconds_per_unit"],
+                    "base": spec["base"],
+                    "calibrated": model_type in self.calibrated
+                }
+                for model_type, spec in ((model_type, self.spec(model_type)) for model_type in MODEL_REGISTRY)
+            }
+        }
+
+# Create a singleton instance
+cost_model = CostModel()
+
+if __name__ == "__main__":
+    # Offline calibration: python -m app.services.cost_model [model ...]
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    coefficients = asyncio.run(cost_model.calibrate(models=sys.argv[1:] or None))
+    print(json.dumps(coefficients, indent=2))
@@ -0,0 +1,333 @@
+
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence, Set
+from app.config import (
+    DATASET_CACHE_MEMORY_BYTES, DATASET_CACHE_DIR, DATASET_CACHE_DISK_BYTES,
+    ARROW_HANDOFF_DIR, ARROW_HANDOFF_MAX_BYTES
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    # Parquet support for the on-disk tier and Arrow IPC for worker handoff
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    has_pyarrow = True
+except ImportError:
+    has_pyarrow = False
+    logger.warning("pyarrow not available. The on-disk dataset cache tier is disabled.")
+
+# Parquet metadata key of a cached frame's compaction report (df.attrs["memory_usage"])
+MEMORY_USAGE_METADATA = b"ml_service.memory_usage"
+
+@dataclass
+class DatasetHandle:
+    """
+    Reference to a parsed dataset that can be sent cheaply to another process.
+
+    Normally this points at an Arrow IPC file that the receiver memory-maps; when
+    the frame cannot be written as Arrow it carries the frame itself instead.
+    ``source`` and ``columns`` say where the dataset was parsed from, so the
+    receiver can parse it again if the file is gone.
+    """
+    key: str
+    path: Optional[str] = None
+    frame: Optional[pd.DataFrame] = None
+    memory_usage: Optional[Dict[str, int]] = None
+    source: Optional[str] = None
+    columns: Optional[List[str]] = None
+
+def open_dataset(handle: DatasetHandle) -> pd.DataFrame:
+    """
+    Open the dataset behind a handle.
+
+    Arrow IPC files are memory-mapped, so numeric columns without nulls become
+    zero-copy, read-only NumPy views over the page cache. Processes opening the
+    same file therefore share one physical copy of the data.
+    """
+    if handle.path is None:
+        return handle.frame
+
+    source = pa.memory_map(handle.path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+class DatasetCache:
+    """
+    Two-tier cache of parsed datasets keyed by the content hash of the source file.
+
+    The memory tier is an LRU bounded by the total in-memory size of the cached
+    frames. The disk tier stores each frame as a Parquet file so that a dataset
+    evicted from memory (or parsed by a previous process) never has to be parsed
+    from the original workbook again.
+
+    Frames loaded with a column projection are cached under a key derived from
+    the content hash and the column list. A projected lookup is also served from
+    the full frame of the same content when that is cached.
+
+    Handoff files are counted while their handles are in use (from ``export``
+    until ``release``) and are not evicted in that time.
+    """
+
+    def __init__(self, max_memory_bytes: int = DATASET_CACHE_MEMORY_BYTES,
+                 disk_dir: Optional[str] = DATASET_CACHE_DIR,
+                 max_disk_bytes: int = DATASET_CACHE_DISK_BYTES,
+                 handoff_dir: Optional[str] = ARROW_HANDOFF_DIR,
+                 max_handoff_bytes: int = ARROW_HANDOFF_MAX_BYTES):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir if disk_dir and has_pyarrow else None
+        self.max_disk_bytes = max_disk_bytes
+        self.handoff_dir = handoff_dir if handoff_dir and has_pyarrow else None
+        self.max_handoff_bytes = max_handoff_bytes
+        self._entries: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._memory_bytes = 0
+        self._handoff_refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "handoff_exports": 0,
+            "handoff_reuses": 0,
+            "handoff_evictions": 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        if self.handoff_dir:
+            os.makedirs(self.handoff_dir, exist_ok=True)
+
+    def get(self, key: str, columns: Optional[Sequence[str]] = None) -> Optional[pd.DataFrame]:
+        """Return the cached frame for a content hash (and optional projection), or None on a miss"""
+        candidates = [key] if columns is None else [self.projection_key(key, columns), key]
+
+        with self._lock:
+            for candidate in candidates:
+                if candidate in self._entries:
+                    self._entries.move_to_end(candidate)
+                    self._stats["memory_hits"] += 1
+                    return self._project(self._entries[candidate], candidate, key, columns)
+
+        for candidate in candidates:
+            df = self._read_disk(candidate)
+            if df is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                self._put_memory(candidate, df)
+                return self._project(df, candidate, key, columns)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame, columns: Optional[Sequence[str]] = None) -> None:
+        """Store a parsed frame in both tiers"""
+        if columns is not None:
+            key = self.projection_key(key, columns)
+        self._put_memory(key, df)
+        self._write_disk(key, df)
+
+    def export(self, key: str, df: pd.DataFrame) -> DatasetHandle:
+        """
+        Persist a frame as an uncompressed Arrow IPC file for other processes to memory-map.
+
+        The file is named after the dataset key, so concurrent analyses of the same
+        content reuse a single file instead of each receiving a pickled copy.
+        """
+        if not self.handoff_dir or not all(isinstance(col, str) for col in df.columns):
+            return DatasetHandle(key=key, frame=df)
+
+        path = os.path.join(self.handoff_dir, f"{key}.arrow")
+        with self._lock:
+            self._handoff_refs[path] = self._handoff_refs.get(path, 0) + 1
+        if os.path.exists(path):
+            os.utime(path)
+            with self._lock:
+                self._stats["handoff_reuses"] += 1
+            return DatasetHandle(key=key, path=path)
+
+        partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=None)
+            with pa.OSFile(partial_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(partial_path, path)
+        except Exception as e:
+            logger.warning(f"Error exporting dataset {key} as Arrow, sending it inline: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            self._unref(path)
+            return DatasetHandle(key=key, frame=df)
+
+        with self._lock:
+            self._stats["handoff_exports"] += 1
+        self._evict_handoff()
+        return DatasetHandle(key=key, path=path)
+
+    def release(self, handle: DatasetHandle) -> None:
+        """Mark a handle returned by ``export`` as no longer used, so its file may be evicted"""
+        if handle.path is None:
+            return
+        self._unref(handle.path)
+        self._evict_handoff()
+
+    def _unref(self, path: str) -> None:
+        with self._lock:
+            remaining = self._handoff_refs.get(path, 0) - 1
+            if remaining > 0:
+                self._handoff_refs[path] = remaining
+            else:
+                self._handoff_refs.pop(path, None)
+
+    def _evict_handoff(self) -> None:
+        # Files whose handles are in use stay, even beyond the size limit, until they are released
+        with self._lock:
+            in_use = set(self._handoff_refs)
+        self._evict_files(self.handoff_dir, ".arrow", self.max_handoff_bytes, "handoff_evictions", in_use)
+
+    @staticmethod
+    def projection_key(key: str, columns: Sequence[str]) -> str:
+        """Cache key of a column projection of the dataset with the given content hash"""
+        digest = hashlib.sha256(json.dumps(list(columns), default=str).encode()).hexdigest()[:16]
+        return f"{key}-{digest}"
+
+    @staticmethod
+    def _project(df: pd.DataFrame, candidate: str, key: str,
+                 columns: Optional[Sequence[str]]) -> Optional[pd.DataFrame]:
+        # Serving a projection from the full frame only needs a column selection
+        if columns is not None and candidate == key:
+            if any(col not in df.columns for col in columns):
+                return None
+            return df[list(columns)]
+        return df.copy(deep=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current tier sizes"""
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_enabled": self.disk_dir is not None
+            }
+
+    def _put_memory(self, key: str, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_memory_bytes:
+            logger.info(f"Dataset {key} ({size} bytes) exceeds the memory cache budget, not caching in memory")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._sizes[key]
+            self._entries[key] = df
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._memory_bytes += size
+
+            # Evict least recently used entries until we fit the budget
+            while self._memory_bytes > self.max_memory_bytes and len(self._entries) > 1:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._memory_bytes -= self._sizes.pop(evicted_key)
+                self._stats["evictions"] += 1
+                logger.info(f"Evicted dataset {evicted_key} from memory cache")
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.parquet")
+
+    def _read_disk(self, key: str) -> Optional[pd.DataFrame]:
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            table = pq.read_table(path)
+            df = table.to_pandas()
+            # Parquet does not keep pandas attrs; the compaction report travels in the file metadata
+            report = (table.schema.metadata or {}).get(MEMORY_USAGE_METADATA)
+            if report is not None:
+                df.attrs["memory_usage"] = json.loads(report)
+            # Touch the file so disk eviction follows access order
+            os.utime(path)
+            return df
+        except Exception as e:
+            logger.warning(f"Error reading cached dataset {key} from disk: {e}")
+            return None
+
+    def _write_disk(self, key: str, df: pd.DataFrame) -> None:
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+
+        # Parquet requires string column names; renaming them would change the frame
+        if not all(isinstance(col, str) for col in df.columns):
+            logger.info(f"Dataset {key} has non-string column names, not caching on disk")
+            return
+
+        partial_path = f"{path}.part"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            if "memory_usage" in df.attrs:
+                table = table.replace_schema_metadata({
+                    **(table.schema.metadata or {}),
+                    MEMORY_USAGE_METADATA: json.dumps(df.attrs["memory_usage"]).encode()
+                })
+            pq.write_table(table, partial_path)
+            os.replace(partial_path, path)
+        except Exception as e:
+            logger.warning(f"Error writing dataset {key} to disk cache: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return
+
+        self._evict_files(self.disk_dir, ".parquet", self.max_disk_bytes, "disk_evictions")
+
+    def _evict_files(self, directory: str, suffix: str, max_bytes: int, counter: str,
+                     keep: Optional[Set[str]] = None) -> None:
+        # Remove the least recently used files (other than those to keep) until the directory fits its budget
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(suffix):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            if keep and path in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self._stats[counter] += 1
+            logger.info(f"Evicted {path} from {directory}")
+
+# Create a singleton instance
+dataset_cache = DatasetCache()
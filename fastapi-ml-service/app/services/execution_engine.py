@@ -0,0 +1,419 @@
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import (
+    EXECUTION_ENGINE, EXECUTION_POOLS, WORKER_WARMUP, THREAD_BUDGET, THREADS_PER_TASK, PROCESS_CORES,
+    MODEL_TIMEOUT, MAX_MODEL_TIMEOUT
+)
+from app.services.models import MODEL_REGISTRY
+from app.services.models.benchmark import warm_up
+from app.services.thread_governor import ThreadGovernor, thread_limits, worker_environment
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Pool used by models without a "worker_pool" entry in the registry
+DEFAULT_POOL = "default"
+
+# Pool that runs fast-lane work of those models, if configured
+FAST_POOL = "fast"
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process exits while running a task"""
+
+class ExecutionTimeoutError(TimeoutError):
+    """Raised when a task runs past its wall-clock budget"""
+
+def parse_pools(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse a pool specification such as ``default=4:100,tensorflow=1:10`` into
+    ``{name: (workers, max_tasks_per_child)}``. A missing or zero task limit
+    means workers are never recycled.
+    """
+    pools = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = entry.partition("=")
+        workers, _, max_tasks = value.partition(":")
+        pools[name.strip()] = (max(1, int(workers)), int(max_tasks or 0))
+    pools.setdefault(DEFAULT_POOL, (1, 0))
+    return pools
+
+def parse_warmup(spec: str) -> List[str]:
+    """Expand a comma-separated list of model types and categories into model types"""
+    models: List[str] = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        if entry in MODEL_REGISTRY:
+            matches = [entry]
+        else:
+            matches = [name for name, info in MODEL_REGISTRY.items() if info.get("category") == entry]
+            if not matches:
+                logger.warning(f"Unknown model type or category {entry!r} in WORKER_WARMUP")
+        models.extend(model for model in matches if model not in models)
+    return models
+
+def _worker_main(conn, env: Dict[str, str]) -> None:
+    # Interrupts go to the parent, which shuts the workers down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Size the thread pools of libraries that are loaded from here on
+    os.environ.update(env)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        fn, args, kwargs, threads = task
+        try:
+            with thread_limits(threads):
+                reply = ("ok", fn(*args, **kwargs))
+        except BaseException as e:
+            reply = ("error", e, traceback.format_exc())
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send(("error", RuntimeError(f"Could not return result from worker: {e}"), traceback.format_exc()))
+
+class Worker:
+    """A worker process and the parent's end of its pipe"""
+
+    def __init__(self, context, pool_name: str, env: Optional[Dict[str, str]] = None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, env or {}), daemon=True,
+                                       name=f"ml-worker-{pool_name}")
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.killed = False
+
+    def call(self, fn: Callable, args: tuple, kwargs: dict, threads: Optional[int] = None) -> Any:
+        """Run a task in the worker with a native thread budget, blocking until it replies"""
+        try:
+            self.conn.send((fn, args, kwargs, threads))
+            reply = self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerCrashedError(f"Worker process {self.process.pid} exited with code {self.process.exitcode}")
+        finally:
+            self.tasks += 1
+
+        if reply[0] == "error":
+            _, error, remote_traceback = reply
+            logger.debug(f"Task failed in worker {self.process.pid}:\n{remote_traceback}")
+            raise error
+        return reply[1]
+
+    def kill(self) -> None:
+        """Terminate the worker in the middle of a task"""
+        self.killed = True
+        if self.process.is_alive():
+            self.process.kill()
+
+    def stop(self, timeout: float = 5) -> None:
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class WorkerPool:
+    """
+    A fixed number of worker processes that run one task at a time each.
+
+    Workers are started on first use and replaced after ``max_tasks_per_child``
+    tasks (or when they crash), which bounds the memory that leaky libraries
+    can accumulate in a long-lived process. Blocking pipe I/O happens on a
+    private thread per worker, so the event loop only awaits futures.
+
+    Every new worker first runs the models in ``warmup`` once on a small
+    dataset, and only then takes tasks, so the first real task of a model
+    does not pay for importing and initializing its libraries.
+
+    With a ``governor``, each task runs with the native threads it grants,
+    which are returned when the task ends.
+    """
+
+    def __init__(self, name: str, size: int, max_tasks_per_child: int = 0,
+                 warmup: Optional[List[str]] = None, governor: Optional[ThreadGovernor] = None):
+        self.name = name
+        self.size = size
+        self.max_tasks_per_child = max_tasks_per_child
+        self.warmup = warmup or []
+        self.governor = governor
+        self._context = multiprocessing.get_context("spawn")
+        self._io = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"pool-{name}")
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[Worker] = []
+        self._start_lock = asyncio.Lock()
+        self._waiting = 0
+        self._stats = {
+            "tasks_completed": 0,
+            "tasks_failed": 0,
+            "workers_recycled": 0,
+            "workers_crashed": 0,
+            "workers_killed": 0,
+            "workers_started": 0
+        }
+        # Seconds the last worker took to start, and to warm up
+        self._start_seconds: Optional[float] = None
+        self._warmup_seconds: Optional[Dict[str, float]] = None
+
+    async def start(self) -> None:
+        """Start the worker processes if they are not running yet"""
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            loop = asyncio.get_running_loop()
+            workers = await asyncio.gather(*(
+                loop.run_in_executor(self._io, self._spawn) for _ in range(self.size)
+            ))
+            self._idle = asyncio.Queue()
+            for worker in workers:
+                self._workers.append(worker)
+                self._idle.put_nowait(worker)
+            logger.info(f"Started {self.size} workers in pool {self.name}")
+
+    def _spawn(self) -> Worker:
+        # Runs on an I/O thread: start a worker process and warm it up before it takes tasks
+        started = time.perf_counter()
+        threads = self.governor.per_task if self.governor is not None else None
+        worker = Worker(self._context, self.name, worker_environment(threads) if threads else None)
+        if self.warmup:
+            try:
+                self._warmup_seconds = worker.call(warm_up, (self.warmup,), {}, threads)
+            except Exception as e:
+                logger.warning(f"Warm-up of worker {worker.process.pid} in pool {self.name} failed: {str(e)}")
+            worker.tasks = 0
+        self._start_seconds = round(time.perf_counter() - started, 3)
+        self._stats["workers_started"] += 1
+        return worker
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None,
+                  max_threads: Optional[int] = None, **kwargs) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` in a worker process and return its result,
+        with at most ``max_threads`` native threads.
+
+        If the task runs longer than ``timeout`` seconds, or the caller is
+        cancelled while it runs, the worker is killed (and replaced).
+        """
+        if self._idle is None:
+            await self.start()
+
+        self._waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self._waiting -= 1
+
+        threads = None
+        if self.governor is not None:
+            try:
+                threads = await self.governor.acquire(max_threads)
+            except asyncio.CancelledError:
+                self._idle.put_nowait(worker)
+                raise
+
+        loop = asyncio.get_running_loop()
+        future = self._io.submit(worker.call, fn, args, kwargs, threads)
+        # The worker and its threads go back to the pool when the task really ends, even if the caller stops waiting
+        future.add_done_callback(
+            lambda f: loop.is_closed() or loop.call_soon_threadsafe(self._task_done, worker, f, threads)
+        )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            worker.kill()
+            raise ExecutionTimeoutError(f"Task exceeded its {timeout:g}s time limit in pool {self.name}") from None
+        except asyncio.CancelledError:
+            worker.kill()
+            raise
+
+    def _task_done(self, worker: Worker, future, threads: Optional[int] = None) -> None:
+        if threads:
+            self.governor.release(threads)
+        if self._idle is None:
+            # The pool was shut down while the task ran and has stopped its workers
+            return
+        error = None if future.cancelled() else future.exception()
+        if error is None and not future.cancelled():
+            self._stats["tasks_completed"] += 1
+        else:
+            self._stats["tasks_failed"] += 1
+
+        crashed = isinstance(error, WorkerCrashedError) or not worker.process.is_alive()
+        if crashed:
+            self._stats["workers_killed" if worker.killed else "workers_crashed"] += 1
+            asyncio.get_running_loop().create_task(self._replace(worker))
+        elif self.max_tasks_per_child and worker.tasks >= self.max_tasks_per_child:
+            self._stats["workers_recycled"] += 1
+            asyncio.get_running_loop().create_task(self._replace(worker))
+        else:
+            self._idle.put_nowait(worker)
+
+    async def _replace(self, worker: Worker) -> None:
+        if self._idle is None:
+            return
+        loop = asyncio.get_running_loop()
+        self._workers.remove(worker)
+        await loop.run_in_executor(self._io, worker.stop)
+        if self._idle is None:
+            # The pool was shut down while the worker stopped
+            return
+        replacement = await loop.run_in_executor(self._io, self._spawn)
+        self._workers.append(replacement)
+        self._idle.put_nowait(replacement)
+        logger.info(f"Replaced worker {worker.process.pid} of pool {self.name} after {worker.tasks} tasks")
+
+    def shutdown(self) -> None:
+        """Stop all worker processes"""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._idle = None
+        self._io.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            **self._stats,
+            "workers": len(self._workers),
+            "busy": len(self._workers) - idle if self._idle is not None else 0,
+            "waiting": self._waiting,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "warmup": self.warmup,
+            "last_start_seconds": self._start_seconds,
+            "last_warmup_seconds": self._warmup_seconds
+        }
+
+class ExecutionEngine:
+    """
+    Runs model work outside the event loop.
+
+    In ``process`` mode each model runs in the worker pool named by its
+    ``worker_pool`` registry entry (the default pool otherwise), so e.g.
+    TensorFlow and Prophet fits get dedicated processes that are recycled more
+    often than the general-purpose workers. Fast-lane work of the other models
+    runs in the ``fast`` pool if there is one, so cheap analyses do not wait
+    behind long fits for a default worker. In ``thread`` mode work runs in the
+    event loop's default thread pool instead.
+
+    Runs are bounded by a wall-clock budget (see ``timeout_for``). A worker
+    process that exceeds it is killed; in thread mode the caller only stops
+    waiting, since threads cannot be interrupted.
+
+    The models named in ``warmup`` are warmed up in the workers of every pool
+    that can run them, and those pools start with the service instead of on
+    first use. The latency of each model's first run is recorded.
+
+    In ``process`` mode a ThreadGovernor shares ``thread_budget`` native
+    threads (this process's share of the cores by default) among the runs of all pools, by
+    default ``thread_budget`` divided by the number of workers per run, so
+    concurrent BLAS, OpenMP, XGBoost and TensorFlow pools do not oversubscribe
+    the cores.
+    """
+
+    def __init__(self, mode: str = EXECUTION_ENGINE, pools: str = EXECUTION_POOLS, warmup: str = WORKER_WARMUP,
+                 thread_budget: int = THREAD_BUDGET, threads_per_task: int = THREADS_PER_TASK):
+        self.mode = mode
+        pool_sizes = parse_pools(pools)
+        thread_budget = thread_budget or PROCESS_CORES
+        slots = sum(workers for workers, _ in pool_sizes.values())
+        self.governor = ThreadGovernor(thread_budget, threads_per_task or max(1, thread_budget // slots))
+        self.pools = {
+            name: WorkerPool(name, workers, max_tasks, governor=self.governor)
+            for name, (workers, max_tasks) in pool_sizes.items()
+        }
+        for model_type in parse_warmup(warmup):
+            for lane in (None, "fast"):
+                pool = self.pool_for(model_type, lane)
+                if model_type not in pool.warmup:
+                    pool.warmup.append(model_type)
+        self._first_runs: Dict[str, float] = {}
+
+    async def start(self) -> None:
+        """Start the pools that warm up their workers, so they are ready before the first job"""
+        if self.mode != "process":
+            return
+        await asyncio.gather(*(pool.start() for pool in self.pools.values() if pool.warmup))
+
+    def timeout_for(self, model_type: str, parameters: Optional[Dict[str, Any]] = None) -> float:
+        """
+        Wall-clock budget of a model run in seconds: the request's
+        ``timeout_seconds`` if given (capped at MAX_MODEL_TIMEOUT), else the
+        model's registry ``timeout``, else MODEL_TIMEOUT.
+        """
+        requested = (parameters or {}).get("timeout_seconds")
+        if requested is None:
+            return float(MODEL_REGISTRY.get(model_type, {}).get("timeout", MODEL_TIMEOUT))
+        try:
+            timeout = float(requested)
+        except (TypeError, ValueError):
+            raise ValueError(f"timeout_seconds must be a number, got {requested!r}")
+        if timeout <= 0:
+            raise ValueError("timeout_seconds must be positive")
+        return min(timeout, MAX_MODEL_TIMEOUT)
+
+    def pool_for(self, model_type: str, lane: Optional[str] = None) -> WorkerPool:
+        """The pool that runs a given model type in a given lane"""
+        name = MODEL_REGISTRY.get(model_type, {}).get("worker_pool", DEFAULT_POOL)
+        if name == DEFAULT_POOL and lane == "fast" and FAST_POOL in self.pools:
+            name = FAST_POOL
+        return self.pools.get(name, self.pools[DEFAULT_POOL])
+
+    async def run(self, model_type: str, fn: Callable, *args, timeout: Optional[float] = None,
+                  lane: Optional[str] = None, **kwargs) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` on behalf of a model and await its result,
+        raising ExecutionTimeoutError after ``timeout`` seconds.
+        """
+        started = time.perf_counter()
+        if self.mode == "process":
+            max_threads = MODEL_REGISTRY.get(model_type, {}).get("max_threads")
+            result = await self.pool_for(model_type, lane).run(
+                fn, *args, timeout=timeout, max_threads=max_threads, **kwargs
+            )
+        else:
+            try:
+                result = await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), timeout)
+            except asyncio.TimeoutError:
+                # Threads cannot be killed; the model keeps running until it returns
+                logger.warning(f"{model_type} exceeded its {timeout:g}s time limit, its thread keeps running")
+                raise ExecutionTimeoutError(f"Task exceeded its {timeout:g}s time limit") from None
+        
+        if model_type not in self._first_runs:
+            self._first_runs[model_type] = round(time.perf_counter() - started, 3)
+            logger.info(f"First {model_type} run took {self._first_runs[model_type]:.3f}s")
+        return result
+
+    def shutdown(self) -> None:
+        """Stop the worker processes of all pools"""
+        for pool in self.pools.values():
+            pool.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-pool worker and task counters"""
+        return {
+            "mode": self.mode,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()} if self.mode == "process" else {},
+            "threads": self.governor.stats() if self.mode == "process" else {},
+            "first_run_seconds": self._first_runs
+        }
+
+# Create a singleton instance
+execution_engine = ExecutionEngine()
@@ -0,0 +1,94 @@
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator
+from fastapi import UploadFile
+from app.config import UPLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE, UPLOAD_DIR
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class FileTooLargeError(ValueError):
+    """Raised when a streamed file exceeds the configured maximum size"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum allowed size of {max_size} bytes")
+        self.max_size = max_size
+
+@dataclass
+class StoredFile:
+    """A file written to local disk together with its size and content hash"""
+    path: str
+    size: int
+    sha256: str
+
+async def write_chunks(chunks: AsyncIterator[bytes], destination: str,
+                       max_size: int = MAX_UPLOAD_SIZE) -> StoredFile:
+    """
+    Write an async stream of byte chunks to disk, hashing and counting as they arrive.
+
+    The data is written to a temporary ``.part`` file that is only moved into place
+    once the stream completes, so a failed or oversized transfer never leaves a
+    truncated file behind.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = f"{destination}.part"
+
+    try:
+        with open(partial_path, "wb") as out:
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise FileTooLargeError(max_size)
+                digest.update(chunk)
+                out.write(chunk)
+
+        os.replace(partial_path, destination)
+
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return StoredFile(path=destination, size=size, sha256=digest.hexdigest())
+
+def hash_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Compute the SHA-256 digest of a file on disk without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def upload_path(analysis_id: str, filename: str) -> str:
+    """Local path for the input file of an analysis, unique per analysis"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    return os.path.join(UPLOAD_DIR, f"{analysis_id}_{os.path.basename(filename or 'upload')}")
+
+async def iter_upload(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an uploaded file in bounded chunks"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+async def iter_file(file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a local file in bounded chunks, reading off the event loop"""
+    with open(file_path, "rb") as source:
+        while True:
+            chunk = await asyncio.to_thread(source.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+async def save_upload(file: UploadFile, destination: str,
+                      max_size: int = MAX_UPLOAD_SIZE) -> StoredFile:
+    """Copy an uploaded file to disk in chunks so peak memory stays bounded"""
+    stored = await write_chunks(iter_upload(file), destination, max_size)
+    logger.info(f"Saved upload to {destination} ({stored.size} bytes, sha256={stored.sha256})")
+    return stored
@@ -0,0 +1,900 @@
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import JOB_QUEUE_BACKEND, JOB_QUEUE_DB, JOB_QUEUE_URL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from app.services.models import MODEL_REGISTRY, canonical_parameters, analysis_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    # Import psycopg for the Postgres job queue shared by API and workers on several hosts
+    import psycopg
+    has_psycopg = True
+except ImportError:
+    has_psycopg = False
+    logger.warning("psycopg not available. The postgres job queue backend is disabled.")
+
+# Priority classes, claimed in this order
+PRIORITIES = {
+    "high": 0,
+    "normal": 1,
+    "low": 2,
+}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+# Model type recorded for batch jobs, whose parameters hold a list of model specs
+BATCH_MODEL_TYPE = "batch"
+
+@dataclass
+class Job:
+    """An analysis waiting in (or claimed from) the job queue"""
+    id: str
+    file_id: str
+    model_type: str
+    industry: str
+    file_path: str
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    content_hash: Optional[str] = None
+    priority: int = PRIORITIES["normal"]
+    status: str = "queued"
+    attempts: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires: Optional[float] = None
+    created_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result_id: Optional[str] = None
+    results: Optional[List[Dict[str, Any]]] = None
+    dedup_key: Optional[str] = None
+    memory_estimate: int = 0
+    cost_estimate: float = 0.0
+    lane: str = "slow"
+    # Copy of the input in storage ("bucket/path") for consumers on other hosts
+    input_path: Optional[str] = None
+    error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Public view of the job, without the locations of its input"""
+        return {
+            "id": self.id,
+            "file_id": self.file_id,
+            "model_type": self.model_type,
+            "industry": self.industry,
+            "parameters": self.parameters,
+            "priority": PRIORITY_NAMES.get(self.priority, str(self.priority)),
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "updated_at": self.updated_at,
+            "result_id": self.result_id,
+            "results": self.results,
+            "memory_estimate": self.memory_estimate,
+            "cost_estimate": self.cost_estimate,
+            "lane": self.lane,
+            "error": self.error
+        }
+
+class QueueFullError(Exception):
+    """Raised when a job does not fit the memory budget of the queued and running jobs"""
+
+    def __init__(self, reserved: int, budget: int):
+        super().__init__(f"Queued and running analyses reserve {reserved} of {budget} bytes")
+        self.reserved = reserved
+        self.budget = budget
+
+# Lease owner recorded for jobs claimed by this process. The random part tells a
+# restarted process apart from its predecessor when the pid is reused (e.g. pid 1)
+CONSUMER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# A DB-API connection with sqlite3's ``execute``/``executemany`` and ``?`` placeholders
+Connection = Any
+
+class JobQueue(ABC):
+    """
+    Persistent priority queue and registry of analysis jobs.
+
+    Jobs are claimed in priority order (then oldest first) under a lease. A
+    consumer extends the lease while it works and acknowledges the job when it
+    is done; if it dies instead, the lease runs out and the job is delivered
+    again, so every job runs at least once. Jobs that keep losing their lease
+    are failed after ``max_attempts`` deliveries.
+
+    A queued job is cancelled on the spot; a running one is marked
+    ``cancelling`` and its consumer, which polls its lease, stops it and
+    acknowledges it as ``cancelled``.
+
+    Jobs the queue ends without a consumer (cancellations whose consumer went
+    away, jobs that lost their lease too often) are collected for
+    ``take_ended``, so a consumer can clean up their files and records.
+
+    A job whose content hash, model, industry and parameters match a job that
+    is still queued or running is not added; the request attaches to the
+    existing job instead (single flight), and the files of attached requests
+    get the existing job's outcome.
+
+    Finished jobs stay in the table with their timestamps and ``result_id``,
+    and every status change is recorded in ``job_events``, so the queue also
+    answers status queries without touching Supabase.
+
+    Consumers of a ``distributed`` queue may run on other hosts than the API,
+    so they fetch job inputs from storage (``Job.input_path``) instead of the
+    API's UPLOAD_DIR.
+    """
+
+    distributed = False
+
+    def __init__(self, lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._available = asyncio.Event()
+        self._ended: List[Job] = []
+        self.coalesced = 0
+
+    @abstractmethod
+    async def enqueue(self, job: Job, memory_budget: Optional[int] = None) -> Job:
+        """Persist a new job, or attach it to an identical queued or running job and return that one"""
+
+    @abstractmethod
+    async def add_finished(self, job: Job, result_id: str, detail: Optional[str] = None) -> Job:
+        """Register a job that was answered without running"""
+
+    @abstractmethod
+    async def reserved_memory(self) -> int:
+        """Sum of the memory estimates of the queued and running jobs"""
+
+    @abstractmethod
+    async def attached_files(self, job_id: str) -> List[str]:
+        """Files of requests that attached to a job, other than the job's own file"""
+
+    @abstractmethod
+    async def claim(self, owner: str, max_priority: Optional[int] = None,
+                    lane: Optional[str] = None) -> Optional[Job]:
+        """Lease the next job, or return None if nothing is available"""
+
+    @abstractmethod
+    async def extend_lease(self, job_id: str, owner: str) -> Optional[str]:
+        """Push back the lease of a running job, returning its status or None if the lease was lost"""
+
+    @abstractmethod
+    async def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None,
+                     result_id: Optional[str] = None, results: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """Acknowledge a job with its final status; False if another consumer owns it now"""
+
+    @abstractmethod
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job, returning it as it was before the call"""
+
+    @abstractmethod
+    async def recover(self) -> int:
+        """Requeue jobs abandoned by consumers that are gone"""
+
+    @abstractmethod
+    async def release(self, owner: str) -> int:
+        """Requeue the jobs leased by a consumer that is stopping"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job with its history and queue position"""
+
+    @abstractmethod
+    async def list_jobs(self, status: Optional[str] = None, model_type: Optional[str] = None,
+                        industry: Optional[str] = None, file_id: Optional[str] = None,
+                        since: Optional[float] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Summaries of the most recent jobs matching every given filter, newest first"""
+
+    @abstractmethod
+    async def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+
+    def take_ended(self) -> List[Job]:
+        """
+        Jobs the queue has ended on its own since the last call. Their temp
+        files and file records (and those of attached requests) still need to
+        be cleaned up.
+        """
+        ended, self._ended = self._ended, []
+        return ended
+
+    async def wait(self, timeout: float) -> None:
+        """Wait until a job is enqueued by this process or the timeout elapses"""
+        try:
+            await asyncio.wait_for(self._available.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._available.clear()
+
+class SQLJobQueue(JobQueue):
+    """
+    JobQueue in the ``jobs``, ``job_events`` and ``job_attachments`` tables of
+    a SQL database. Each operation is one transaction run in a worker thread;
+    subclasses provide the connection and the transactions, and the row locks
+    that keep concurrent consumers from claiming the same job.
+    """
+
+    COLUMNS = [
+        "id", "file_id", "model_type", "industry", "file_path", "parameters", "content_hash",
+        "priority", "status", "attempts", "lease_owner", "lease_expires", "created_at", "updated_at",
+        "started_at", "finished_at", "result_id", "results", "dedup_key", "memory_estimate", "cost_estimate",
+        "lane", "input_path", "error"
+    ]
+
+    # Row locks taken when claiming, and when changing the state of a given job
+    SKIP_LOCKED = ""
+    LOCK_ROWS = ""
+    # Column that orders events recorded at the same time
+    EVENT_ORDER = "rowid"
+
+    @abstractmethod
+    def _transaction(self, fn):
+        """Run ``fn(conn)`` in one transaction and return its result"""
+
+    def _lock_queue(self, conn: Connection) -> None:
+        """Serialize enqueues, whose duplicate and memory checks read other jobs"""
+
+    async def _run(self, fn):
+        return await asyncio.to_thread(self._transaction, fn)
+
+    def _to_job(self, row) -> Job:
+        values = dict(zip(self.COLUMNS, row))
+        values["parameters"] = json.loads(values["parameters"])
+        values["results"] = json.loads(values["results"]) if values["results"] else None
+        return Job(**values)
+
+    @staticmethod
+    def _record(conn: Connection, job_ids: List[str], status: str, at: float,
+                detail: Optional[str] = None) -> None:
+        conn.executemany(
+            "INSERT INTO job_events (job_id, status, at, detail) VALUES (?, ?, ?, ?)",
+            [(job_id, status, at, detail) for job_id in job_ids]
+        )
+
+    async def enqueue(self, job: Job, memory_budget: Optional[int] = None) -> Job:
+        """
+        Persist a new job and wake up idle consumers.
+
+        If an identical job is queued or running, nothing is added and that job
+        is returned instead, with the new request's file attached to it (and
+        its priority raised to the new request's if that is more urgent).
+        With ``memory_budget``, QueueFullError is raised if the job's memory
+        estimate does not fit next to those of the queued and running jobs.
+        """
+        now = time.time()
+        job.status, job.created_at, job.updated_at = "queued", now, now
+        job.dedup_key = dedup_key(job)
+        values = {**job.__dict__, "parameters": json.dumps(job.parameters, default=str), "results": None}
+
+        def enqueue(conn: Connection) -> Job:
+            self._lock_queue(conn)
+            if job.dedup_key is not None:
+                row = conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running') "
+                    "ORDER BY created_at LIMIT 1",
+                    (job.dedup_key,)
+                ).fetchone()
+                if row is not None:
+                    existing = self._to_job(row)
+                    self._attach(conn, existing, job, now)
+                    return existing
+
+            if memory_budget is not None:
+                reserved = self._reserved_memory(conn)
+                if reserved + job.memory_estimate > memory_budget:
+                    raise QueueFullError(reserved, memory_budget)
+
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [values[column] for column in self.COLUMNS]
+            )
+            self._record(conn, [job.id], "queued", now)
+            return job
+
+        queued = await self._run(enqueue)
+        if queued is not job:
+            self.coalesced += 1
+            logger.info(f"Attached request for file {job.file_id} to identical job {queued.id}")
+            return queued
+
+        self._available.set()
+        logger.info(f"Queued job {job.id} ({job.model_type}, priority {job.priority})")
+        return job
+
+    def _attach(self, conn: Connection, existing: Job, job: Job, now: float) -> None:
+        if job.file_id != existing.file_id:
+            conn.execute(
+                "INSERT INTO job_attachments (job_id, file_id, attached_at) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                (existing.id, job.file_id, now)
+            )
+        if existing.status == "queued" and job.priority < existing.priority:
+            conn.execute("UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?", (job.priority, now, existing.id))
+            existing.priority = job.priority
+        self._record(conn, [existing.id], "attached", now, f"request for file {job.file_id}")
+
+    async def add_finished(self, job: Job, result_id: str, detail: Optional[str] = None) -> Job:
+        """Register a job that was answered without running, e.g. from the result cache"""
+        now = time.time()
+        job.status, job.created_at, job.updated_at = "completed", now, now
+        job.started_at, job.finished_at, job.result_id = now, now, result_id
+        values = {**job.__dict__, "parameters": json.dumps(job.parameters, default=str), "results": None}
+
+        def add(conn: Connection) -> None:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [values[column] for column in self.COLUMNS]
+            )
+            self._record(conn, [job.id], "completed", now, detail)
+
+        await self._run(add)
+        return job
+
+    @staticmethod
+    def _reserved_memory(conn: Connection) -> int:
+        return int(conn.execute(
+            "SELECT COALESCE(SUM(memory_estimate), 0) FROM jobs WHERE status IN ('queued', 'running', 'cancelling')"
+        ).fetchone()[0])
+
+    async def reserved_memory(self) -> int:
+        """Sum of the memory estimates of the queued and running jobs"""
+        return await self._run(self._reserved_memory)
+
+    async def attached_files(self, job_id: str) -> List[str]:
+        """Files of requests that attached to a job, other than the job's own file"""
+        rows = await self._run(lambda conn: conn.execute(
+            "SELECT file_id FROM job_attachments WHERE job_id = ? ORDER BY attached_at", (job_id,)
+        ).fetchall())
+        return [file_id for (file_id,) in rows]
+
+    async def claim(self, owner: str, max_priority: Optional[int] = None,
+                    lane: Optional[str] = None) -> Optional[Job]:
+        """
+        Lease the next job, or return None if nothing is available.
+
+        Queued jobs and running jobs whose lease has expired are eligible. With
+        ``max_priority`` only jobs of that priority class or a more urgent one are
+        considered, and with ``lane`` only jobs of that lane.
+        """
+        def claim(conn: Connection) -> Tuple[Optional[Job], List[Job]]:
+            now = time.time()
+            ended = self._expire_leases(conn, now)
+            query = (f"SELECT {', '.join(self.COLUMNS)} FROM jobs "
+                     "WHERE (status = 'queued' OR (status = 'running' AND lease_expires < ?))")
+            params: List[Any] = [now]
+            if max_priority is not None:
+                query += " AND priority <= ?"
+                params.append(max_priority)
+            if lane is not None:
+                query += " AND lane = ?"
+                params.append(lane)
+            row = conn.execute(query + " ORDER BY priority, created_at LIMIT 1" + self.SKIP_LOCKED, params).fetchone()
+            if row is None:
+                return None, ended
+
+            job = self._to_job(row)
+            redelivered = job.status == "running"
+            job.status, job.attempts, job.lease_owner = "running", job.attempts + 1, owner
+            job.lease_expires, job.updated_at, job.started_at = now + self.lease_seconds, now, now
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated_at = ?, "
+                "started_at = ? WHERE id = ?",
+                (job.status, job.attempts, owner, job.lease_expires, now, now, job.id)
+            )
+            detail = f"attempt {job.attempts} by {owner}" + (" after lease expiry" if redelivered else "")
+            self._record(conn, [job.id], "running", now, detail)
+            return job, ended
+
+        job, ended = await self._run(claim)
+        self._ended.extend(ended)
+        return job
+
+    def _jobs(self, conn: Connection, job_ids: List[str]) -> List[Job]:
+        if not job_ids:
+            return []
+        rows = conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id IN ({', '.join('?' for _ in job_ids)})", job_ids
+        ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def _expire_leases(self, conn: Connection, now: float) -> List[Job]:
+        # Jobs being cancelled when their consumer went away need no further work
+        abandoned = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE status = 'cancelling' AND lease_expires < ?" + self.SKIP_LOCKED, (now,)
+        )]
+        if abandoned:
+            self._set_cancelled(conn, abandoned, now)
+
+        # Jobs whose lease expired on their last allowed delivery are not retried
+        exhausted = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE status = 'running' AND lease_expires < ? AND attempts >= ?" + self.SKIP_LOCKED,
+            (now, self.max_attempts)
+        )]
+        if exhausted:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Lease expired too many times', lease_owner = NULL, "
+                f"updated_at = ?, finished_at = ? WHERE id IN ({', '.join('?' for _ in exhausted)})",
+                [now, now, *exhausted]
+            )
+            self._record(conn, exhausted, "failed", now, "lease expired too many times")
+        return self._jobs(conn, abandoned + exhausted)
+
+    def _set_cancelled(self, conn: Connection, job_ids: List[str], now: float,
+                       detail: Optional[str] = None) -> None:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', lease_owner = NULL, lease_expires = NULL, updated_at = ?, "
+            f"finished_at = ? WHERE id IN ({', '.join('?' for _ in job_ids)})",
+            [now, now, *job_ids]
+        )
+        self._record(conn, job_ids, "cancelled", now, detail)
+
+    async def extend_lease(self, job_id: str, owner: str) -> Optional[str]:
+        """
+        Push back the lease expiry of a running job. Returns the job's status
+        (``running`` or ``cancelling``), or None if the lease was lost.
+        """
+        def extend(conn: Connection) -> Optional[str]:
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status IN ('running', 'cancelling') AND lease_owner = ?",
+                (now + self.lease_seconds, now, job_id, owner)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+        return await self._run(extend)
+
+    async def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None,
+                     result_id: Optional[str] = None, results: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """
+        Acknowledge a job with its final status, result id and, for batch jobs,
+        per-model outcomes. False if another consumer owns the job now.
+        """
+        encoded = json.dumps(results) if results is not None else None
+
+        def finish(conn: Connection) -> bool:
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, result_id = ?, results = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('running', 'cancelling') AND lease_owner = ?",
+                (status, error, result_id, encoded, now, now, job_id, owner)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._record(conn, [job_id], status, now, error)
+            return True
+
+        return await self._run(finish)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job. A queued job becomes ``cancelled`` right away, a running
+        one ``cancelling`` until its consumer has stopped it; jobs in any other
+        state are left alone. Returns the job as it was before the call, or
+        None if it does not exist.
+        """
+        def cancel(conn: Connection) -> Optional[Job]:
+            row = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?" + self.LOCK_ROWS, (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = self._to_job(row)
+            now = time.time()
+            if job.status == "queued":
+                self._set_cancelled(conn, [job_id], now, "cancelled while queued")
+            elif job.status == "running":
+                conn.execute("UPDATE jobs SET status = 'cancelling', updated_at = ? WHERE id = ?", (now, job_id))
+                self._record(conn, [job_id], "cancelling", now)
+            return job
+
+        return await self._run(cancel)
+
+    async def recover(self) -> int:
+        """
+        Requeue jobs abandoned by consumers that are gone.
+
+        Jobs leased by a process of this host that no longer exists are
+        requeued right away; jobs of other hosts are left to their lease.
+        """
+        hostname = socket.gethostname()
+
+        def recover(conn: Connection) -> Tuple[int, List[Job]]:
+            rows = conn.execute(
+                "SELECT id, lease_owner, status FROM jobs WHERE status IN ('running', 'cancelling')" + self.LOCK_ROWS
+            ).fetchall()
+            dead = [(job_id, status) for job_id, owner, status in rows if _is_dead_local_owner(owner, hostname)]
+            return self._requeue(conn, dead, "recovered after the consumer exited")
+
+        recovered, ended = await self._run(recover)
+        self._ended.extend(ended)
+        if recovered:
+            logger.info(f"Recovered {recovered} abandoned jobs")
+            self._available.set()
+        return recovered
+
+    async def release(self, owner: str) -> int:
+        """
+        Requeue the jobs leased by a consumer that is stopping, so other
+        consumers pick them up without waiting for the leases to run out.
+        """
+        def release(conn: Connection) -> Tuple[int, List[Job]]:
+            rows = conn.execute(
+                "SELECT id, status FROM jobs WHERE status IN ('running', 'cancelling') AND lease_owner = ?"
+                + self.LOCK_ROWS, (owner,)
+            ).fetchall()
+            return self._requeue(conn, rows, f"released by {owner}")
+
+        released, ended = await self._run(release)
+        self._ended.extend(ended)
+        if released:
+            logger.info(f"Released {released} unfinished jobs")
+            self._available.set()
+        return released
+
+    def _requeue(self, conn: Connection, jobs: List[Tuple[str, str]], detail: str) -> Tuple[int, List[Job]]:
+        # Running jobs go back to the queue; jobs that were being cancelled are cancelled (and returned)
+        abandoned = [job_id for job_id, status in jobs if status == "running"]
+        cancelled = [job_id for job_id, status in jobs if status == "cancelling"]
+        now = time.time()
+        if cancelled:
+            self._set_cancelled(conn, cancelled, now, "consumer exited while cancelling")
+        if abandoned:
+            conn.execute(
+                f"UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                f"WHERE id IN ({', '.join('?' for _ in abandoned)})",
+                [now, *abandoned]
+            )
+            self._record(conn, abandoned, "queued", now, detail)
+        return len(abandoned), self._jobs(conn, cancelled)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Status of a job: its summary, the history of status changes and, while
+        it is queued, its 1-based position in claim order.
+        """
+        def get(conn: Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._to_job(row)
+            status = job.summary()
+            status["queue_position"] = None
+            if job.status == "queued":
+                status["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    "(priority < ? OR (priority = ? AND created_at < ?))",
+                    (job.priority, job.priority, job.created_at)
+                ).fetchone()[0] + 1
+            status["attached_file_ids"] = [
+                file_id for (file_id,) in conn.execute(
+                    "SELECT file_id FROM job_attachments WHERE job_id = ? ORDER BY attached_at", (job_id,)
+                )
+            ]
+            status["events"] = [
+                {"status": event_status, "at": at, "detail": detail}
+                for event_status, at, detail in conn.execute(
+                    f"SELECT status, at, detail FROM job_events WHERE job_id = ? ORDER BY at, {self.EVENT_ORDER}",
+                    (job_id,)
+                )
+            ]
+            return status
+
+        return await self._run(get)
+
+    async def list_jobs(self, status: Optional[str] = None, model_type: Optional[str] = None,
+                        industry: Optional[str] = None, file_id: Optional[str] = None,
+                        since: Optional[float] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Summaries of the most recent jobs matching every given filter, newest first"""
+        filters = {"status": status, "model_type": model_type, "industry": industry, "file_id": file_id}
+        conditions = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params: List[Any] = [value for value in filters.values() if value is not None]
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        def list_jobs(conn: Connection) -> List[Dict[str, Any]]:
+            rows = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                [*params, limit, offset]
+            ).fetchall()
+            jobs = [self._to_job(row).summary() for row in rows]
+            if any(job["status"] == "queued" for job in jobs):
+                # Positions of all queued jobs in one pass, in claim order
+                queued = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority, created_at")
+                positions = {job_id: position for position, (job_id,) in enumerate(queued, start=1)}
+            else:
+                positions = {}
+            for job in jobs:
+                job["queue_position"] = positions.get(job["id"])
+            return jobs
+
+        return await self._run(list_jobs)
+
+    async def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        rows = await self._run(lambda conn: conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: count for status, count in rows}
+
+class SQLiteJobQueue(SQLJobQueue):
+    """
+    Job queue in a SQLite database, the default and the backend for tests and
+    offline runs.
+
+    The database is in WAL mode, which SQLite only supports on a local
+    filesystem, so all processes sharing the queue must run on one host.
+    Writers are serialized by SQLite, so claims need no row locks.
+    """
+
+    # Columns added after the first release, created on open if missing
+    ADDED_COLUMNS = {
+        "started_at": "REAL",
+        "finished_at": "REAL",
+        "result_id": "TEXT",
+        "results": "TEXT",
+        "dedup_key": "TEXT",
+        "memory_estimate": "INTEGER NOT NULL DEFAULT 0",
+        "cost_estimate": "REAL NOT NULL DEFAULT 0",
+        "lane": "TEXT NOT NULL DEFAULT 'slow'",
+        "input_path": "TEXT",
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            model_type TEXT NOT NULL,
+            industry TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            parameters TEXT NOT NULL,
+            content_hash TEXT,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+        CREATE TABLE IF NOT EXISTS job_events (
+            job_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            at REAL NOT NULL,
+            detail TEXT
+        );
+        CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, at);
+        CREATE TABLE IF NOT EXISTS job_attachments (
+            job_id TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            attached_at REAL NOT NULL,
+            PRIMARY KEY (job_id, file_id)
+        );
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        super().__init__(lease_seconds, max_attempts)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        # One connection shared by the worker threads, serialized by a lock;
+        # other processes sharing the database are serialized by SQLite itself
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in self.ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+        self._lock = threading.Lock()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+class PostgresConnection:
+    """sqlite3-style ``execute`` and ``executemany`` with ``?`` placeholders on a psycopg connection"""
+
+    def __init__(self, conn: "psycopg.Connection"):
+        self._conn = conn
+
+    def execute(self, query: str, params: Any = ()) -> "psycopg.Cursor":
+        return self._conn.execute(query.replace("?", "%s"), params or None)
+
+    def executemany(self, query: str, params: List[Any]) -> "psycopg.Cursor":
+        cursor = self._conn.cursor()
+        cursor.executemany(query.replace("?", "%s"), params)
+        return cursor
+
+class PostgresJobQueue(SQLJobQueue):
+    """
+    Job queue in a Postgres database, shared over the network by the API and
+    workers on any number of hosts.
+
+    Consumers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+    concurrent claims each lock a different job instead of waiting for each
+    other, and lease expiry is checked the same way. Enqueues take a
+    transaction-level advisory lock, because their duplicate and memory
+    checks read other jobs. Leases are compared against each host's clock,
+    so the hosts' clocks must be synchronized.
+
+    A job enqueued on another host wakes consumers at their next poll
+    (JOB_POLL_INTERVAL).
+    """
+
+    distributed = True
+
+    SKIP_LOCKED = " FOR UPDATE SKIP LOCKED"
+    LOCK_ROWS = " FOR UPDATE"
+    EVENT_ORDER = "id"
+
+    # Advisory lock keys: creating the schema, enqueueing
+    SCHEMA_LOCK = 0x6d6c7301
+    ENQUEUE_LOCK = 0x6d6c7302
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            model_type TEXT NOT NULL,
+            industry TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            parameters TEXT NOT NULL,
+            content_hash TEXT,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires DOUBLE PRECISION,
+            created_at DOUBLE PRECISION NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL,
+            started_at DOUBLE PRECISION,
+            finished_at DOUBLE PRECISION,
+            result_id TEXT,
+            results TEXT,
+            dedup_key TEXT,
+            memory_estimate BIGINT NOT NULL DEFAULT 0,
+            cost_estimate DOUBLE PRECISION NOT NULL DEFAULT 0,
+            lane TEXT NOT NULL DEFAULT 'slow',
+            input_path TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+        CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+        CREATE TABLE IF NOT EXISTS job_events (
+            id BIGSERIAL PRIMARY KEY,
+            job_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            at DOUBLE PRECISION NOT NULL,
+            detail TEXT
+        );
+        CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, at);
+        CREATE TABLE IF NOT EXISTS job_attachments (
+            job_id TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            attached_at DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (job_id, file_id)
+        );
+    """
+
+    def __init__(self, url: str = JOB_QUEUE_URL, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        if not has_psycopg:
+            raise ValueError("psycopg is required for the postgres job queue")
+        super().__init__(lease_seconds, max_attempts)
+        self.url = url
+
+        # One connection shared by the worker threads, serialized by a lock;
+        # other processes and hosts are serialized by row and advisory locks
+        self._conn = self._connect()
+        self._lock = threading.Lock()
+        self._transaction(self._create_schema)
+
+    def _connect(self) -> "psycopg.Connection":
+        return psycopg.connect(self.url, autocommit=True)
+
+    def _create_schema(self, conn: PostgresConnection) -> None:
+        # Hosts starting together would otherwise race on CREATE TABLE IF NOT EXISTS
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (self.SCHEMA_LOCK,))
+        conn.execute(self.SCHEMA)
+
+    def _transaction(self, fn):
+        with self._lock:
+            if self._conn.closed:
+                # Reconnect after the server or the network dropped the connection
+                self._conn = self._connect()
+            with self._conn.transaction():
+                return fn(PostgresConnection(self._conn))
+
+    def _lock_queue(self, conn: Connection) -> None:
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (self.ENQUEUE_LOCK,))
+
+# Job queue backends selectable with JOB_QUEUE_BACKEND
+JOB_QUEUES = {
+    "sqlite": SQLiteJobQueue,
+    "postgres": PostgresJobQueue,
+}
+
+def create_job_queue(name: str = JOB_QUEUE_BACKEND) -> JobQueue:
+    """Create the configured job queue"""
+    if name not in JOB_QUEUES:
+        raise ValueError(f"Unknown job queue backend: {name}")
+    logger.info(f"Using {name} job queue")
+    return JOB_QUEUES[name]()
+
+def _is_dead_local_owner(owner: Optional[str], hostname: str) -> bool:
+    if not owner:
+        return True
+    parts = owner.split(":")
+    if len(parts) != 3 or parts[0] != hostname or not parts[1].isdigit():
+        return False
+    if owner == CONSUMER_ID:
+        return False
+    if int(parts[1]) == os.getpid():
+        # Same pid, different process: a previous run of this service
+        return True
+    try:
+        os.kill(int(parts[1]), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def dedup_key(job: Job) -> Optional[str]:
+    """
+    Identity of the work a job does: its dataset's content hash, model type,
+    industry and canonical parameters. None when the content hash is unknown.
+    """
+    if not job.content_hash:
+        return None
+    if job.model_type != BATCH_MODEL_TYPE:
+        return analysis_key(job.content_hash, job.model_type, job.industry, job.parameters)
+    specs = json.dumps(
+        [[spec["model_type"], canonical_parameters(spec.get("parameters", {}))] for spec in job.parameters["specs"]],
+        separators=(",", ":")
+    )
+    identity = "\n".join([job.content_hash, job.model_type, job.industry, specs])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def job_priority(model_type: str, parameters: Dict[str, Any]) -> int:
+    """
+    Priority class of a job: the request's ``priority`` parameter, else the
+    model's registry default. A batch job gets the least urgent class of its models.
+    """
+    if model_type == BATCH_MODEL_TYPE and not parameters.get("priority"):
+        return max(job_priority(spec["model_type"], spec.get("parameters", {})) for spec in parameters["specs"])
+    name = parameters.get("priority") or MODEL_REGISTRY.get(model_type, {}).get("priority", "normal")
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name}, expected one of {list(PRIORITIES)}")
+    return PRIORITIES[name]
+
+# Create a singleton instance
+job_queue = create_job_queue()
@@ -0,0 +1,419 @@
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config import (
+    JOB_CONCURRENCY, JOB_HIGH_PRIORITY_SLOTS, JOB_FAST_LANE_SLOTS, JOB_POLL_INTERVAL, JOB_LEASE_SECONDS,
+    JOB_INPUT_BUCKET
+)
+from app.models.schemas import ModelType, Industry
+from app.services.execution_engine import ExecutionTimeoutError
+from app.services.file_service import upload_path
+from app.services.job_queue import Job, JobQueue, job_queue, CONSUMER_ID, PRIORITIES, BATCH_MODEL_TYPE
+from app.services.ml_service import ml_service
+from app.services.models import analysis_key
+from app.services.result_cache import CachedResult, result_cache
+from app.services.supabase_service import supabase_service
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+async def process_analysis(
+    file_path: str,
+    file_id: str,
+    analysis_id: str,
+    model_type: ModelType,
+    industry: Industry,
+    parameters: Dict[str, Any],
+    content_hash: Optional[str] = None,
+    lane: Optional[str] = None
+) -> Optional[str]:
+    """
+    Run one analysis and record its outcome on the file, returning the result id
+    (None if the result could not be stored). Analysis errors are re-raised.
+    """
+    try:
+        # An identical analysis may have finished since this one was queued
+        cache_key = analysis_key(content_hash, model_type.value, industry.value, parameters) if content_hash else None
+        cached = await lookup_cached(cache_key, parameters)
+        if cached is not None:
+            await supabase_service.update_file_status(file_id, "completed", cached.result_id)
+            return cached.result_id
+
+        # Process the file with ML service
+        result, metrics = await ml_service.process_file(
+            file_path, model_type, industry, parameters, content_hash, lane
+        )
+
+        # Store the result in Supabase, with large arrays moved to blobs first so the
+        # cached copy holds the same blob references as the stored one
+        result = await supabase_service.offload_result(file_id, result)
+        result_id = await supabase_service.store_analysis_result(
+            file_id, model_type, industry, result, metrics
+        )
+
+        # Update file status
+        if result_id:
+            await supabase_service.update_file_status(file_id, "completed", result_id)
+            if cache_key:
+                await result_cache.put(cache_key, result_id, result, metrics)
+        else:
+            await supabase_service.update_file_status(file_id, "failed")
+        return result_id
+
+    except Exception as e:
+        logger.error(f"Error processing analysis {analysis_id}: {str(e)}")
+        status = "timed_out" if isinstance(e, ExecutionTimeoutError) else "failed"
+        await supabase_service.update_file_status(file_id, status)
+        raise
+
+async def process_batch_analysis(
+    file_path: str,
+    file_id: str,
+    analysis_id: str,
+    specs: List[Dict[str, Any]],
+    industry: Industry,
+    content_hash: Optional[str] = None,
+    lane: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run several models on one file and store one result per model.
+
+    Returns the outcome of every spec (model type, status, result id, error).
+    Models whose result is cached are not run. The file record points at the
+    first stored result.
+    """
+    try:
+        model_specs = [(ModelType(spec["model_type"]), spec.get("parameters", {})) for spec in specs]
+        cache_keys = [
+            analysis_key(content_hash, model_type.value, industry.value, parameters) if content_hash else None
+            for model_type, parameters in model_specs
+        ]
+        cached = await asyncio.gather(*(
+            lookup_cached(key, parameters) for key, (_, parameters) in zip(cache_keys, model_specs)
+        ))
+
+        # Only the models without a cached result are run
+        pending = [index for index, hit in enumerate(cached) if hit is None]
+        outcomes: List[Any] = list(cached)
+        if pending:
+            computed = await ml_service.process_batch(
+                file_path, [model_specs[index] for index in pending], industry, content_hash, lane
+            )
+            for index, outcome in zip(pending, computed):
+                outcomes[index] = outcome
+
+        async def store(model_type: ModelType, cache_key: Optional[str], outcome: Any) -> Dict[str, Any]:
+            entry = {"model_type": model_type.value, "status": "completed", "result_id": None, "error": None}
+            if isinstance(outcome, CachedResult):
+                entry["result_id"], entry["cache"] = outcome.result_id, "hit"
+                return entry
+            if isinstance(outcome, BaseException):
+                entry["status"] = "timed_out" if isinstance(outcome, ExecutionTimeoutError) else "failed"
+                entry["error"] = str(outcome) or type(outcome).__name__
+                return entry
+            result, metrics = outcome
+            result = await supabase_service.offload_result(file_id, result)
+            entry["result_id"] = await supabase_service.store_analysis_result(
+                file_id, model_type, industry, result, metrics
+            )
+            if not entry["result_id"]:
+                entry["status"], entry["error"] = "failed", "Failed to store analysis result"
+            elif cache_key:
+                await result_cache.put(cache_key, entry["result_id"], result, metrics)
+            return entry
+
+        results = await asyncio.gather(*(
+            store(model_type, cache_key, outcome)
+            for (model_type, _), cache_key, outcome in zip(model_specs, cache_keys, outcomes)
+        ))
+
+        result_id = next((entry["result_id"] for entry in results if entry["result_id"]), None)
+        if result_id:
+            await supabase_service.update_file_status(file_id, "completed", result_id)
+        else:
+            await supabase_service.update_file_status(file_id, "failed")
+        return results
+
+    except Exception as e:
+        logger.error(f"Error processing batch analysis {analysis_id}: {str(e)}")
+        await supabase_service.update_file_status(file_id, "failed")
+        raise
+
+async def process_job(job: Job) -> Any:
+    """
+    Run a claimed job on its input: the result id of a single analysis, or
+    the per-model outcomes of a batch
+    """
+    try:
+        file_path = await fetch_input(job)
+    except Exception:
+        await supabase_service.update_file_status(job.file_id, "failed")
+        raise
+
+    try:
+        if job.model_type == BATCH_MODEL_TYPE:
+            return await process_batch_analysis(
+                file_path, job.file_id, job.id, job.parameters["specs"], Industry(job.industry),
+                job.content_hash, job.lane
+            )
+        return await process_analysis(
+            file_path, job.file_id, job.id, ModelType(job.model_type), Industry(job.industry),
+            job.parameters, job.content_hash, job.lane
+        )
+    finally:
+        if file_path != job.file_path:
+            # This delivery's own copy of the input
+            remove_file(file_path)
+
+async def share_input(job: Job) -> str:
+    """Upload a job's input to JOB_INPUT_BUCKET for consumers on other hosts, returning its storage path"""
+    path = os.path.basename(job.file_path)
+    if not await supabase_service.upload_file(JOB_INPUT_BUCKET, path, job.file_path):
+        raise RuntimeError(f"Failed to upload the input of analysis {job.id} to storage")
+    return f"{JOB_INPUT_BUCKET}/{path}"
+
+async def fetch_input(job: Job) -> str:
+    """
+    Local path of a job's input. A job with a copy of its input in storage
+    may have been queued on another host, so every delivery downloads it
+    and checks it against the content hash the job was keyed on.
+    """
+    if not job.input_path:
+        return job.file_path
+
+    bucket, path = job.input_path.split("/", 1)
+    local_path = upload_path(f"{job.id}.{job.attempts}", path)
+    stored = await supabase_service.download_file(bucket, path, local_path)
+    if stored is None:
+        raise FileNotFoundError(f"Could not download the input of job {job.id} from {job.input_path}")
+    if job.content_hash and stored.sha256 != job.content_hash:
+        remove_file(local_path)
+        raise ValueError(f"The input of job {job.id} in {job.input_path} changed after the job was queued")
+    return local_path
+
+async def discard_input(job: Job) -> None:
+    """Delete a job's temp file and the copy of its input uploaded to JOB_INPUT_BUCKET, if any"""
+    remove_file(job.file_path)
+    bucket, _, path = (job.input_path or "").partition("/")
+    if bucket == JOB_INPUT_BUCKET:
+        # Inputs that were already in storage (analyses from storage) are not ours to delete
+        await supabase_service.delete_file(bucket, path)
+
+async def lookup_cached(cache_key: Optional[str], parameters: Dict[str, Any]) -> Optional[CachedResult]:
+    """Look up a result in the result cache, unless the request asked to bypass it"""
+    if cache_key is None or parameters.get("bypass_cache"):
+        return None
+    return await result_cache.get(cache_key)
+
+async def serve_from_cache(job: Job, queue: JobQueue = job_queue) -> Optional[CachedResult]:
+    """
+    Answer a single-model job from the result cache without queueing it. On a
+    hit the job is registered as completed and its file points at the cached result.
+    """
+    if job.model_type == BATCH_MODEL_TYPE or not job.content_hash:
+        return None
+    cached = await lookup_cached(analysis_key(job.content_hash, job.model_type, job.industry, job.parameters),
+                                 job.parameters)
+    if cached is None:
+        return None
+
+    await queue.add_finished(job, cached.result_id, "served from the result cache")
+    await supabase_service.update_file_status(job.file_id, "completed", cached.result_id)
+    logger.info(f"Served analysis {job.id} from the result cache (result {cached.result_id})")
+    return cached
+
+class JobRunner:
+    """
+    Consumes the job queue with a fixed number of concurrent consumers.
+
+    ``high_priority_slots`` of the consumers only take high-priority jobs and
+    ``fast_lane_slots`` only jobs the cost model put in the fast lane, so cheap
+    analyses are picked up even while every other consumer is waiting on a
+    long fit. At least one consumer takes any job. A consumer extends its job's lease while the job
+    runs, stops the job when the lease shows it is being cancelled, and removes
+    the job's temp file once it has been acknowledged.
+
+    Several runners, in the API process and in standalone workers
+    (``python -m app.worker``), can consume the same queue.
+    """
+
+    def __init__(self, queue: JobQueue = job_queue, concurrency: int = JOB_CONCURRENCY,
+                 high_priority_slots: int = JOB_HIGH_PRIORITY_SLOTS, fast_lane_slots: int = JOB_FAST_LANE_SLOTS,
+                 poll_interval: float = JOB_POLL_INTERVAL, owner: str = CONSUMER_ID):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.high_priority_slots = min(high_priority_slots, self.concurrency - 1)
+        self.fast_lane_slots = min(fast_lane_slots, self.concurrency - 1 - self.high_priority_slots)
+        self.poll_interval = poll_interval
+        self.owner = owner
+        self._consumers: List[asyncio.Task] = []
+        self._running = 0
+        self._draining = False
+        # Analyses running in this process, and those asked to stop
+        self._work: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+
+    async def start(self) -> None:
+        """Requeue abandoned jobs and start the consumers"""
+        await self.queue.recover()
+        await self.clean_up_ended()
+        for slot in range(self.concurrency):
+            max_priority = PRIORITIES["high"] if slot < self.high_priority_slots else None
+            lane = "fast" if 0 <= slot - self.high_priority_slots < self.fast_lane_slots else None
+            self._consumers.append(asyncio.create_task(self._consume(max_priority, lane)))
+        logger.info(f"Started {self.concurrency} job consumers ({self.high_priority_slots} reserved for high priority, "
+                    f"{self.fast_lane_slots} for the fast lane)")
+
+    async def drain(self, timeout: float) -> None:
+        """Stop claiming jobs and wait up to ``timeout`` seconds for the running ones to finish"""
+        self._draining = True
+        if self._consumers:
+            logger.info(f"Draining {self._running} running jobs")
+            await asyncio.wait(self._consumers, timeout=timeout)
+
+    async def stop(self) -> None:
+        """Stop the consumers; jobs they were running go back to the queue"""
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        try:
+            await self.queue.release(self.owner)
+        except Exception as e:
+            logger.error(f"Error releasing unfinished jobs, they are redelivered when their leases expire: {str(e)}")
+        await self.clean_up_ended()
+
+    async def clean_up_ended(self) -> None:
+        """Remove the temp files and update the file records of jobs the queue ended without a consumer"""
+        for job in self.queue.take_ended():
+            logger.info(f"Job {job.id} ended as {job.status} without a consumer")
+            try:
+                await discard_input(job)
+                await supabase_service.update_file_status(job.file_id, job.status)
+                await update_attached_files(self.queue, job.id, job.status)
+            except Exception as e:
+                logger.error(f"Error cleaning up job {job.id}: {str(e)}")
+
+    async def _consume(self, max_priority: Optional[int], lane: Optional[str]) -> None:
+        while not self._draining:
+            try:
+                job = await self.queue.claim(self.owner, max_priority, lane)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+            await self.clean_up_ended()
+
+            if job is None:
+                await self.queue.wait(self.poll_interval)
+                continue
+
+            self._running += 1
+            try:
+                await self.run_job(job)
+            except Exception:
+                # Keep the consumer alive; the job's lease expires and it is redelivered
+                logger.exception(f"Error running job {job.id}")
+            finally:
+                self._running -= 1
+
+    async def run_job(self, job: Job) -> None:
+        """Run a claimed job under its lease and acknowledge it"""
+        logger.info(f"Running job {job.id} ({job.model_type}, attempt {job.attempts})")
+        work = asyncio.create_task(process_job(job))
+        self._work[job.id] = work
+        heartbeat = asyncio.create_task(self._keep_lease(job))
+        status, result_id, results, error = "completed", None, None, None
+        try:
+            outcome = await work
+            if job.model_type == BATCH_MODEL_TYPE:
+                results = outcome
+                status, result_id, error = batch_status(results)
+            else:
+                result_id = outcome
+                if not result_id:
+                    status, error = "failed", "Failed to store analysis result"
+        except asyncio.CancelledError:
+            if job.id not in self._cancelled:
+                # The runner is stopping; the job is redelivered
+                raise
+            status, error = "cancelled", "Cancelled by request"
+            await supabase_service.update_file_status(job.file_id, "cancelled")
+        except ExecutionTimeoutError as e:
+            status, error = "timed_out", str(e)
+        except Exception as e:
+            status, error = "failed", str(e) or type(e).__name__
+        finally:
+            heartbeat.cancel()
+            self._work.pop(job.id, None)
+            self._cancelled.discard(job.id)
+
+        if await self.queue.finish(job.id, self.owner, status, error, result_id, results):
+            await discard_input(job)
+            # Requests that attached to this job share its outcome
+            await update_attached_files(self.queue, job.id, status, result_id)
+        else:
+            logger.warning(f"Lost the lease on job {job.id} before it finished")
+
+    async def _keep_lease(self, job: Job) -> None:
+        # Renewing often also picks up cancellations requested through another process
+        while True:
+            await asyncio.sleep(min(JOB_LEASE_SECONDS / 3, self.poll_interval))
+            try:
+                status = await self.queue.extend_lease(job.id, self.owner)
+            except Exception as e:
+                logger.error(f"Error extending lease on job {job.id}: {str(e)}")
+                continue
+            if status is None:
+                logger.warning(f"Lease on job {job.id} was lost")
+                return
+            if status == "cancelling":
+                self.cancel(job.id)
+                return
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job running in this process, killing its worker; False if it does not run here"""
+        work = self._work.get(job_id)
+        if work is None or work.done():
+            return False
+        logger.info(f"Cancelling job {job_id}")
+        self._cancelled.add(job_id)
+        work.cancel()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "consumers": len(self._consumers),
+            "running": self._running,
+            "draining": self._draining,
+            "high_priority_slots": self.high_priority_slots,
+            "fast_lane_slots": self.fast_lane_slots
+        }
+
+def batch_status(results: List[Dict[str, Any]]) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Overall status, result id and error of a batch job: completed if any model
+    completed, otherwise timed_out if every model timed out, otherwise failed
+    """
+    completed = [entry for entry in results if entry["status"] == "completed"]
+    failures = [f"{entry['model_type']}: {entry['error']}" for entry in results if entry["status"] != "completed"]
+    error = "; ".join(failures) or None
+    if completed:
+        return "completed", completed[0]["result_id"], error
+    if all(entry["status"] == "timed_out" for entry in results):
+        return "timed_out", None, error
+    return "failed", None, error
+
+async def update_attached_files(queue: JobQueue, job_id: str, status: str, result_id: Optional[str] = None) -> None:
+    """Give the files of requests that attached to a job the job's final status and result"""
+    for file_id in await queue.attached_files(job_id):
+        await supabase_service.update_file_status(file_id, status, result_id)
+
+def remove_file(file_path: str) -> None:
+    """Delete a job's temp file if it still exists"""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+# Create a singleton instance
+job_runner = JobRunner()
@@ -0,0 +1,376 @@
+
+import pandas as pd
+import numpy as np
+import csv
+import json
+import logging
+import os
+import zipfile
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from app.config import XLSX_BATCH_SIZE, CHUNK_ROWS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    # Import pyarrow for the fast columnar readers
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+    has_pyarrow = True
+except ImportError:
+    has_pyarrow = False
+    logger.warning("pyarrow not available. Columnar formats will use slower pandas readers.")
+
+try:
+    # Import openpyxl for streaming reads of xlsx workbooks
+    from openpyxl import load_workbook
+    has_openpyxl = True
+except ImportError:
+    has_openpyxl = False
+    logger.warning("openpyxl not available. Streaming xlsx reads are disabled.")
+
+# Leading bytes that identify binary formats regardless of file name
+MAGIC_BYTES = [
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "feather"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"PK\x03\x04", "excel"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "excel"),
+]
+
+# File extensions used when the content is not recognised by its magic bytes
+EXTENSION_FORMATS = {
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+    ".xls": "excel",
+    ".csv": "csv",
+    ".txt": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+    ".arrows": "arrow_stream",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+def detect_format(file_path: str) -> str:
+    """
+    Detect the format of a data file from its magic bytes, falling back to the extension
+    """
+    with open(file_path, "rb") as f:
+        header = f.read(8)
+
+    for magic, file_format in MAGIC_BYTES:
+        if header.startswith(magic):
+            return file_format
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in EXTENSION_FORMATS:
+        return EXTENSION_FORMATS[extension]
+
+    # Text files without a known extension: JSON Lines start with an object
+    if header.lstrip().startswith(b"{"):
+        return "jsonl"
+
+    return "csv"
+
+def read_excel(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read an Excel workbook (first sheet)"""
+    return pd.read_excel(file_path, usecols=columns)
+
+def read_csv(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a CSV file with the multithreaded pyarrow engine when available"""
+    if has_pyarrow:
+        return pd.read_csv(file_path, engine="pyarrow", usecols=columns)
+    return pd.read_csv(file_path, usecols=columns)
+
+def read_parquet(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a Parquet file, pruning unneeded column chunks"""
+    return pd.read_parquet(file_path, columns=columns)
+
+def read_feather(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a Feather / Arrow IPC file"""
+    if has_pyarrow:
+        return feather.read_table(file_path, columns=columns).to_pandas()
+    return pd.read_feather(file_path, columns=columns)
+
+def read_arrow_stream(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read an Arrow IPC stream"""
+    if not has_pyarrow:
+        raise ValueError("pyarrow is required to read Arrow IPC streams")
+    with pa.OSFile(file_path, "rb") as source:
+        table = pa.ipc.open_stream(source).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas()
+
+def read_jsonl(file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a JSON Lines file"""
+    if has_pyarrow:
+        table = pa_json.read_json(file_path)
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas()
+    df = pd.read_json(file_path, lines=True)
+    return df[list(columns)] if columns is not None else df
+
+# Loader registry: format name -> reader function(file_path, columns)
+LOADER_REGISTRY: Dict[str, Callable[..., pd.DataFrame]] = {
+    "excel": read_excel,
+    "csv": read_csv,
+    "parquet": read_parquet,
+    "feather": read_feather,
+    "arrow_stream": read_arrow_stream,
+    "jsonl": read_jsonl,
+}
+
+def load_dataframe(file_path: str, file_format: str = None,
+                   columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Load a data file into a DataFrame using the fastest reader for its format.
+
+    When ``columns`` is given only those columns are read, in the requested order.
+    """
+    file_format = file_format or detect_format(file_path)
+
+    if file_format not in LOADER_REGISTRY:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+    logger.info(f"Loading {file_path} as {file_format}" + (f" (columns: {list(columns)})" if columns else ""))
+    df = LOADER_REGISTRY[file_format](file_path, columns)
+
+    # Readers return projected columns in file order; restore the requested order
+    if columns is not None:
+        df = df[list(columns)]
+
+    return df
+
+def _to_typed_array(values: List[Any]) -> np.ndarray:
+    """Convert a list of cell values into the narrowest NumPy array that holds them"""
+    present = [v for v in values if v is not None]
+    has_missing = len(present) < len(values)
+
+    if present and all(isinstance(v, bool) for v in present):
+        return np.array(values, dtype=object) if has_missing else np.array(values, dtype=bool)
+
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        if not has_missing and all(isinstance(v, int) for v in present):
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    if present and all(isinstance(v, (datetime, date)) for v in present):
+        return np.array([np.datetime64("NaT") if v is None else np.datetime64(v, "ns") for v in values],
+                        dtype="datetime64[ns]")
+
+    return np.array(values, dtype=object)
+
+def _to_arrow_array(array: np.ndarray) -> "pa.Array":
+    """Convert a typed column to Arrow; object columns mixing types (e.g. "N/A" among numbers) become strings"""
+    try:
+        return pa.array(array, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in array], type=pa.string())
+
+def _unique_names(names: List[str]) -> List[str]:
+    """Make header names unique the way pandas does: repeats of ``x`` become ``x.1``, ``x.2``, ..."""
+    original = set(names)
+    seen: Set[str] = set()
+    counts: Dict[str, int] = {}
+    unique = []
+    for name in names:
+        candidate = name
+        while candidate in seen or (candidate != name and candidate in original):
+            counts[name] = counts.get(name, 0) + 1
+            candidate = f"{name}.{counts[name]}"
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+def iter_xlsx_batches(file_path: str, batch_size: int = XLSX_BATCH_SIZE,
+                      columns: Optional[Sequence[str]] = None, sheet_name: Optional[str] = None,
+                      as_arrow: bool = False) -> Iterator[Union[Dict[str, np.ndarray], "pa.RecordBatch"]]:
+    """
+    Stream an xlsx worksheet in read-only mode, yielding typed column batches.
+
+    The first row is used as the header. Each batch holds at most ``batch_size`` rows
+    as a mapping of column name to NumPy array, or as an Arrow record batch when
+    ``as_arrow`` is set. Types are inferred per batch, so a column that is integer in
+    one batch may be float in the next if it contains blanks; consumers that need a
+    stable schema should promote accordingly. Only one batch is held in memory at a time.
+    """
+    if not has_openpyxl:
+        raise ValueError("openpyxl is required to stream xlsx files")
+    if as_arrow and not has_pyarrow:
+        raise ValueError("pyarrow is required for Arrow record batches")
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        names = _unique_names([str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)])
+
+        # Positions of the requested columns (all columns by default)
+        if columns is not None:
+            missing = [col for col in columns if col not in names]
+            if missing:
+                raise ValueError(f"Columns not found in worksheet: {missing}")
+            positions = [names.index(col) for col in columns]
+        else:
+            positions = list(range(len(names)))
+
+        def build_batch(buffer: List[List[Any]]):
+            arrays = {names[pos]: _to_typed_array(values) for pos, values in zip(positions, buffer)}
+            if as_arrow:
+                return pa.RecordBatch.from_arrays(
+                    [_to_arrow_array(array) for array in arrays.values()],
+                    names=list(arrays.keys())
+                )
+            return arrays
+
+        buffer: List[List[Any]] = [[] for _ in positions]
+        buffered_rows = 0
+
+        for row in rows:
+            # Skip fully empty rows (common at the end of exported sheets)
+            if row is None or all(value is None for value in row):
+                continue
+
+            for values, pos in zip(buffer, positions):
+                values.append(row[pos] if pos < len(row) else None)
+            buffered_rows += 1
+
+            if buffered_rows >= batch_size:
+                yield build_batch(buffer)
+                buffer = [[] for _ in positions]
+                buffered_rows = 0
+
+        if buffered_rows:
+            yield build_batch(buffer)
+
+    finally:
+        workbook.close()
+
+def can_stream(file_path: str, file_format: str = None) -> bool:
+    """Whether the file can be read in batches with iter_frames"""
+    file_format = file_format or detect_format(file_path)
+
+    if file_format == "excel":
+        # Only xlsx workbooks (zip containers) can be streamed; legacy xls cannot
+        return has_openpyxl and zipfile.is_zipfile(file_path)
+    if file_format in ("parquet", "feather", "arrow_stream"):
+        return has_pyarrow
+    return file_format in ("csv", "jsonl")
+
+# Bytes per row assumed for files whose shape cannot be estimated
+ASSUMED_ROW_BYTES = 64
+
+def estimate_shape(file_path: str, file_format: str = None,
+                   sample_bytes: int = 1024 * 1024) -> Optional[Tuple[int, int]]:
+    """
+    Estimate ``(rows, columns)`` of a data file without loading it.
+
+    Parquet and Arrow files report their exact shape from metadata. For xlsx
+    workbooks the sheet's recorded dimensions are used, and for CSV and JSON
+    Lines the row count is extrapolated from the average line length of the
+    first ``sample_bytes``. Returns None when the shape cannot be estimated.
+    """
+    file_format = file_format or detect_format(file_path)
+    try:
+        if file_format == "parquet" and has_pyarrow:
+            metadata = pq.ParquetFile(file_path).metadata
+            return metadata.num_rows, metadata.num_columns
+        if file_format == "feather" and has_pyarrow:
+            reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+            rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+            return rows, len(reader.schema)
+        if file_format == "excel" and has_openpyxl and zipfile.is_zipfile(file_path):
+            workbook = load_workbook(file_path, read_only=True)
+            try:
+                worksheet = workbook.worksheets[0]
+                if worksheet.max_row is None or worksheet.max_column is None:
+                    return None
+                return max(worksheet.max_row - 1, 0), worksheet.max_column
+            finally:
+                workbook.close()
+        if file_format in ("csv", "jsonl"):
+            with open(file_path, "rb") as f:
+                sample = f.read(sample_bytes)
+            lines = sample.splitlines()
+            if not lines:
+                return 0, 0
+            if len(sample) == sample_bytes and len(lines) > 1:
+                # The last line of a partial sample is cut off
+                lines = lines[:-1]
+            average = sum(len(line) + 1 for line in lines) / len(lines)
+            rows = int(os.path.getsize(file_path) / average)
+            if file_format == "csv":
+                header = next(csv.reader([lines[0].decode("utf-8", "replace")]), [])
+                return max(rows - 1, 0), len(header)
+            return rows, len(json.loads(lines[0]))
+    except Exception as e:
+        logger.warning(f"Could not estimate the shape of {file_path}: {str(e)}")
+    return None
+
+def _select(df: pd.DataFrame, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+    return df[list(columns)] if columns is not None else df
+
+def iter_frames(file_path: str, batch_size: int = CHUNK_ROWS,
+                columns: Optional[Sequence[str]] = None, file_format: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a data file as a sequence of DataFrames of at most ``batch_size`` rows
+    (CSV files read with pyarrow are batched by the reader's block size instead).
+
+    Only one batch is materialized at a time, so files larger than memory can be
+    processed by consumers that aggregate batch by batch. Check ``can_stream``
+    first; unsupported formats raise ValueError.
+    """
+    file_format = file_format or detect_format(file_path)
+
+    if not can_stream(file_path, file_format):
+        raise ValueError(f"Streaming reads are not supported for {file_path} ({file_format})")
+
+    logger.info(f"Streaming {file_path} as {file_format} in batches of {batch_size} rows")
+
+    if file_format == "excel":
+        for batch in iter_xlsx_batches(file_path, batch_size, columns):
+            yield pd.DataFrame(batch)
+
+    elif file_format == "csv":
+        if has_pyarrow:
+            convert_options = pa_csv.ConvertOptions(include_columns=list(columns) if columns is not None else None)
+            reader = pa_csv.open_csv(file_path, convert_options=convert_options)
+            for batch in reader:
+                yield _select(batch.to_pandas(), columns)
+        else:
+            for chunk in pd.read_csv(file_path, usecols=columns, chunksize=batch_size):
+                yield _select(chunk, columns)
+
+    elif file_format == "parquet":
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+    elif file_format == "feather":
+        with pa.memory_map(file_path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield _select(reader.get_batch(i).to_pandas(), columns)
+
+    elif file_format == "arrow_stream":
+        with pa.OSFile(file_path, "rb") as source:
+            for batch in pa.ipc.open_stream(source):
+                yield _select(batch.to_pandas(), columns)
+
+    elif file_format == "jsonl":
+        for chunk in pd.read_json(file_path, lines=True, chunksize=batch_size):
+            yield _select(chunk, columns)
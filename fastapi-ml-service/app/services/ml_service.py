@@ -1,11 +1,19 @@
 
 import pandas as pd
 import numpy as np
+import asyncio
 import logging
+import os
 from typing import Dict, Any, Tuple, List, Optional
 import importlib
 from app.models.schemas import ModelType, Industry
-from app.services.models import get_model_class, get_complementary_models
+from app.services.models import MODEL_REGISTRY, get_model_class, get_complementary_models, get_required_columns
+from app.services.dataset_cache import dataset_cache, DatasetHandle, open_dataset
+from app.services.file_service import hash_file
+from app.services.loaders import load_dataframe, can_stream, iter_frames
+from app.services.compaction import compact_dataframe, widen_numeric
+from app.services.execution_engine import execution_engine
+from app.config import COMPACT_DATASETS, CHUNK_ROWS, CHUNKED_THRESHOLD_BYTES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,42 +25,160 @@ class MLService:
         # Instead, we'll use the model registry to get the appropriate model class
         pass
     
+    def load_dataset(self, file_path: str, content_hash: Optional[str] = None,
+                     columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load the parsed dataset for a file, reusing a cached copy when the same content was parsed before.
+        
+        When ``columns`` is given only those columns are read; if the projection cannot be
+        applied (e.g. a column name does not exist) the full dataset is loaded instead.
+        """
+        if content_hash is None:
+            content_hash = hash_file(file_path)
+        
+        df = dataset_cache.get(content_hash, columns)
+        if df is not None:
+            logger.info(f"Using cached dataset {content_hash}")
+            return df
+        
+        if columns is not None:
+            try:
+                df = self.compact(load_dataframe(file_path, columns=columns))
+                dataset_cache.put(content_hash, df, columns)
+                return df
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Column projection {columns} failed, loading all columns: {str(e)}")
+                return self.load_dataset(file_path, content_hash)
+        
+        # Read the file with the reader for its format
+        df = self.compact(load_dataframe(file_path))
+        dataset_cache.put(content_hash, df)
+        return df
+    
+    def compact(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compact the dtypes of a freshly loaded frame, keeping the size report in ``df.attrs``
+        """
+        if not COMPACT_DATASETS:
+            return df
+        
+        df, report = compact_dataframe(df)
+        df.attrs["memory_usage"] = report
+        return df
+    
+    def prepare_dataset(self, file_path: str, model_type: ModelType, parameters: Dict[str, Any],
+                        content_hash: Optional[str] = None, share: bool = True) -> DatasetHandle:
+        """
+        Load (or reuse) the dataset for an analysis and export it for another process.
+        
+        The returned handle points at a shared Arrow IPC file, so several workers analyzing
+        the same content map one copy of the data instead of each receiving a pickled frame.
+        With ``share=False`` the handle carries the frame itself, for use in this process.
+        """
+        columns = get_required_columns(model_type.value, parameters)
+        return self.export_dataset(file_path, columns, content_hash, share)
+    
+    def export_dataset(self, file_path: str, columns: Optional[List[str]], content_hash: Optional[str] = None,
+                       share: bool = True) -> DatasetHandle:
+        """
+        Load (or reuse) the given columns of a dataset (all of them for None) and export them
+        like prepare_dataset
+        """
+        if content_hash is None:
+            content_hash = hash_file(file_path)
+        
+        df = self.load_dataset(file_path, content_hash, columns)
+        
+        key = content_hash if columns is None else dataset_cache.projection_key(content_hash, columns)
+        handle = dataset_cache.export(key, df) if share else DatasetHandle(key=key, frame=df)
+        
+        # Arrow does not keep pandas attrs, so carry the compaction report separately
+        handle.memory_usage = df.attrs.get("memory_usage")
+        handle.source, handle.columns = file_path, columns
+        return handle
+    
+    def run_model(self, df: pd.DataFrame, model_type: ModelType, industry: Industry,
+                  parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Run a model's analysis on an already loaded frame
+        """
+        model_class = get_model_class(model_type)
+        
+        # Process with the model, in the precision of the uncompacted data
+        result, metrics = model_class.analyze(widen_numeric(df), industry, parameters)
+        
+        # Report the working set of the dataset before and after dtype compaction
+        if "memory_usage" in df.attrs:
+            metrics["dataset_bytes_before"] = df.attrs["memory_usage"]["bytes_before"]
+            metrics["dataset_bytes_after"] = df.attrs["memory_usage"]["bytes_after"]
+        
+        return result, metrics
+    
+    def should_run_chunked(self, file_path: str, model_type: ModelType, parameters: Dict[str, Any]) -> bool:
+        """
+        Whether to stream the file through the model's chunked mode instead of loading it.
+        
+        Models flagged with ``supports_chunked`` in the registry run chunked when the request
+        sets ``chunked: true`` or, if it does not say, when the file exceeds CHUNKED_THRESHOLD_BYTES.
+        """
+        if not MODEL_REGISTRY.get(model_type.value, {}).get("supports_chunked"):
+            return False
+        
+        chunked = parameters.get("chunked")
+        if chunked is None:
+            chunked = os.path.getsize(file_path) >= CHUNKED_THRESHOLD_BYTES
+        
+        return bool(chunked) and can_stream(file_path)
+    
+    def execution_parameters(self, file_path: str, model_type: ModelType, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The request parameters with ``chunked`` set to the mode the model will run in.
+        
+        Chunked mode can change a result, so it is resolved once, while the file is at hand,
+        and keys the result cache and job coalescing like any other parameter. Models without
+        a chunked mode drop the flag.
+        """
+        resolved = {k: v for k, v in parameters.items() if k != "chunked"}
+        if MODEL_REGISTRY.get(model_type.value, {}).get("supports_chunked"):
+            resolved["chunked"] = self.should_run_chunked(file_path, model_type, parameters)
+        return resolved
+    
     async def process_file(self, file_path: str, model_type: ModelType, 
-                         industry: Industry, parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+                         industry: Industry, parameters: Dict[str, Any],
+                         content_hash: Optional[str] = None,
+                         lane: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """
-        Process the file with the specified model type
+        Process the file with the specified model type, in the execution lane of its job
         """
         try:
-            # Read the Excel file
-            df = pd.read_excel(file_path)
+            # Only read the columns the model needs when the request names them
+            columns = get_required_columns(model_type.value, parameters)
             
-            # Get the appropriate model class
+            # Run the model in the execution engine so the event loop stays responsive
+            timeout = execution_engine.timeout_for(model_type.value, parameters)
             try:
-                model_class = get_model_class(model_type)
-                
-                # Process with the model
-                result, metrics = model_class.analyze(df, industry, parameters)
-                
-                # Add visualization recommendations based on model type
-                result["visualizations"] = self.get_visualization_recommendations(model_type)
+                if self.should_run_chunked(file_path, model_type, parameters):
+                    # Stream the file through the model without materializing it
+                    result, metrics = await execution_engine.run(
+                        model_type.value, analyze_file_chunked, file_path, model_type, industry, parameters, columns,
+                        timeout=timeout, lane=lane
+                    )
+                    metrics["execution_mode"] = "chunked"
+                else:
+                    # Parsing stays in this process so the dataset cache is shared by all workers
+                    handle = await asyncio.to_thread(
+                        self.prepare_dataset, file_path, model_type, parameters, content_hash,
+                        execution_engine.mode == "process"
+                    )
+                    try:
+                        result, metrics = await execution_engine.run(
+                            model_type.value, analyze_handle, handle, model_type, industry, parameters,
+                            timeout=timeout, lane=lane
+                        )
+                    finally:
+                        dataset_cache.release(handle)
                 
-                # Get complementary analysis recommendations
-                complementary_models = get_complementary_models(model_type, industry)
-                if complementary_models:
-                    result["complementary_analyses"] = complementary_models
-                
-                # Add action recommendations based on model results and metrics
-                result["action_recommendations"] = self.get_action_recommendations(model_type, metrics, industry)
-                
-                # Add important variables if applicable
-                if "important_features" in result:
-                    # Transform to a standardized format for frontend
-                    result["important_variables"] = [
-                        {"name": feature, "importance": importance}
-                        for feature, importance in result["important_features"].items()
-                    ]
-                
-                return result, metrics
+                return self.finalize_result(result, metrics, model_type, industry), metrics
                 
             except ValueError as e:
                 logger.error(f"Error getting model class: {str(e)}")
@@ -62,6 +188,83 @@ class MLService:
             logger.error(f"Error processing file: {str(e)}")
             raise
     
+    async def process_batch(self, file_path: str, specs: List[Tuple[ModelType, Dict[str, Any]]],
+                            industry: Industry, content_hash: Optional[str] = None,
+                            lane: Optional[str] = None) -> List[Any]:
+        """
+        Run several models on one file, parsing it once.
+        
+        The dataset is loaded with the union of the columns the models need and exported
+        once, so all workers map the same copy. The models run concurrently; each entry of
+        the returned list is a ``(result, metrics)`` tuple, or the exception its model
+        raised, in the order of ``specs``.
+        """
+        chunked = [self.should_run_chunked(file_path, model_type, parameters) for model_type, parameters in specs]
+        
+        handle = None
+        if not all(chunked):
+            required = [
+                get_required_columns(model_type.value, parameters)
+                for (model_type, parameters), streamed in zip(specs, chunked) if not streamed
+            ]
+            columns = None
+            if all(cols is not None for cols in required):
+                columns = list(dict.fromkeys(column for cols in required for column in cols))
+            handle = await asyncio.to_thread(
+                self.export_dataset, file_path, columns, content_hash, execution_engine.mode == "process"
+            )
+        
+        async def run(model_type: ModelType, parameters: Dict[str, Any], streamed: bool):
+            timeout = execution_engine.timeout_for(model_type.value, parameters)
+            if streamed:
+                columns = get_required_columns(model_type.value, parameters)
+                result, metrics = await execution_engine.run(
+                    model_type.value, analyze_file_chunked, file_path, model_type, industry, parameters, columns,
+                    timeout=timeout, lane=lane
+                )
+                metrics["execution_mode"] = "chunked"
+            else:
+                result, metrics = await execution_engine.run(
+                    model_type.value, analyze_handle, handle, model_type, industry, parameters,
+                    timeout=timeout, lane=lane
+                )
+            return self.finalize_result(result, metrics, model_type, industry), metrics
+        
+        try:
+            return await asyncio.gather(
+                *(run(model_type, parameters, streamed) for (model_type, parameters), streamed in zip(specs, chunked)),
+                return_exceptions=True
+            )
+        finally:
+            if handle is not None:
+                dataset_cache.release(handle)
+    
+    def finalize_result(self, result: Dict[str, Any], metrics: Dict[str, Any], model_type: ModelType,
+                        industry: Industry) -> Dict[str, Any]:
+        """
+        Add visualization, complementary analysis and action recommendations to a model's result
+        """
+        # Add visualization recommendations based on model type
+        result["visualizations"] = self.get_visualization_recommendations(model_type)
+        
+        # Get complementary analysis recommendations
+        complementary_models = get_complementary_models(model_type, industry)
+        if complementary_models:
+            result["complementary_analyses"] = complementary_models
+        
+        # Add action recommendations based on model results and metrics
+        result["action_recommendations"] = self.get_action_recommendations(model_type, metrics, industry)
+        
+        # Add important variables if applicable
+        if "important_features" in result:
+            # Transform to a standardized format for frontend
+            result["important_variables"] = [
+                {"name": feature, "importance": importance}
+                for feature, importance in result["important_features"].items()
+            ]
+        
+        return result
+    
     def get_visualization_recommendations(self, model_type: ModelType) -> List[Dict[str, Any]]:
         """
         Get recommendations for visualizations based on the model type
@@ -265,3 +468,31 @@ class MLService:
 
 # Create a singleton instance
 ml_service = MLService()
+
+def analyze_handle(handle: DatasetHandle, model_type: ModelType, industry: Industry,
+                   parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Entry point for worker processes: open a shared dataset and run the model on it
+    """
+    try:
+        df = open_dataset(handle)
+    except FileNotFoundError:
+        if handle.source is None:
+            raise
+        # Another process sharing the handoff directory evicted the file
+        logger.warning(f"Handoff file of dataset {handle.key} is gone, reading {handle.source} again")
+        df = ml_service.load_dataset(handle.source, columns=handle.columns)
+    if handle.memory_usage:
+        df.attrs["memory_usage"] = handle.memory_usage
+    return ml_service.run_model(df, model_type, industry, parameters)
+
+def analyze_file_chunked(file_path: str, model_type: ModelType, industry: Industry, parameters: Dict[str, Any],
+                         columns: Optional[List[str]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Entry point for worker processes: stream a file through a model's chunked mode
+    """
+    model_class = get_model_class(model_type)
+    if not hasattr(model_class, "analyze_chunked"):
+        raise ValueError(f"Model {model_type.value} does not support chunked execution")
+    batches = iter_frames(file_path, CHUNK_ROWS, columns)
+    return model_class.analyze_chunked(batches, industry, parameters)
@@ -1,5 +1,7 @@
 
 from typing import Dict, Any, List, Optional
+import hashlib
+import json
 import logging
 import importlib
 from app.models.schemas import ModelType, Industry
@@ -18,7 +20,9 @@ MODEL_REGISTRY = {
         "category": "time_series",
         "parameters": ["date_column", "value_column", "p", "d", "q", "seasonal_periods"],
         "industries": ["retail", "finanzas", "manufactura", "tecnologia"],
-        "complementary": ["prophet", "arima", "exponential_smoothing"]
+        "complementary": ["prophet", "arima", "exponential_smoothing"],
+        "timeout": 600,
+        "cost": {"columns": 0, "seconds_per_unit": 2e-3, "base": 1.0}
     },
     "arima": {
         "class": "ARIMAModel",
@@ -27,7 +31,8 @@ MODEL_REGISTRY = {
         "category": "time_series",
         "parameters": ["date_column", "value_column", "p", "d", "q"],
         "industries": ["retail", "finanzas", "manufactura", "salud"],
-        "complementary": ["sarima", "prophet", "linear_regression"]
+        "complementary": ["sarima", "prophet", "linear_regression"],
+        "cost": {"columns": 0, "seconds_per_unit": 5e-4, "base": 0.5}
     },
     "prophet": {
         "class": "ProphetModel",
@@ -36,7 +41,12 @@ MODEL_REGISTRY = {
         "category": "time_series",
         "parameters": ["date_column", "value_column", "yearly_seasonality", "weekly_seasonality", "daily_seasonality"],
         "industries": ["retail", "finanzas", "tecnologia", "salud", "manufactura"],
-        "complementary": ["sarima", "arima", "exponential_smoothing"]
+        "complementary": ["sarima", "arima", "exponential_smoothing"],
+        "worker_pool": "prophet",
+        "priority": "low",
+        "timeout": 900,
+        "cost": {"columns": 0, "seconds_per_unit": 1e-3, "base": 2.0},
+        "max_threads": 1
     },
     "lstm": {
         "class": "LSTMModel",
@@ -45,7 +55,12 @@ MODEL_REGISTRY = {
         "category": "time_series",
         "parameters": ["date_column", "value_column", "sequence_length", "epochs", "batch_size"],
         "industries": ["finanzas", "tecnologia", "manufactura"],
-        "complementary": ["prophet", "arima", "xgboost"]
+        "complementary": ["prophet", "arima", "xgboost"],
+        "worker_pool": "tensorflow",
+        "priority": "low",
+        "timeout": 1800,
+        "memory_factor": 4,
+        "cost": {"columns": 0, "parameters": {"epochs": 50}, "seconds_per_unit": 5e-3, "base": 5.0}
     },
     "exponential_smoothing": {
         "class": "ExponentialSmoothingModel",
@@ -54,7 +69,8 @@ MODEL_REGISTRY = {
         "category": "time_series",
         "parameters": ["date_column", "value_column", "trend", "seasonal", "seasonal_periods"],
         "industries": ["retail", "finanzas", "manufactura", "salud"],
-        "complementary": ["sarima", "prophet", "arima"]
+        "complementary": ["sarima", "prophet", "arima"],
+        "cost": {"columns": 0, "seconds_per_unit": 1e-4, "base": 0.2}
     },
     
     # Classification Models
@@ -65,7 +81,9 @@ MODEL_REGISTRY = {
         "category": "classification",
         "parameters": ["target_column", "n_estimators", "max_depth", "feature_columns"],
         "industries": ["retail", "finanzas", "salud", "manufactura", "tecnologia", "educacion"],
-        "complementary": ["xgboost", "svm", "logistic_regression"]
+        "complementary": ["xgboost", "svm", "logistic_regression"],
+        "memory_factor": 3,
+        "cost": {"parameters": {"n_estimators": 100}, "seconds_per_unit": 2e-5, "base": 0.5}
     },
     "xgboost": {
         "class": "XGBoostModel",
@@ -74,7 +92,9 @@ MODEL_REGISTRY = {
         "category": "classification",
         "parameters": ["target_column", "n_estimators", "learning_rate", "max_depth", "feature_columns"],
         "industries": ["retail", "finanzas", "salud", "manufactura", "tecnologia"],
-        "complementary": ["randomForest", "svm", "logistic_regression"]
+        "complementary": ["randomForest", "svm", "logistic_regression"],
+        "memory_factor": 3,
+        "cost": {"parameters": {"n_estimators": 100}, "seconds_per_unit": 5e-6, "base": 0.5}
     },
     "svm": {
         "class": "SVMModel",
@@ -83,7 +103,9 @@ MODEL_REGISTRY = {
         "category": "classification",
         "parameters": ["target_column", "kernel", "C", "gamma", "feature_columns"],
         "industries": ["finanzas", "salud", "tecnologia", "educacion"],
-        "complementary": ["randomForest", "logistic_regression", "naive_bayes"]
+        "complementary": ["randomForest", "logistic_regression", "naive_bayes"],
+        "memory_factor": 3,
+        "cost": {"rows": 2, "seconds_per_unit": 1e-9, "base": 0.1}
     },
     "logistic_regression": {
         "class": "LogisticRegressionModel",
@@ -112,7 +134,8 @@ MODEL_REGISTRY = {
         "category": "clustering",
         "parameters": ["n_clusters", "feature_columns", "random_state"],
         "industries": ["retail", "finanzas", "tecnologia", "educacion"],
-        "complementary": ["hierarchical", "dbscan", "pca"]
+        "complementary": ["hierarchical", "dbscan", "pca"],
+        "cost": {"parameters": {"n_clusters": 3}, "seconds_per_unit": 2e-7}
     },
     "hierarchical": {
         "class": "HierarchicalModel",
@@ -121,7 +144,9 @@ MODEL_REGISTRY = {
         "category": "clustering",
         "parameters": ["n_clusters", "linkage", "feature_columns"],
         "industries": ["retail", "finanzas", "salud", "educacion"],
-        "complementary": ["kmeans", "dbscan", "pca"]
+        "complementary": ["kmeans", "dbscan", "pca"],
+        "pairwise_memory": True,
+        "cost": {"rows": 2, "seconds_per_unit": 1e-9}
     },
     "dbscan": {
         "class": "DBSCANModel",
@@ -130,7 +155,8 @@ MODEL_REGISTRY = {
         "category": "clustering",
         "parameters": ["eps", "min_samples", "feature_columns"],
         "industries": ["retail", "tecnologia", "manufactura"],
-        "complementary": ["kmeans", "hierarchical"]
+        "complementary": ["kmeans", "hierarchical"],
+        "cost": {"seconds_per_unit": 1e-6}
     },
     
     # Statistical Models
@@ -141,7 +167,10 @@ MODEL_REGISTRY = {
         "category": "statistical",
         "parameters": ["group_column", "value_column"],
         "industries": ["salud", "educacion", "manufactura", "tecnologia"],
-        "complementary": ["t_test", "chi_square"]
+        "complementary": ["t_test", "chi_square"],
+        "supports_chunked": True,
+        "priority": "high",
+        "max_threads": 1
     },
     "t_test": {
         "class": "TTestModel",
@@ -150,7 +179,10 @@ MODEL_REGISTRY = {
         "category": "statistical",
         "parameters": ["group_column", "value_column", "equal_var"],
         "industries": ["salud", "educacion", "tecnologia"],
-        "complementary": ["anova", "chi_square"]
+        "complementary": ["anova", "chi_square"],
+        "supports_chunked": True,
+        "priority": "high",
+        "max_threads": 1
     },
     "chi_square": {
         "class": "ChiSquareModel",
@@ -159,7 +191,10 @@ MODEL_REGISTRY = {
         "category": "statistical",
         "parameters": ["column1", "column2"],
         "industries": ["salud", "educacion", "retail", "tecnologia"],
-        "complementary": ["anova", "t_test"]
+        "complementary": ["anova", "t_test"],
+        "supports_chunked": True,
+        "priority": "high",
+        "max_threads": 1
     },
     
     # Regression Models
@@ -208,10 +243,21 @@ MODEL_REGISTRY = {
         "category": "dimensionality_reduction",
         "parameters": ["n_components", "perplexity", "feature_columns"],
         "industries": ["salud", "tecnologia", "educacion"],
-        "complementary": ["pca", "kmeans"]
+        "complementary": ["pca", "kmeans"],
+        "priority": "low",
+        "timeout": 900,
+        "memory_factor": 4,
+        "cost": {"columns": 0, "parameters": {"perplexity": 30}, "seconds_per_unit": 5e-3, "base": 1.0}
     }
 }
 
+# Parameters whose values name dataset columns (a single name or a list of names)
+COLUMN_PARAMETERS = [
+    "date_column", "value_column", "group_column", "target_column",
+    "column1", "column2", "row_variable", "column_variable",
+    "feature_columns", "features"
+]
+
 def get_model_class(model_type: ModelType):
     """
     Get the appropriate model class based on the model type
@@ -265,6 +311,53 @@ def get_model_parameters(model_type: str) -> List[str]:
         return MODEL_REGISTRY[model_type].get("parameters", [])
     return []
 
+# Request parameters that control how an analysis runs, not what it computes. ``chunked`` is not
+# one of them: chunked runs auto-detect columns and always use Welch's T-test, so the mode resolved
+# at submission (MLService.execution_parameters) is part of an analysis's identity.
+CONTROL_PARAMETERS = ["timeout_seconds", "bypass_cache", "priority"]
+
+def canonical_parameters(parameters: Dict[str, Any]) -> str:
+    """
+    Encode the parameters that determine a model's result as a canonical JSON string:
+    control parameters dropped, keys sorted, no whitespace
+    """
+    relevant = {k: v for k, v in parameters.items() if k not in CONTROL_PARAMETERS}
+    return json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+
+def analysis_key(content_hash: str, model_type: str, industry: str, parameters: Dict[str, Any]) -> str:
+    """
+    Identity of an analysis result: a SHA-256 over the dataset's content hash, the model
+    type, the industry and the canonical parameters
+    """
+    identity = "\n".join([content_hash, model_type, industry, canonical_parameters(parameters)])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def get_required_columns(model_type: str, parameters: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Get the minimal set of columns a model needs for the given request parameters.
+
+    Returns None when the model has to see the full schema, i.e. when any of the
+    column parameters declared for it in the registry is missing from the request
+    and the model would auto-detect that column.
+    """
+    if model_type not in MODEL_REGISTRY:
+        return None
+    
+    declared = [p for p in MODEL_REGISTRY[model_type].get("parameters", []) if p in COLUMN_PARAMETERS]
+    if not declared or any(not parameters.get(p) for p in declared):
+        return None
+    
+    columns = []
+    for param in COLUMN_PARAMETERS:
+        value = parameters.get(param)
+        if not value:
+            continue
+        for column in (value if isinstance(value, (list, tuple)) else [value]):
+            if column not in columns:
+                columns.append(column)
+    
+    return columns
+
 def get_complementary_models(model_type: str, industry: str = None) -> List[Dict[str, Any]]:
     """
     Get complementary model recommendations for a specific model type and industry
@@ -0,0 +1,79 @@
+
+import logging
+import time
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+from app.models.schemas import ModelType, Industry
+from app.services.models import MODEL_REGISTRY, get_model_class
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Synthetic benchmark of the models, used to calibrate the cost model. It runs in
+# worker processes, so it only depends on the model registry
+
+# Columns of the synthetic benchmark dataset
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4"]
+
+# Parameters of the benchmark runs, by model category, with per-model overrides
+BENCHMARK_PARAMETERS = {
+    "time_series": {"date_column": "date", "value_column": "x1", "target_column": "x1"},
+    "classification": {"target_column": "target", "feature_columns": FEATURE_COLUMNS},
+    "clustering": {"feature_columns": FEATURE_COLUMNS},
+    "dimensionality_reduction": {"feature_columns": FEATURE_COLUMNS},
+    "regression": {"target_column": "x1", "feature_columns": FEATURE_COLUMNS[1:], "features": FEATURE_COLUMNS[1:]},
+    "statistical": {"group_column": "group", "value_column": "x1"},
+}
+BENCHMARK_OVERRIDES = {
+    "lstm": {"epochs": 2},
+    "randomForest": {"n_estimators": 20},
+    "xgboost": {"n_estimators": 20},
+    "t_test": {"group_column": "segment"},
+    "chi_square": {"column1": "group", "column2": "segment"},
+    "tsne": {"perplexity": 10},
+}
+
+# Rows of the dataset models are warmed up on
+WARMUP_ROWS = 100
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """A dataset every model can analyze: dates, two categoricals, numeric features and a binary target"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=rows, freq="D"),
+        "group": rng.choice(["A", "B", "C"], rows),
+        "segment": rng.choice(["X", "Y"], rows),
+    })
+    for column in FEATURE_COLUMNS:
+        df[column] = rng.normal(size=rows).cumsum() if column == "x1" else rng.normal(size=rows)
+    df["target"] = (df["x2"] + df["x3"] > 0).astype(int)
+    return df
+
+def benchmark_parameters(model_type: str) -> Dict[str, Any]:
+    category = MODEL_REGISTRY.get(model_type, {}).get("category")
+    return {**BENCHMARK_PARAMETERS.get(category, {}), **BENCHMARK_OVERRIDES.get(model_type, {})}
+
+def benchmark_model(model_type: str, rows: int) -> float:
+    """Seconds one analysis of a synthetic dataset with ``rows`` rows takes"""
+    df = synthetic_frame(rows)
+    model_class = get_model_class(ModelType(model_type))
+    started = time.perf_counter()
+    model_class.analyze(df, Industry.RETAIL, benchmark_parameters(model_type))
+    return time.perf_counter() - started
+
+def warm_up(model_types: List[str]) -> Dict[str, float]:
+    """
+    Import and initialize models in this process by running each once on a
+    small synthetic dataset (which also builds e.g. TensorFlow's runtime and
+    Prophet's Stan model). Returns the seconds each model took.
+    """
+    timings = {}
+    for model_type in model_types:
+        started = time.perf_counter()
+        try:
+            benchmark_model(model_type, WARMUP_ROWS)
+        except Exception as e:
+            logger.warning(f"Warm-up of {model_type} failed: {str(e)}")
+        timings[model_type] = round(time.perf_counter() - started, 3)
+    return timings
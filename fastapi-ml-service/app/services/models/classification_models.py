@@ -1,8 +1,10 @@
 
 import pandas as pd
 import numpy as np
+from functools import lru_cache
 from typing import Dict, Any, Tuple
 import logging
+from app.services.thread_governor import thread_budget
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,14 +16,21 @@ try:
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import accuracy_score, r2_score, mean_squared_error
     
-    # Import XGBoost
-    import xgboost as xgb
-    
     has_sklearn = True
 except ImportError as e:
     logger.error(f"Error importing classification libraries: {e}")
     has_sklearn = False
 
+@lru_cache(maxsize=None)
+def load_xgboost():
+    """The xgboost module, imported on first use, or None if it is not installed"""
+    try:
+        import xgboost
+        return xgboost
+    except ImportError as e:
+        logger.error(f"Error importing XGBoost: {e}")
+        return None
+
 def random_forest_analysis(df: pd.DataFrame, industry: str, 
                          parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """Implement Random Forest analysis"""
@@ -54,7 +63,7 @@ def random_forest_analysis(df: pd.DataFrame, industry: str,
         
         # Train model based on task
         if task == 'classification':
-            model = RandomForestClassifier()
+            model = RandomForestClassifier(n_jobs=thread_budget())
             model.fit(X_train, y_train)
             
             # Evaluate
@@ -86,7 +95,7 @@ def random_forest_analysis(df: pd.DataFrame, industry: str,
             }
             
         else:  # regression
-            model = RandomForestRegressor()
+            model = RandomForestRegressor(n_jobs=thread_budget())
             model.fit(X_train, y_train)
             
             # Evaluate
@@ -131,7 +140,8 @@ def xgboost_analysis(df: pd.DataFrame, industry: str,
     
     try:
         # Check if xgboost is available
-        if 'xgb' not in globals():
+        xgb = load_xgboost()
+        if xgb is None or not has_sklearn:
             logger.warning("XGBoost not available, using fallback implementation")
             return classification_fallback("xgboost", df, industry, parameters)
             
@@ -157,7 +167,7 @@ def xgboost_analysis(df: pd.DataFrame, industry: str,
         
         # Train model based on task
         if task == 'classification':
-            model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
+            model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss', n_jobs=thread_budget())
             model.fit(X_train, y_train)
             
             # Evaluate
@@ -186,7 +196,7 @@ def xgboost_analysis(df: pd.DataFrame, industry: str,
             }
             
         else:  # regression
-            model = xgb.XGBRegressor()
+            model = xgb.XGBRegressor(n_jobs=thread_budget())
             model.fit(X_train, y_train)
             
             # Evaluate
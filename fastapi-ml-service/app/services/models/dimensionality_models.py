@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, Tuple
 import logging
+from app.services.thread_governor import thread_budget
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -120,7 +121,8 @@ class TSNEModel:
             scaled_data = scaler.fit_transform(numeric_df)
             
             # Apply t-SNE
-            tsne = TSNE(n_components=n_components, perplexity=min(perplexity, numeric_df.shape[0]-1), random_state=42)
+            tsne = TSNE(n_components=n_components, perplexity=min(perplexity, numeric_df.shape[0]-1), random_state=42,
+                        n_jobs=thread_budget())
             embedding = tsne.fit_transform(scaled_data)
             
             # Prepare embedding data for visualization
@@ -1,7 +1,8 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple, List
+from itertools import chain
+from typing import Dict, Any, Tuple, List, Iterable, Optional
 import logging
 
 # Configure logging
@@ -15,6 +16,69 @@ except ImportError as e:
     logger.error(f"Error importing scipy: {e}")
     has_scipy = False
 
+class RunningMoments:
+    """
+    Count, mean and sum of squared deviations (M2) of a stream of values.
+
+    Batches are folded in with the parallel form of Welford's algorithm (Chan et al.),
+    which stays numerically stable when merging partial results of very different sizes.
+    """
+    
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+    
+    def merge(self, count: int, mean: float, m2: float) -> None:
+        """Merge the moments of another batch into this accumulator"""
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+    
+    def variance(self, ddof: int = 0) -> float:
+        return self.m2 / (self.count - ddof) if self.count > ddof else float("nan")
+
+def accumulate_group_moments(batch: pd.DataFrame, group_col: str, value_col: str,
+                             moments: Dict[Any, RunningMoments]) -> None:
+    """Fold the per-group moments of one batch into ``moments`` (in order of first appearance)"""
+    values = pd.to_numeric(batch[value_col], errors="coerce").astype(np.float64)
+    grouped = values.groupby(batch[group_col], sort=False, observed=True)
+    
+    summary = pd.DataFrame({
+        "count": grouped.count(),
+        "mean": grouped.mean(),
+        "var": grouped.var(ddof=0)
+    })
+    
+    for name, row in summary.iterrows():
+        count = int(row["count"])
+        if count == 0:
+            continue
+        moments.setdefault(name, RunningMoments()).merge(count, float(row["mean"]), float(row["var"]) * count)
+
+def sort_group_names(names: List[Any]) -> List[Any]:
+    """Sort group keys like DataFrame.groupby does, keeping appearance order if they are not comparable"""
+    try:
+        return sorted(names)
+    except TypeError:
+        return names
+
+def peek_batches(batches: Iterable[pd.DataFrame]) -> Tuple[Optional[pd.DataFrame], Iterable[pd.DataFrame]]:
+    """Return the first batch (used for column auto-detection) and an iterable over all batches"""
+    iterator = iter(batches)
+    first = next(iterator, None)
+    if first is None:
+        return None, iter(())
+    return first, chain([first], iterator)
+
 class ANOVAModel:
     @staticmethod
     def analyze(df: pd.DataFrame, industry: str, 
@@ -78,26 +142,7 @@ class ANOVAModel:
                 ss_total = sum((x - grand_mean) ** 2 for g in groups for x in g)
                 eta_squared = ss_between / ss_total if ss_total != 0 else 0
                 
-                # Generate industry-specific insights
-                industry_insights = ANOVAModel.get_industry_insights(industry, p_value, group_means)
-                
-                result = {
-                    "summary": "Análisis ANOVA completado. Se han encontrado diferencias significativas entre los grupos." 
-                              if p_value < 0.05 else 
-                              "Análisis ANOVA completado. No se han encontrado diferencias significativas entre los grupos.",
-                    "group_means": group_means,
-                    "group_variances": group_variances,
-                    "industry_insights": industry_insights
-                }
-                
-                metrics = {
-                    "F_statistic": float(f_stat),
-                    "p_value": float(p_value),
-                    "eta_squared": float(eta_squared),
-                    "significant_difference": p_value < 0.05
-                }
-                
-                return result, metrics
+                return ANOVAModel.build_result(industry, f_stat, p_value, eta_squared, group_means, group_variances)
             else:
                 logger.warning("Not enough groups for ANOVA analysis")
                 return ANOVAModel.fallback(df, industry, parameters)
@@ -106,6 +151,100 @@ class ANOVAModel:
             logger.error(f"Error in ANOVA analysis: {e}")
             return ANOVAModel.fallback(df, industry, parameters)
     
+    @staticmethod
+    def analyze_chunked(batches: Iterable[pd.DataFrame], industry: str, 
+                        parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        ANOVA over a stream of batches, accumulating per-group count, mean and M2.
+        
+        Columns that are not given in the parameters are auto-detected from the first batch.
+        """
+        logger.info(f"Running chunked ANOVA analysis for {industry}")
+        
+        try:
+            if not has_scipy:
+                logger.warning("scipy not available, using fallback implementation")
+                return ANOVAModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            first, batches = peek_batches(batches)
+            if first is None:
+                logger.warning("No data for chunked ANOVA analysis")
+                return ANOVAModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            group_col = parameters.get('group_column', None)
+            value_col = parameters.get('value_column', None)
+            
+            if group_col is None:
+                candidates = [col for col in first.columns if 1 < first[col].nunique() <= 10]
+                group_col = candidates[0] if candidates else first.columns[0]
+            
+            if value_col is None:
+                numeric_cols = first.select_dtypes(include=[np.number]).columns
+                value_candidates = [col for col in numeric_cols if col != group_col]
+                value_col = value_candidates[0] if value_candidates else first.columns[1 if len(first.columns) > 1 else 0]
+            
+            moments: Dict[Any, RunningMoments] = {}
+            for batch in batches:
+                accumulate_group_moments(batch, group_col, value_col, moments)
+            
+            names = sort_group_names(list(moments.keys()))
+            if len(names) < 2:
+                logger.warning("Not enough groups for ANOVA analysis")
+                return ANOVAModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            counts = np.array([moments[name].count for name in names], dtype=np.float64)
+            means = np.array([moments[name].mean for name in names])
+            m2s = np.array([moments[name].m2 for name in names])
+            
+            # One-way ANOVA from the sufficient statistics (same as scipy.stats.f_oneway)
+            n_total = counts.sum()
+            k = len(names)
+            weighted_mean = np.sum(counts * means) / n_total
+            ss_between = np.sum(counts * (means - weighted_mean) ** 2)
+            ss_within = np.sum(m2s)
+            f_stat = (ss_between / (k - 1)) / (ss_within / (n_total - k))
+            p_value = float(stats.f.sf(f_stat, k - 1, n_total - k))
+            
+            # Eta squared around the unweighted mean of group means, as in analyze()
+            grand_mean = np.mean(means)
+            eta_between = np.sum(counts * (means - grand_mean) ** 2)
+            eta_total = np.sum(m2s + counts * (means - grand_mean) ** 2)
+            eta_squared = eta_between / eta_total if eta_total != 0 else 0
+            
+            group_means = {str(name): float(moments[name].mean) for name in names}
+            group_variances = {str(name): float(moments[name].variance()) for name in names}
+            
+            return ANOVAModel.build_result(industry, f_stat, p_value, eta_squared, group_means, group_variances)
+            
+        except Exception as e:
+            logger.error(f"Error in chunked ANOVA analysis: {e}")
+            return ANOVAModel.fallback(pd.DataFrame(), industry, parameters)
+    
+    @staticmethod
+    def build_result(industry: str, f_stat: float, p_value: float, eta_squared: float,
+                     group_means: Dict[str, float], group_variances: Dict[str, float]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Build the ANOVA result and metrics from the test statistics"""
+        # Generate industry-specific insights
+        industry_insights = ANOVAModel.get_industry_insights(industry, p_value, group_means)
+        
+        result = {
+            "summary": "Análisis ANOVA completado. Se han encontrado diferencias significativas entre los grupos." 
+                      if p_value < 0.05 else 
+                      "Análisis ANOVA completado. No se han encontrado diferencias significativas entre los grupos.",
+            "group_means": group_means,
+            "group_variances": group_variances,
+            "industry_insights": industry_insights
+        }
+        
+        metrics = {
+            "F_statistic": float(f_stat),
+            "p_value": float(p_value),
+            "eta_squared": float(eta_squared),
+            "significant_difference": p_value < 0.05
+        }
+        
+        return result, metrics
+    
     @staticmethod
     def get_industry_insights(industry: str, p_value: float, group_means: Dict[str, float]) -> List[Dict[str, str]]:
         """Generate industry-specific insights based on ANOVA results"""
@@ -280,41 +419,119 @@ class TTestModel:
             mean1, mean2 = np.mean(group1), np.mean(group2)
             var1, var2 = np.var(group1, ddof=1), np.var(group2, ddof=1)
             
-            # Pooled standard deviation
-            pooled_std = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
-            cohens_d = abs(mean1 - mean2) / pooled_std if pooled_std != 0 else 0
-            
-            # Generate industry-specific insights
-            industry_insights = TTestModel.get_industry_insights(
-                industry, p_value, str(unique_groups[0]), str(unique_groups[1]), mean1 > mean2
+            return TTestModel.build_result(
+                industry, test_name, test_type, t_stat, p_value,
+                str(unique_groups[0]), str(unique_groups[1]), n1, n2, mean1, mean2, var1, var2
             )
             
-            result = {
-                "summary": f"{test_name} completado. Se han encontrado diferencias significativas entre los grupos." 
-                          if p_value < 0.05 else 
-                          f"{test_name} completado. No se han encontrado diferencias significativas entre los grupos.",
-                "group_means": {
-                    str(unique_groups[0]): float(mean1),
-                    str(unique_groups[1]): float(mean2)
-                },
-                "test_type": test_type,
-                "industry_insights": industry_insights
-            }
-            
-            metrics = {
-                "t_statistic": float(t_stat),
-                "p_value": float(p_value),
-                "cohens_d": float(cohens_d),
-                "significant_difference": p_value < 0.05,
-                "n_samples": {"group1": int(n1), "group2": int(n2)}
-            }
-            
-            return result, metrics
-            
         except Exception as e:
             logger.error(f"Error in T-Test analysis: {e}")
             return TTestModel.fallback(df, industry, parameters)
     
+    @staticmethod
+    def analyze_chunked(batches: Iterable[pd.DataFrame], industry: str, 
+                        parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Welch's T-test over a stream of batches, accumulating per-group count, mean and M2.
+        
+        The paired test needs both samples aligned in memory, so chunked execution always
+        runs the independent (Welch) test. Columns that are not given in the parameters
+        are auto-detected from the first batch.
+        """
+        logger.info(f"Running chunked T-Test analysis for {industry}")
+        
+        try:
+            if not has_scipy:
+                logger.warning("scipy not available, using fallback implementation")
+                return TTestModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            first, batches = peek_batches(batches)
+            if first is None:
+                logger.warning("No data for chunked T-Test analysis")
+                return TTestModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            group_col = parameters.get('group_column', None)
+            value_col = parameters.get('value_column', None)
+            
+            if parameters.get('test_type', 'independent') == 'paired':
+                logger.warning("Paired T-test is not available in chunked mode, running Welch's test")
+            
+            if group_col is None:
+                candidates = [col for col in first.columns if first[col].nunique() == 2]
+                group_col = candidates[0] if candidates else first.columns[0]
+            
+            if value_col is None:
+                numeric_cols = first.select_dtypes(include=[np.number]).columns
+                value_candidates = [col for col in numeric_cols if col != group_col]
+                value_col = value_candidates[0] if value_candidates else first.columns[1 if len(first.columns) > 1 else 0]
+            
+            moments: Dict[Any, RunningMoments] = {}
+            for batch in batches:
+                accumulate_group_moments(batch, group_col, value_col, moments)
+            
+            # Like analyze(), compare the first two groups in order of appearance
+            names = list(moments.keys())
+            if len(names) < 2:
+                logger.warning("T-test requires 2 groups in chunked mode")
+                return TTestModel.fallback(pd.DataFrame(), industry, parameters)
+            if len(names) != 2:
+                logger.warning(f"T-test requires exactly 2 groups, but found {len(names)}. Using first two.")
+            
+            g1, g2 = moments[names[0]], moments[names[1]]
+            n1, n2 = g1.count, g2.count
+            var1, var2 = g1.variance(ddof=1), g2.variance(ddof=1)
+            
+            # Welch's t-test from the sufficient statistics (same as scipy.stats.ttest_ind(equal_var=False))
+            se1, se2 = var1 / n1, var2 / n2
+            t_stat = (g1.mean - g2.mean) / np.sqrt(se1 + se2)
+            dof = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+            p_value = float(2 * stats.t.sf(np.abs(t_stat), dof))
+            
+            return TTestModel.build_result(
+                industry, "T-test independiente (Welch)", "independent", t_stat, p_value,
+                str(names[0]), str(names[1]), n1, n2, g1.mean, g2.mean, var1, var2
+            )
+            
+        except Exception as e:
+            logger.error(f"Error in chunked T-Test analysis: {e}")
+            return TTestModel.fallback(pd.DataFrame(), industry, parameters)
+    
+    @staticmethod
+    def build_result(industry: str, test_name: str, test_type: str, t_stat: float, p_value: float,
+                     group1_name: str, group2_name: str, n1: int, n2: int,
+                     mean1: float, mean2: float, var1: float, var2: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Build the T-test result and metrics from the per-group statistics"""
+        # Pooled standard deviation
+        pooled_std = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
+        cohens_d = abs(mean1 - mean2) / pooled_std if pooled_std != 0 else 0
+        
+        # Generate industry-specific insights
+        industry_insights = TTestModel.get_industry_insights(
+            industry, p_value, group1_name, group2_name, mean1 > mean2
+        )
+        
+        result = {
+            "summary": f"{test_name} completado. Se han encontrado diferencias significativas entre los grupos." 
+                      if p_value < 0.05 else 
+                      f"{test_name} completado. No se han encontrado diferencias significativas entre los grupos.",
+            "group_means": {
+                group1_name: float(mean1),
+                group2_name: float(mean2)
+            },
+            "test_type": test_type,
+            "industry_insights": industry_insights
+        }
+        
+        metrics = {
+            "t_statistic": float(t_stat),
+            "p_value": float(p_value),
+            "cohens_d": float(cohens_d),
+            "significant_difference": p_value < 0.05,
+            "n_samples": {"group1": int(n1), "group2": int(n2)}
+        }
+        
+        return result, metrics
+    
     @staticmethod
     def get_industry_insights(
         industry: str, 
@@ -432,9 +649,9 @@ class ChiSquareModel:
                 logger.warning("scipy not available, using fallback implementation")
                 return ChiSquareModel.fallback(df, industry, parameters)
             
-            # Get parameters
-            row_var = parameters.get('row_variable', None)
-            col_var = parameters.get('column_variable', None)
+            # Get parameters (column1/column2 are the names advertised in the model registry)
+            row_var = parameters.get('row_variable', parameters.get('column1', None))
+            col_var = parameters.get('column_variable', parameters.get('column2', None))
             
             # Find appropriate columns if not specified
             categorical_cols = [col for col in df.columns if df[col].nunique() <= 10 and df[col].nunique() > 1]
@@ -461,50 +678,104 @@ class ChiSquareModel:
             # Create contingency table
             contingency = pd.crosstab(df[row_var], df[col_var])
             
-            # Perform Chi-Square test
-            chi2, p_value, dof, expected = stats.chi2_contingency(contingency)
-            
-            # Calculate Cramer's V (effect size)
-            n = contingency.sum().sum()
-            min_dim = min(contingency.shape) - 1
-            cramers_v = np.sqrt(chi2 / (n * min_dim)) if n * min_dim != 0 else 0
-            
-            # Convert contingency table to serializable format
-            contingency_dict = {}
-            for i, row_name in enumerate(contingency.index):
-                row_dict = {}
-                for j, col_name in enumerate(contingency.columns):
-                    row_dict[str(col_name)] = int(contingency.iloc[i, j])
-                contingency_dict[str(row_name)] = row_dict
-            
-            # Generate industry-specific insights
-            industry_insights = ChiSquareModel.get_industry_insights(
-                industry, p_value, row_var, col_var, cramers_v
-            )
-            
-            result = {
-                "summary": "Análisis Chi-Cuadrado completado. Se ha detectado asociación significativa entre variables." 
-                          if p_value < 0.05 else 
-                          "Análisis Chi-Cuadrado completado. No se ha detectado asociación significativa entre variables.",
-                "contingency_table": contingency_dict,
-                "variables_analyzed": {"row": row_var, "column": col_var},
-                "industry_insights": industry_insights
-            }
-            
-            metrics = {
-                "chi2_statistic": float(chi2),
-                "p_value": float(p_value),
-                "degrees_of_freedom": int(dof),
-                "cramers_v": float(cramers_v),
-                "significant_association": p_value < 0.05
-            }
-            
-            return result, metrics
+            return ChiSquareModel.build_result(industry, contingency, row_var, col_var)
             
         except Exception as e:
             logger.error(f"Error in Chi-Square analysis: {e}")
             return ChiSquareModel.fallback(df, industry, parameters)
     
+    @staticmethod
+    def analyze_chunked(batches: Iterable[pd.DataFrame], industry: str, 
+                        parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Chi-Square test over a stream of batches, summing per-batch contingency tables.
+        
+        Columns that are not given in the parameters are auto-detected from the first batch.
+        """
+        logger.info(f"Running chunked Chi-Square analysis for {industry}")
+        
+        try:
+            if not has_scipy:
+                logger.warning("scipy not available, using fallback implementation")
+                return ChiSquareModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            first, batches = peek_batches(batches)
+            if first is None:
+                logger.warning("No data for chunked Chi-Square analysis")
+                return ChiSquareModel.fallback(pd.DataFrame(), industry, parameters)
+            
+            row_var = parameters.get('row_variable', parameters.get('column1', None))
+            col_var = parameters.get('column_variable', parameters.get('column2', None))
+            
+            categorical_cols = [col for col in first.columns if 1 < first[col].nunique() <= 10]
+            
+            if not row_var:
+                row_var = categorical_cols[0] if categorical_cols else first.columns[0]
+            
+            if not col_var:
+                candidates = [col for col in categorical_cols if col != row_var]
+                if candidates:
+                    col_var = candidates[0]
+                else:
+                    col_var = first.columns[1] if len(first.columns) > 1 else first.columns[0]
+            
+            contingency = None
+            for batch in batches:
+                counts = pd.crosstab(batch[row_var], batch[col_var])
+                contingency = counts if contingency is None else contingency.add(counts, fill_value=0)
+            
+            contingency = contingency.fillna(0).astype(np.int64)
+            
+            return ChiSquareModel.build_result(industry, contingency, row_var, col_var)
+            
+        except Exception as e:
+            logger.error(f"Error in chunked Chi-Square analysis: {e}")
+            return ChiSquareModel.fallback(pd.DataFrame(), industry, parameters)
+    
+    @staticmethod
+    def build_result(industry: str, contingency: pd.DataFrame,
+                     row_var: str, col_var: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Run the Chi-Square test on a contingency table and build the result and metrics"""
+        # Perform Chi-Square test
+        chi2, p_value, dof, expected = stats.chi2_contingency(contingency)
+        
+        # Calculate Cramer's V (effect size)
+        n = contingency.sum().sum()
+        min_dim = min(contingency.shape) - 1
+        cramers_v = np.sqrt(chi2 / (n * min_dim)) if n * min_dim != 0 else 0
+        
+        # Convert contingency table to serializable format
+        contingency_dict = {}
+        for i, row_name in enumerate(contingency.index):
+            row_dict = {}
+            for j, col_name in enumerate(contingency.columns):
+                row_dict[str(col_name)] = int(contingency.iloc[i, j])
+            contingency_dict[str(row_name)] = row_dict
+        
+        # Generate industry-specific insights
+        industry_insights = ChiSquareModel.get_industry_insights(
+            industry, p_value, row_var, col_var, cramers_v
+        )
+        
+        result = {
+            "summary": "Análisis Chi-Cuadrado completado. Se ha detectado asociación significativa entre variables." 
+                      if p_value < 0.05 else 
+                      "Análisis Chi-Cuadrado completado. No se ha detectado asociación significativa entre variables.",
+            "contingency_table": contingency_dict,
+            "variables_analyzed": {"row": row_var, "column": col_var},
+            "industry_insights": industry_insights
+        }
+        
+        metrics = {
+            "chi2_statistic": float(chi2),
+            "p_value": float(p_value),
+            "degrees_of_freedom": int(dof),
+            "cramers_v": float(cramers_v),
+            "significant_association": p_value < 0.05
+        }
+        
+        return result, metrics
+    
     @staticmethod
     def get_industry_insights(
         industry: str, 
@@ -1,32 +1,57 @@
 
 import pandas as pd
 import numpy as np
+from functools import lru_cache
 from typing import Dict, Any, Tuple
 import logging
+from app.services.thread_governor import thread_budget
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-try:
-    # Import statsmodels for ARIMA and SARIMA
-    import statsmodels.api as sm
-    from statsmodels.tsa.statespace.sarimax import SARIMAX
-    
-    # Import Prophet
-    from prophet import Prophet
-    
-    # Optional: Import for LSTM if available
+# statsmodels, Prophet and TensorFlow are imported on first use by the model that
+# needs them, so importing this module (or running the other models) loads none of them
+
+@lru_cache(maxsize=None)
+def load_sarimax():
+    """statsmodels' SARIMAX class for ARIMA and SARIMA, or None if statsmodels is not installed"""
+    try:
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        return SARIMAX
+    except ImportError as e:
+        logger.error(f"Error importing statsmodels: {e}")
+        return None
+
+@lru_cache(maxsize=None)
+def load_prophet():
+    """The Prophet class, or None if prophet is not installed"""
     try:
+        from prophet import Prophet
+        return Prophet
+    except ImportError as e:
+        logger.error(f"Error importing Prophet: {e}")
+        return None
+
+@lru_cache(maxsize=None)
+def load_keras():
+    """Keras' Sequential model and LSTM and Dense layers, or None if TensorFlow is not installed"""
+    try:
+        import tensorflow as tf
         from tensorflow.keras.models import Sequential
         from tensorflow.keras.layers import LSTM as KerasLSTM, Dense
-        has_keras = True
     except ImportError:
-        has_keras = False
         logger.warning("TensorFlow/Keras not available. LSTM models will use fallback implementation.")
-        
-except ImportError as e:
-    logger.error(f"Error importing time series libraries: {e}")
-    # Fallbacks will be used if imports fail
+        return None
+    
+    # TensorFlow sizes its thread pools once, when its runtime starts
+    threads = thread_budget()
+    if threads:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError as e:
+            logger.warning(f"Could not limit TensorFlow threads: {e}")
+    return Sequential, KerasLSTM, Dense
 
 def sarima_analysis(df: pd.DataFrame, industry: str, 
                   parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
@@ -56,6 +81,9 @@ def sarima_analysis(df: pd.DataFrame, industry: str,
         
         # Try to fit SARIMA model
         try:
+            SARIMAX = load_sarimax()
+            if SARIMAX is None:
+                raise ImportError("statsmodels is not installed")
             model = SARIMAX(ts_data, order=(p, d, q), seasonal_order=(P, D, Q, s))
             model_fit = model.fit(disp=False)
             
@@ -136,6 +164,9 @@ def arima_analysis(df: pd.DataFrame, industry: str,
         
         # Try to fit ARIMA model
         try:
+            SARIMAX = load_sarimax()
+            if SARIMAX is None:
+                raise ImportError("statsmodels is not installed")
             model = SARIMAX(ts_data, order=(p, d, q))
             model_fit = model.fit(disp=False)
             
@@ -209,6 +240,9 @@ def prophet_analysis(df: pd.DataFrame, industry: str,
             prophet_df = df[[ds_col, y_col]].rename(columns={ds_col: 'ds', y_col: 'y'})
             
             # Create and fit Prophet model
+            Prophet = load_prophet()
+            if Prophet is None:
+                raise ImportError("prophet is not installed")
             model = Prophet()
             model.fit(prophet_df)
             
@@ -279,9 +313,11 @@ def lstm_analysis(df: pd.DataFrame, industry: str,
     
     try:
         # Check if TensorFlow is available
-        if not has_keras:
+        keras = load_keras()
+        if keras is None:
             logger.warning("TensorFlow not available, using fallback implementation")
             return lstm_fallback(df, industry, parameters)
+        Sequential, KerasLSTM, Dense = keras
             
         # Get parameters
         target_col = parameters.get('target_column', None)
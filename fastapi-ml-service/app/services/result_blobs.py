@@ -0,0 +1,104 @@
+
+import io
+import logging
+import uuid
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+from app.config import RESULT_BLOB_THRESHOLD, RESULT_BLOB_BUCKET, RESULT_BLOB_COMPRESSION
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    # Import zstandard for faster, smaller blobs than zlib-compressed NPZ
+    import zstandard
+    has_zstd = True
+except ImportError:
+    has_zstd = False
+    logger.warning("zstandard not available. Result blobs will be stored as compressed NPZ.")
+
+# Key that marks a dict in a stored result as a reference to an array blob
+BLOB_KEY = "$blob"
+
+@dataclass
+class ResultBlob:
+    """An encoded array waiting to be uploaded to storage"""
+    path: str
+    data: bytes
+
+def encode_array(array: np.ndarray, compression: str = RESULT_BLOB_COMPRESSION) -> Tuple[bytes, str]:
+    """Serialize an array as zstd-compressed .npy bytes, or as a compressed NPZ archive"""
+    if compression == "zstd" and has_zstd:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return zstandard.ZstdCompressor().compress(buffer.getvalue()), "npy+zstd"
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, values=array)
+    return buffer.getvalue(), "npz"
+
+def decode_array(data: bytes, blob_format: str) -> np.ndarray:
+    """Inverse of encode_array"""
+    if blob_format == "npy+zstd":
+        if not has_zstd:
+            raise ValueError("zstandard is required to read npy+zstd blobs")
+        return np.load(io.BytesIO(zstandard.ZstdDecompressor().decompress(data)), allow_pickle=False)
+    if blob_format == "npz":
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            return archive["values"]
+    raise ValueError(f"Unknown blob format: {blob_format}")
+
+def _numeric_array(value: Any, threshold: int) -> Optional[np.ndarray]:
+    # Only lists of numbers (or equal-length lists of them) qualify
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, list) and value and isinstance(value[0], (int, float, list, np.number)):
+        try:
+            array = np.asarray(value)
+        except (ValueError, TypeError):
+            return None
+    else:
+        return None
+
+    if array.dtype.kind not in "iuf" or array.size < threshold:
+        return None
+    return array
+
+def offload_arrays(result: Any, prefix: str, threshold: int = RESULT_BLOB_THRESHOLD,
+                   bucket: str = RESULT_BLOB_BUCKET) -> Tuple[Any, List[ResultBlob]]:
+    """
+    Replace numeric arrays of at least ``threshold`` elements with blob references.
+
+    Returns the rewritten result and the blobs to upload. Each reference records
+    the storage location, encoding, shape and dtype of its array, so clients can
+    decide whether to fetch it at all.
+    """
+    blobs: List[ResultBlob] = []
+
+    def visit(value: Any) -> Any:
+        array = _numeric_array(value, threshold)
+        if array is not None:
+            data, blob_format = encode_array(array)
+            extension = "npy.zst" if blob_format == "npy+zstd" else "npz"
+            path = f"{prefix}/{uuid.uuid4()}.{extension}"
+            blobs.append(ResultBlob(path=path, data=data))
+            return {
+                BLOB_KEY: f"{bucket}/{path}",
+                "format": blob_format,
+                "shape": list(array.shape),
+                "dtype": str(array.dtype),
+                "bytes": len(data)
+            }
+        if isinstance(value, dict):
+            return {key: visit(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [visit(item) for item in value]
+        return value
+
+    if threshold <= 0:
+        return result, blobs
+    return visit(result), blobs
+
+def is_blob_reference(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_KEY in value
@@ -0,0 +1,167 @@
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from app.config import RESULT_CACHE_ENABLED, RESULT_CACHE_DB, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CachedResult:
+    """A stored analysis result found in the result cache"""
+    result_id: str
+    result: Dict[str, Any]
+    metrics: Dict[str, Any]
+    created_at: float
+
+class ResultCache:
+    """
+    Persistent cache of analysis results in SQLite.
+
+    Entries are keyed by ``analysis_key`` (dataset content hash, model type,
+    industry and canonical parameters), which identifies a result because the
+    models are deterministic. Each entry holds the id of the stored result and
+    the result and metrics themselves as compressed JSON. Entries expire after
+    ``ttl`` seconds, and the least recently used ones are evicted when the
+    total payload size exceeds ``max_bytes``.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            result_id TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+    """
+
+    def __init__(self, db_path: str = RESULT_CACHE_DB, ttl: float = RESULT_CACHE_TTL,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES, enabled: bool = RESULT_CACHE_ENABLED):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+        if not enabled:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        # One connection shared by the worker threads, serialized by a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[CachedResult]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_id, payload, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            result_id, payload, created_at = row
+            if created_at + self.ttl < now:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+
+        data = json.loads(zlib.decompress(payload))
+        return CachedResult(result_id=result_id, result=data["result"], metrics=data["metrics"], created_at=created_at)
+
+    def _put(self, key: str, result_id: str, result: Dict[str, Any], metrics: Dict[str, Any]) -> None:
+        payload = zlib.compress(json.dumps({"result": result, "metrics": metrics}, default=str).encode())
+        if len(payload) > self.max_bytes:
+            logger.info(f"Result {result_id} ({len(payload)} bytes) exceeds the result cache size, not caching")
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, result_id, payload, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, result_id, payload, len(payload), now, now)
+                )
+                self._stats["stores"] += 1
+                self._evict(now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, now: float) -> None:
+        # Expired entries go first, then the least recently used until the size fits
+        expired = self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,)).rowcount
+        self._stats["expired"] += expired
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            self._stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        """Look up a result, or return None if it is not cached (or has expired)"""
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            logger.error(f"Error reading the result cache: {str(e)}")
+            return None
+
+    async def put(self, key: str, result_id: str, result: Dict[str, Any], metrics: Dict[str, Any]) -> None:
+        """Remember the stored result of an analysis"""
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._put, key, result_id, result, metrics)
+        except Exception as e:
+            logger.error(f"Error writing the result cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and the current size"""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            return {
+                "enabled": True,
+                **self._stats,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl
+            }
+
+# Create a singleton instance
+result_cache = ResultCache()
@@ -0,0 +1,380 @@
+
+import asyncio
+import httpx
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+from app.config import (
+    SUPABASE_KEY, SUPABASE_REST_URL, SUPABASE_STORAGE_URL, DOWNLOAD_TIMEOUT, UPLOAD_CHUNK_SIZE, MAX_DOWNLOAD_SIZE,
+    SUPABASE_POOL_SIZE, SUPABASE_KEEPALIVE_CONNECTIONS, SUPABASE_TIMEOUT,
+    STORAGE_BACKEND, LOCAL_STORAGE_DB, LOCAL_STORAGE_DIR
+)
+from app.services.file_service import iter_file, write_chunks, StoredFile
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class StorageBackend(ABC):
+    """
+    Persistence for file records, analysis results and stored files.
+
+    Methods raise on failure; SupabaseService turns errors into the logged
+    None/False results the routers expect.
+    """
+
+    @abstractmethod
+    async def update_file_statuses(self, file_ids: List[str], data: Dict[str, Any]) -> List[str]:
+        """Apply the same update to several files, returning the ids that were updated"""
+
+    @abstractmethod
+    async def insert_analysis_results(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Insert result rows, returning their ids in the same order"""
+
+    @abstractmethod
+    async def get_file_path(self, file_id: str) -> Optional[str]:
+        """Return the storage path of a file, or None if there is no such file"""
+
+    @abstractmethod
+    async def download_file(self, bucket: str, file_path: str, local_path: str) -> StoredFile:
+        """Copy a stored file to local disk"""
+
+    @abstractmethod
+    async def upload_file(self, bucket: str, file_path: str, local_path: str) -> None:
+        """Copy a local file to storage without reading it into memory"""
+
+    @abstractmethod
+    async def delete_file(self, bucket: str, file_path: str) -> None:
+        """Remove a stored file; removing a missing file is not an error"""
+
+    @abstractmethod
+    async def upload_blob(self, bucket: str, path: str, data: bytes) -> None:
+        """Store a binary object"""
+
+    @abstractmethod
+    async def download_blob(self, bucket: str, path: str) -> bytes:
+        """Read a binary object into memory"""
+
+    async def close(self) -> None:
+        """Release connections held by the backend"""
+
+class SupabaseBackend(StorageBackend):
+    """
+    Supabase REST (PostgREST) and Storage APIs over one pooled HTTP client.
+
+    All requests share keep-alive connections, so calls from concurrent requests
+    and background jobs run in parallel instead of blocking the event loop.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.headers = {
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}"
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared connection pool, created on first use inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_POOL_SIZE,
+                    max_keepalive_connections=SUPABASE_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(SUPABASE_TIMEOUT)
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def update_file_statuses(self, file_ids: List[str], data: Dict[str, Any]) -> List[str]:
+        response = await self.client.patch(
+            f"{SUPABASE_REST_URL}/uploaded_files",
+            params={"id": f"in.({','.join(file_ids)})", "select": "id"},
+            json=data,
+            headers={"Prefer": "return=representation"}
+        )
+        response.raise_for_status()
+        return [row["id"] for row in response.json()]
+
+    async def insert_analysis_results(self, rows: List[Dict[str, Any]]) -> List[str]:
+        response = await self.client.post(
+            f"{SUPABASE_REST_URL}/analysis_results",
+            params={"select": "id"},
+            json=rows,
+            headers={"Prefer": "return=representation"}
+        )
+        response.raise_for_status()
+        ids = [row["id"] for row in response.json()]
+        if len(ids) != len(rows):
+            raise ValueError(f"Inserted {len(ids)} of {len(rows)} analysis results")
+        return ids
+
+    async def get_file_path(self, file_id: str) -> Optional[str]:
+        response = await self.client.get(
+            f"{SUPABASE_REST_URL}/uploaded_files",
+            params={"select": "file_path", "id": f"eq.{file_id}"}
+        )
+        response.raise_for_status()
+        rows = response.json()
+        return rows[0]["file_path"] if rows else None
+
+    async def download_file(self, bucket: str, file_path: str, local_path: str) -> StoredFile:
+        """
+        Stream a file from Supabase storage to disk in chunks.
+
+        The SHA-256 digest is computed while the data arrives and the byte count is
+        checked against Content-Length.
+        """
+        url = f"{SUPABASE_STORAGE_URL}/object/{bucket}/{quote(file_path)}"
+        # Ask for the raw bytes so Content-Length matches what we write
+        headers = {"Accept-Encoding": "identity"}
+
+        async with self.client.stream("GET", url, headers=headers, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            expected_size = response.headers.get("content-length")
+            stored = await write_chunks(response.aiter_bytes(UPLOAD_CHUNK_SIZE), local_path, MAX_DOWNLOAD_SIZE)
+
+        if expected_size is not None and int(expected_size) != stored.size:
+            os.remove(local_path)
+            raise ValueError(f"Downloaded {stored.size} bytes from {bucket}/{file_path}, expected {expected_size}")
+        return stored
+
+    async def upload_file(self, bucket: str, file_path: str, local_path: str) -> None:
+        response = await self.client.post(
+            f"{SUPABASE_STORAGE_URL}/object/{bucket}/{quote(file_path)}",
+            content=iter_file(local_path),
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(os.path.getsize(local_path)),
+                "x-upsert": "true"
+            },
+            timeout=DOWNLOAD_TIMEOUT
+        )
+        response.raise_for_status()
+
+    async def delete_file(self, bucket: str, file_path: str) -> None:
+        response = await self.client.request(
+            "DELETE", f"{SUPABASE_STORAGE_URL}/object/{bucket}", json={"prefixes": [file_path]}
+        )
+        response.raise_for_status()
+
+    async def upload_blob(self, bucket: str, path: str, data: bytes) -> None:
+        response = await self.client.post(
+            f"{SUPABASE_STORAGE_URL}/object/{bucket}/{quote(path)}",
+            content=data,
+            headers={"Content-Type": "application/octet-stream", "x-upsert": "true"}
+        )
+        response.raise_for_status()
+
+    async def download_blob(self, bucket: str, path: str) -> bytes:
+        response = await self.client.get(f"{SUPABASE_STORAGE_URL}/object/{bucket}/{quote(path)}")
+        response.raise_for_status()
+        return response.content
+
+class LocalBackend(StorageBackend):
+    """
+    Offline stand-in for Supabase: SQLite tables for the file and result records
+    and a directory with one subdirectory per storage bucket.
+
+    Register input files with ``add_file`` (or insert into ``uploaded_files``
+    directly) to run the whole pipeline, including /analyze/from-storage,
+    without network access.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS uploaded_files (
+            id TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            industry TEXT NOT NULL,
+            model_type TEXT NOT NULL,
+            result_id TEXT,
+            status TEXT,
+            user_id TEXT,
+            created_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS analysis_results (
+            id TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            model_type TEXT NOT NULL,
+            industry TEXT NOT NULL,
+            result TEXT,
+            metrics TEXT,
+            status TEXT,
+            created_at TEXT
+        );
+    """
+
+    # Columns of uploaded_files that the service updates
+    UPDATABLE_COLUMNS = ("status", "result_id")
+
+    def __init__(self, db_path: str = LOCAL_STORAGE_DB, storage_dir: str = LOCAL_STORAGE_DIR):
+        self.db_path = db_path
+        self.storage_dir = storage_dir
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        os.makedirs(storage_dir, exist_ok=True)
+
+        # One connection shared by the worker threads, serialized by a lock;
+        # standalone workers sharing the database are serialized by SQLite itself
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, fn):
+        with self._lock:
+            return fn(self._conn)
+
+    async def _run(self, fn):
+        return await asyncio.to_thread(self._execute, fn)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    async def update_file_statuses(self, file_ids: List[str], data: Dict[str, Any]) -> List[str]:
+        unknown = [column for column in data if column not in self.UPDATABLE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot update columns: {unknown}")
+        columns = ", ".join(f"{column} = ?" for column in data)
+        placeholders = ", ".join("?" for _ in file_ids)
+
+        def update(conn: sqlite3.Connection) -> List[str]:
+            conn.execute("BEGIN")
+            try:
+                conn.execute(f"UPDATE uploaded_files SET {columns} WHERE id IN ({placeholders})",
+                             [*data.values(), *file_ids])
+                rows = conn.execute(f"SELECT id FROM uploaded_files WHERE id IN ({placeholders})",
+                                    file_ids).fetchall()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return [row[0] for row in rows]
+
+        return await self._run(update)
+
+    async def insert_analysis_results(self, rows: List[Dict[str, Any]]) -> List[str]:
+        ids = [str(uuid.uuid4()) for _ in rows]
+        created_at = self._now()
+        values = [
+            (result_id, row["file_id"], row["model_type"], row["industry"],
+             json.dumps(row.get("result"), default=str), json.dumps(row.get("metrics"), default=str),
+             row.get("status"), created_at)
+            for result_id, row in zip(ids, rows)
+        ]
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT INTO analysis_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._run(insert)
+        return ids
+
+    async def get_file_path(self, file_id: str) -> Optional[str]:
+        row = await self._run(
+            lambda conn: conn.execute("SELECT file_path FROM uploaded_files WHERE id = ?", (file_id,)).fetchone()
+        )
+        return row[0] if row else None
+
+    async def download_file(self, bucket: str, file_path: str, local_path: str) -> StoredFile:
+        source_path = self.object_path(bucket, file_path)
+        return await write_chunks(iter_file(source_path), local_path, MAX_DOWNLOAD_SIZE)
+
+    async def upload_file(self, bucket: str, file_path: str, local_path: str) -> None:
+        target_path = self.object_path(bucket, file_path)
+
+        def copy() -> None:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            partial_path = f"{target_path}.part"
+            shutil.copyfile(local_path, partial_path)
+            os.replace(partial_path, target_path)
+
+        await asyncio.to_thread(copy)
+
+    async def delete_file(self, bucket: str, file_path: str) -> None:
+        target_path = self.object_path(bucket, file_path)
+        if os.path.exists(target_path):
+            os.remove(target_path)
+
+    async def upload_blob(self, bucket: str, path: str, data: bytes) -> None:
+        target_path = self.object_path(bucket, path)
+
+        def write() -> None:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            partial_path = f"{target_path}.part"
+            with open(partial_path, "wb") as out:
+                out.write(data)
+            os.replace(partial_path, target_path)
+
+        await asyncio.to_thread(write)
+
+    async def download_blob(self, bucket: str, path: str) -> bytes:
+        source_path = self.object_path(bucket, path)
+
+        def read() -> bytes:
+            with open(source_path, "rb") as source:
+                return source.read()
+
+        return await asyncio.to_thread(read)
+
+    def object_path(self, bucket: str, file_path: str) -> str:
+        """Location of a stored object inside its bucket's directory"""
+        root = os.path.abspath(os.path.join(self.storage_dir, bucket))
+        path = os.path.abspath(os.path.join(root, file_path))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid storage path: {bucket}/{file_path}")
+        return path
+
+    def add_file(self, file_id: str, file_path: str, industry: str, model_type: str,
+                 file_name: Optional[str] = None, status: str = "uploaded") -> None:
+        """Register a file record for an object already placed in the storage directory"""
+        self._execute(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO uploaded_files (id, file_name, file_path, industry, model_type, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_id, file_name or os.path.basename(file_path), file_path, industry, model_type, status, self._now())
+        ))
+
+    def get_result(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Return a stored analysis result row"""
+        def fetch(conn: sqlite3.Connection):
+            cursor = conn.execute("SELECT * FROM analysis_results WHERE id = ?", (result_id,))
+            row = cursor.fetchone()
+            return dict(zip([col[0] for col in cursor.description], row)) if row else None
+
+        row = self._execute(fetch)
+        if row:
+            row["result"] = json.loads(row["result"]) if row["result"] else None
+            row["metrics"] = json.loads(row["metrics"]) if row["metrics"] else None
+        return row
+
+# Storage backends selectable with STORAGE_BACKEND
+STORAGE_BACKENDS = {
+    "supabase": SupabaseBackend,
+    "local": LocalBackend,
+}
+
+def create_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+    """Create the configured storage backend"""
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    logger.info(f"Using {name} storage backend")
+    return STORAGE_BACKENDS[name]()
@@ -1,93 +1,181 @@
 
-from supabase import create_client, Client
+import asyncio
 import logging
-import os
-from app.config import SUPABASE_URL, SUPABASE_KEY
+import numpy as np
+from typing import Any, Optional
+from app.config import WRITE_BEHIND_ENABLED, RESULT_BLOB_THRESHOLD, RESULT_BLOB_BUCKET
+from app.services.file_service import StoredFile, FileTooLargeError
+from app.services.result_blobs import offload_arrays, decode_array
+from app.services.storage_backends import StorageBackend, create_backend
+from app.services.write_behind import WriteBehindBuffer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SupabaseService:
-    def __init__(self):
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
+    """
+    File records, analysis results and stored files, kept in Supabase or in the
+    local stand-in selected with STORAGE_BACKEND.
+
+    Result inserts and status updates go through a write-behind buffer that
+    sends them to the backend in bulk. Large numeric arrays in results are
+    stored as compressed blobs and referenced from the result JSON.
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or create_backend()
+        # Result inserts and status updates are coalesced into bulk writes
+        self.write_behind = WriteBehindBuffer(
+            self.backend.insert_analysis_results, self.backend.update_file_statuses
+        ) if WRITE_BEHIND_ENABLED else None
+
+    async def close(self) -> None:
+        """Flush buffered writes and close the backend's connections"""
+        if self.write_behind is not None:
+            await self.write_behind.close()
+        await self.backend.close()
+
     async def update_file_status(self, file_id: str, status: str, result_id: str = None) -> bool:
         """Update the status of a file in Supabase"""
-        try:
-            data = {"status": status}
-            if result_id:
-                data["result_id"] = result_id
-                
-            response = self.client.table("uploaded_files").update(data).eq("id", file_id).execute()
-            
-            if response.data:
-                logger.info(f"Updated file {file_id} status to {status}")
-                return True
-            else:
-                logger.error(f"Failed to update file {file_id} status")
+        data = {"status": status}
+        if result_id:
+            data["result_id"] = result_id
+        
+        if self.write_behind is not None:
+            updated = await self.write_behind.add_status(file_id, data)
+        else:
+            try:
+                updated = file_id in await self.backend.update_file_statuses([file_id], data)
+            except Exception as e:
+                logger.error(f"Error updating file status: {str(e)}")
                 return False
         
-        except Exception as e:
-            logger.error(f"Error updating file status: {str(e)}")
-            return False
-            
-    async def store_analysis_result(self, file_id: str, model_type: str, industry: str, 
+        if updated:
+            logger.info(f"Updated file {file_id} status to {status}")
+        else:
+            logger.error(f"Failed to update file {file_id} status")
+        return updated
+
+    async def store_analysis_result(self, file_id: str, model_type: str, industry: str,
                                    result: dict, metrics: dict) -> str:
-        """Store analysis result in Supabase"""
-        try:
-            result_data = {
-                "file_id": file_id,
-                "model_type": model_type,
-                "industry": industry,
-                "result": result,
-                "metrics": metrics,
-                "status": "completed"
-            }
-            
-            response = self.client.table("analysis_results").insert(result_data).execute()
-            
-            if response.data and len(response.data) > 0:
-                result_id = response.data[0]["id"]
-                logger.info(f"Stored analysis result with ID: {result_id}")
-                return result_id
-            else:
-                logger.error("Failed to store analysis result")
+        """Store analysis result in Supabase; large arrays should be moved out with offload_result first"""
+        result_data = {
+            "file_id": file_id,
+            "model_type": model_type,
+            "industry": industry,
+            "result": result,
+            "metrics": metrics,
+            "status": "completed"
+        }
+        
+        if self.write_behind is not None:
+            result_id = await self.write_behind.add_result(result_data)
+        else:
+            try:
+                result_id = (await self.backend.insert_analysis_results([result_data]))[0]
+            except Exception as e:
+                logger.error(f"Error storing analysis result: {str(e)}")
                 return None
         
+        if result_id:
+            logger.info(f"Stored analysis result with ID: {result_id}")
+        else:
+            logger.error("Failed to store analysis result")
+        return result_id
+
+    async def offload_result(self, file_id: str, result: Any) -> Any:
+        """Move large numeric arrays of a result to blob storage, keeping typed references in their place"""
+        if RESULT_BLOB_THRESHOLD <= 0:
+            return result
+        
+        # Encoding and compression are CPU-bound, keep them off the event loop
+        offloaded, blobs = await asyncio.to_thread(offload_arrays, result, file_id)
+        if not blobs:
+            return result
+        
+        try:
+            await asyncio.gather(*(
+                self.backend.upload_blob(RESULT_BLOB_BUCKET, blob.path, blob.data) for blob in blobs
+            ))
         except Exception as e:
-            logger.error(f"Error storing analysis result: {str(e)}")
-            return None
-            
+            logger.error(f"Error uploading result blobs, storing arrays inline: {str(e)}")
+            return result
+        
+        logger.info(f"Offloaded {len(blobs)} arrays ({sum(len(blob.data) for blob in blobs)} bytes) of the result for file {file_id}")
+        return offloaded
+
+    async def get_blob_array(self, blob_path: str) -> np.ndarray:
+        """Load the array behind a blob reference (``bucket/path`` as stored in the result)"""
+        bucket, _, path = blob_path.partition("/")
+        # Relative or empty segments could reach objects outside the blob bucket
+        if bucket != RESULT_BLOB_BUCKET or any(segment in ("", ".", "..") for segment in path.split("/")):
+            raise ValueError(f"Not a result blob: {blob_path}")
+        blob_format = "npy+zstd" if path.endswith(".npy.zst") else "npz"
+        data = await self.backend.download_blob(bucket, path)
+        return await asyncio.to_thread(decode_array, data, blob_format)
+
     async def get_file_path(self, file_id: str) -> str:
         """Get the storage path for a file"""
         try:
-            response = self.client.table("uploaded_files").select("file_path").eq("id", file_id).execute()
+            file_path = await self.backend.get_file_path(file_id)
             
-            if response.data and len(response.data) > 0:
-                return response.data[0]["file_path"]
+            if file_path:
+                return file_path
             else:
                 logger.error(f"File with ID {file_id} not found")
                 return None
-                
+        
         except Exception as e:
             logger.error(f"Error getting file path: {str(e)}")
             return None
-            
-    async def download_file(self, bucket: str, file_path: str, local_path: str) -> bool:
-        """Download a file from Supabase storage"""
+
+    async def download_file(self, bucket: str, file_path: str, local_path: str) -> Optional[StoredFile]:
+        """
+        Copy a file from storage to disk in chunks.
+        
+        The SHA-256 digest is computed while the data arrives. Returns the stored
+        file, or None if the download failed; raises FileTooLargeError if the file
+        exceeds MAX_DOWNLOAD_SIZE.
+        """
         try:
-            response = self.client.storage.from_(bucket).download(file_path)
-            
-            with open(local_path, "wb") as f:
-                f.write(response)
-                
-            logger.info(f"Downloaded file from {bucket}/{file_path} to {local_path}")
-            return True
-            
+            stored = await self.backend.download_file(bucket, file_path, local_path)
+            logger.info(f"Downloaded file from {bucket}/{file_path} to {local_path} ({stored.size} bytes, sha256={stored.sha256})")
+            return stored
+        
+        except FileTooLargeError as e:
+            logger.warning(f"Not downloading {bucket}/{file_path}: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error downloading file: {str(e)}")
+            return None
+
+    async def upload_file(self, bucket: str, file_path: str, local_path: str) -> bool:
+        """Copy a local file to storage in chunks. Returns False if the upload failed."""
+        try:
+            await self.backend.upload_file(bucket, file_path, local_path)
+            logger.info(f"Uploaded {local_path} to {bucket}/{file_path}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error uploading file: {str(e)}")
+            return False
+
+    async def delete_file(self, bucket: str, file_path: str) -> bool:
+        """Remove a file from storage. Returns False if it could not be removed."""
+        try:
+            await self.backend.delete_file(bucket, file_path)
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting file {bucket}/{file_path}: {str(e)}")
             return False
 
+    def stats(self) -> dict:
+        """Return write-behind batching statistics"""
+        if self.write_behind is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.write_behind.stats()}
+
 # Create a singleton instance
 supabase_service = SupabaseService()
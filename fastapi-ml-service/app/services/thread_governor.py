@@ -0,0 +1,116 @@
+
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    from threadpoolctl import threadpool_limits
+    has_threadpoolctl = True
+except ImportError:
+    has_threadpoolctl = False
+    logger.warning("threadpoolctl not available. Thread budgets only apply to libraries loaded after worker start.")
+
+# Variables that size the native thread pools of BLAS, OpenMP, numexpr and
+# TensorFlow when those libraries are loaded
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"
+]
+
+# Thread budget of the task running in this (worker) process, None outside a task
+_budget: Optional[int] = None
+
+def thread_budget() -> Optional[int]:
+    """
+    Threads the running task may use, for libraries that take an explicit
+    thread count (XGBoost ``n_jobs``, scikit-learn ``n_jobs``, TensorFlow);
+    None when not governed, i.e. the library default
+    """
+    return _budget
+
+@contextmanager
+def thread_limits(threads: Optional[int]) -> Iterator[None]:
+    """Cap the BLAS and OpenMP pools of this process at ``threads`` while a task runs"""
+    global _budget
+    previous, _budget = _budget, threads
+    try:
+        if threads and has_threadpoolctl:
+            with threadpool_limits(limits=threads):
+                yield
+        else:
+            yield
+    finally:
+        _budget = previous
+
+def worker_environment(threads: int) -> Dict[str, str]:
+    """Thread pool sizes for a new worker process, keeping any the operator set"""
+    return {name: os.environ.get(name, str(threads)) for name in THREAD_ENV_VARS}
+
+class ThreadGovernor:
+    """
+    Divides a budget of native threads (one per core by default) among the
+    model runs in progress.
+
+    Each run is granted ``per_task`` threads, or fewer if the model's registry
+    entry caps them (``max_threads``) or if fewer are free. Runs wait while no
+    thread is free, so the threads of all runs never exceed the budget. The
+    worker applies its grant to BLAS and OpenMP through threadpoolctl, and
+    models pass it to libraries with their own pools (XGBoost, TensorFlow).
+    """
+
+    def __init__(self, budget: int, per_task: int):
+        self.budget = max(1, budget)
+        self.per_task = max(1, min(per_task, self.budget))
+        self._free = self.budget
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._stats = {
+            "grants": 0,
+            "partial_grants": 0,
+            "waits": 0,
+            "peak_in_use": 0
+        }
+
+    async def acquire(self, max_threads: Optional[int] = None) -> int:
+        """Wait for at least one free thread and return the number granted"""
+        wanted = min(self.per_task, max_threads or self.per_task)
+        if self._free < 1:
+            self._stats["waits"] += 1
+        while self._free < 1:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        granted = min(wanted, self._free)
+        self._free -= granted
+        self._stats["grants"] += 1
+        if granted < wanted:
+            self._stats["partial_grants"] += 1
+        self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self.budget - self._free)
+        return granted
+
+    def release(self, threads: int) -> None:
+        """Return threads granted by acquire and wake up waiting runs"""
+        self._free = min(self.budget, self._free + threads)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "budget": self.budget,
+            "per_task": self.per_task,
+            "in_use": self.budget - self._free,
+            "waiting": len(self._waiters)
+        }
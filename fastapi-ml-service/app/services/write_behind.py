@@ -0,0 +1,206 @@
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bulk writers supplied by the storage client
+InsertResults = Callable[[List[Dict[str, Any]]], Awaitable[List[str]]]
+UpdateStatuses = Callable[[List[str], Dict[str, Any]], Awaitable[List[str]]]
+
+class WriteBehindBuffer:
+    """
+    Coalesces analysis result inserts and file status updates into bulk writes.
+
+    Callers get a future per write. Pending writes are flushed when the buffer
+    holds ``max_batch_size`` of them or ``flush_interval`` seconds after the first
+    one arrived, whichever comes first. Result rows are inserted with a single
+    bulk insert and each future resolves with the id of its row; if the bulk
+    insert fails, the batch is split in halves and retried, so only the rows
+    that cannot be written resolve with None. Only one flush writes at a
+    time, so two updates of the same file reach the backend in order. Status updates
+    to the same file collapse into the latest one, and updates with identical
+    values are sent as one filtered update.
+    """
+
+    def __init__(self, insert_results: InsertResults, update_statuses: UpdateStatuses,
+                 max_batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL):
+        self.insert_results = insert_results
+        self.update_statuses = update_statuses
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = flush_interval
+        self._results: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._statuses: "OrderedDict[str, Tuple[Dict[str, Any], List[asyncio.Future]]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._flush_lock = asyncio.Lock()
+        self._stats = {
+            "flushes": 0,
+            "results_written": 0,
+            "status_updates_written": 0,
+            "status_updates_coalesced": 0,
+            "write_errors": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "total_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def add_result(self, row: Dict[str, Any]) -> asyncio.Future:
+        """Queue a result row; the future resolves with its id, or None if the insert failed"""
+        future = asyncio.get_running_loop().create_future()
+        self._results.append((row, future))
+        self._schedule()
+        return future
+
+    def add_status(self, file_id: str, data: Dict[str, Any]) -> asyncio.Future:
+        """Queue a status update; the future resolves with whether the file was updated"""
+        future = asyncio.get_running_loop().create_future()
+        if file_id in self._statuses:
+            # A later update of the same file supersedes the pending one
+            _, futures = self._statuses.pop(file_id)
+            self._statuses[file_id] = (data, futures + [future])
+            self._stats["status_updates_coalesced"] += 1
+        else:
+            self._statuses[file_id] = (data, [future])
+            self._schedule()
+        return future
+
+    @property
+    def pending(self) -> int:
+        return len(self._results) + len(self._statuses)
+
+    def _schedule(self) -> None:
+        if self.pending >= self.max_batch_size:
+            self._cancel_timer()
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        if self._flush_lock.locked():
+            # The running flush schedules the next one when it is done
+            return
+        task = asyncio.get_running_loop().create_task(self.flush())
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        """Write up to one batch of pending writes, scheduling another flush for the rest"""
+        async with self._flush_lock:
+            await self._flush_batch()
+        if self.pending:
+            self._schedule()
+
+    async def _flush_batch(self) -> None:
+        self._cancel_timer()
+        results, self._results = self._results[:self.max_batch_size], self._results[self.max_batch_size:]
+        statuses = OrderedDict()
+        while self._statuses and len(results) + len(statuses) < self.max_batch_size:
+            file_id, pending = self._statuses.popitem(last=False)
+            statuses[file_id] = pending
+        batch_size = len(results) + len(statuses)
+        if not batch_size:
+            return
+
+        start = time.perf_counter()
+        await asyncio.gather(self._flush_results(results), self._flush_statuses(statuses))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self._stats["flushes"] += 1
+        self._stats["last_batch_size"] = batch_size
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], batch_size)
+        self._stats["total_batch_size"] += batch_size
+        self._stats["last_flush_ms"] = elapsed_ms
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+        self._stats["total_flush_ms"] += elapsed_ms
+        logger.info(f"Flushed {len(results)} results and {len(statuses)} status updates in {elapsed_ms:.1f} ms")
+
+    async def close(self) -> None:
+        """Flush pending writes and wait for in-flight flushes"""
+        while self.pending:
+            await self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _flush_results(self, results: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        if not results:
+            return
+
+        ids = await self._insert([row for row, _ in results])
+        for result_id, (_, future) in zip(ids, results):
+            if not future.done():
+                future.set_result(result_id)
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+        # Bisect failed bulk inserts so one bad row (e.g. a NaN the backend rejects) fails alone
+        try:
+            ids = await self.insert_results(rows)
+            self._stats["results_written"] += len(ids)
+            return ids
+        except Exception as e:
+            self._stats["write_errors"] += 1
+            if len(rows) == 1:
+                logger.error(f"Error storing analysis result for file {rows[0].get('file_id')}: {str(e)}")
+                return [None]
+            logger.warning(f"Error storing {len(rows)} analysis results, retrying in halves: {str(e)}")
+
+        middle = len(rows) // 2
+        return await self._insert(rows[:middle]) + await self._insert(rows[middle:])
+
+    async def _flush_statuses(self, statuses: "OrderedDict[str, Tuple[Dict[str, Any], List[asyncio.Future]]]") -> None:
+        if not statuses:
+            return
+
+        # Files receiving identical values share one update
+        groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+        for file_id, (data, _) in statuses.items():
+            key = json.dumps(data, sort_keys=True, default=str)
+            groups.setdefault(key, (data, []))[1].append(file_id)
+
+        async def update(data: Dict[str, Any], file_ids: List[str]) -> List[str]:
+            try:
+                updated = await self.update_statuses(file_ids, data)
+                self._stats["status_updates_written"] += len(updated)
+                return updated
+            except Exception as e:
+                logger.error(f"Error updating status of {len(file_ids)} files: {str(e)}")
+                self._stats["write_errors"] += 1
+                return []
+
+        updated_ids = set()
+        for updated in await asyncio.gather(*(update(data, ids) for data, ids in groups.values())):
+            updated_ids.update(updated)
+
+        for file_id, (_, futures) in statuses.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(file_id in updated_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return flush counters, batch sizes and flush latencies"""
+        flushes = self._stats["flushes"]
+        return {
+            **self._stats,
+            "pending": self.pending,
+            "avg_batch_size": self._stats["total_batch_size"] / flushes if flushes else 0.0,
+            "avg_flush_ms": self._stats["total_flush_ms"] / flushes if flushes else 0.0,
+            "batch_size_limit": self.max_batch_size,
+            "flush_interval": self.flush_interval
+        }
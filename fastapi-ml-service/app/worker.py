@@ -0,0 +1,45 @@
+
+import asyncio
+import logging
+import signal
+from app.config import JOB_QUEUE_BACKEND, WORKER_DRAIN_SECONDS
+from app.services.execution_engine import execution_engine
+from app.services.job_runner import job_runner
+from app.services.supabase_service import supabase_service
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+async def run_worker() -> None:
+    """
+    Consume the job queue until SIGINT or SIGTERM, like the consumers of the
+    API process: each job runs through MLService in this process's worker
+    pools and its results are written through SupabaseService. With the
+    postgres job queue the worker can run on any host that reaches the
+    database and storage; it downloads job inputs from storage.
+
+    On a signal the worker stops claiming jobs and waits up to
+    WORKER_DRAIN_SECONDS for the running ones; jobs still running then go
+    back to the queue for another consumer.
+    """
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await execution_engine.start()
+    await job_runner.start()
+    logger.info(f"Worker {job_runner.owner} consuming the {JOB_QUEUE_BACKEND} job queue")
+    try:
+        await stopping.wait()
+        await job_runner.drain(WORKER_DRAIN_SECONDS)
+    finally:
+        await job_runner.stop()
+        await supabase_service.close()
+        execution_engine.shutdown()
+        logger.info(f"Worker {job_runner.owner} stopped")
+
+if __name__ == "__main__":
+    # Standalone compute node: python -m app.worker
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    asyncio.run(run_worker())